@@ -6,31 +6,174 @@ Space Command — M3U8 downloader with ffmpeg (-c copy), concurrency, and a spac
 
 Usage:
     python m3u8_space_command.py urls.txt
+    python m3u8_space_command.py --engine native urls.txt
+
+Engines:
+    ffmpeg - (default) one `ffmpeg -i url -c copy` process per URL
+    native - parse the HLS media playlist here, fetch segments in parallel over
+             pooled keep-alive connections into a local segment store, then run
+             ffmpeg once to remux the local .ts files (concat demuxer, -c copy)
+    asyncio - same ffmpeg jobs as the default engine, but driven from one asyncio event loop
+              (non-blocking -progress/stderr readers, no per-job threads); scales to several
+              hundred concurrent streams (default concurrency up to 512)
 
 Environment:
     M3U8_CONCURRENCY - optional override of concurrency count
+    M3U8_SEGMENT_CONCURRENCY - optional override of per-stream segment fetchers (native engine)
+
+Metrics:
+    --events PATH appends one JSON object per line: queued, probe_start, probe_end, first_byte,
+    progress (sampled), done, failed, cancelled; terminal events carry per-stage seconds
+    (probe, connect, transfer, remux, total). --prom PATH keeps a Prometheus textfile (for the
+    node_exporter textfile collector) with job states, bytes, throughput, queue depth, failure
+    counts and stage latency histograms, rewritten atomically every 10s.
+
+Scheduling:
+    Concurrency is the starting number of download slots. --adaptive lets it float at runtime
+    (AIMD on measured aggregate throughput, backing off when failures rise); --per-host caps how
+    many slots any one host may hold so a slow CDN can't starve the rest.
+
+Variants:
+    --variant picks the rendition of a master playlist per job, at launch: max (highest
+    BANDWIDTH, the default), target (highest at or below --target-bitrate) or fit (highest that
+    fits the job's share of the link: the aggregate throughput measured so far in the run, divided
+    over the active downloads, with some headroom). Until the first measurement, fit starts from
+    --target-bitrate or the lowest variant. The ffmpeg engines map the chosen program
+    (-map 0:p:N, alternate audio included); native and --live fetch its media playlist.
+
+Large lists:
+    --stream reads the urls file lazily and admits at most --max-inflight jobs at a time; each
+    finished job is written to --results (default <urls_file>.results.jsonl) and dropped from
+    memory, so resident state tracks the in-flight window rather than the size of the list. The
+    resume journal indexes every URL, so --stream only keeps one when --journal is given.
+
+Live:
+    --live records feeds that are still being published. Each media playlist is reloaded at its
+    target-duration cadence (half that when nothing new appeared), only segments past the last
+    one written are fetched, and they are appended to <name>.part001.ts, rolling over to the next
+    part at --roll-size / --roll-time. The UI shows live lag ("L  12s": media time the server
+    already lists but that is not written yet). A recording ends with the feed (EXT-X-ENDLIST),
+    after --live-duration, or on Ctrl-C, keeping everything recorded so far. Encrypted and fMP4
+    feeds fall back to a plain ffmpeg capture.
+
+Shared queue:
+    --queue DB keeps the batch in a SQLite job queue that any number of m3u8pv processes, on this
+    host or on hosts sharing the filesystem (--queue-shared-fs), drain together:
+        m3u8pv.py --queue jobs.db --enqueue urls.txt     # add work
+        m3u8pv.py --queue jobs.db                        # run a worker (as many as you like)
+    Each worker claims jobs atomically and holds them under a lease renewed by a heartbeat; jobs of
+    a worker that dies are picked up by the others once the lease runs out. Run workers from the
+    same directory (output names are fixed at enqueue time, relative to it).
+
+Resume:
+    Progress is journaled to <urls_file>.journal (see --journal / --no-journal; with --stream or
+    --queue only when --journal is given). Rerunning the same urls file keeps the original output
+    names, skips outputs that already landed and, with the native engine, only fetches segments
+    that are missing.
 
 Requirements:
     - ffmpeg installed and in PATH
     - ffprobe recommended (for duration/progress percentage)
+
+Output:
+    Outputs are written under a staging directory (--staging-dir, default <output-dir>/.m3u8pv-staging,
+    same filesystem) and renamed into --output-dir only once complete, after an fsync that is
+    batched across jobs; the output directory never holds partial files (nor, with --verify,
+    unchecked ones). --shard N spreads outputs
+    over hash-named subdirectories (N hex digits). Segment files with a known length and --live
+    parts with --roll-size are preallocated.
+
+Verification:
+    --verify adds a post-download stage on a separate process pool. Once a job's download is
+    finished (and its slot handed on), the output is checked while still in the staging directory:
+    it is demuxed end to end with stream copy, its duration is compared with the probed duration
+    (short by more than 2s / 1% = truncated), and a broken or mislabeled container gets one
+    stream-copy remux. Only outputs that pass are committed to --output-dir and end as `verified`;
+    the others end `failed` with the reason, are kept aside as <name>.failed in the staging
+    directory and are dropped from the resume journal so a rerun fetches them again.
+
+Segment cache:
+    The native engine keeps fetched segments in ~/.cache/m3u8pv/segments, keyed by the
+    resolved segment URI plus byte range, capped at --segment-cache-size (LRU). Renditions or
+    re-cuts that share segments, in one batch or across batches, fetch each segment once; hits
+    are hard-linked into the job's segment store. Hit/miss counts show in Mission Control.
+    --live always fetches from the origin: live encoders restart and reuse segment names, so a
+    URI says nothing about the bytes behind it.
+
+Probing:
+    Each URL is scanned once (single ffprobe call, JSON output) on a small dedicated pool that runs
+    ahead of the downloads. Results are cached in ~/.cache/m3u8pv/probe-cache.json keyed by URL
+    plus a fingerprint of the playlist text, so unchanged playlists are never probed twice.
 """
 
 from __future__ import annotations
+import argparse
+import asyncio
+import collections
 import os
 import sys
 import shutil
 import subprocess
 import threading
 import concurrent.futures
+import contextlib
+import hashlib
+import http.client
+import json
+import multiprocessing
+import socket
+import sqlite3
 import time
 import uuid
 from datetime import datetime, timezone
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, Iterator, List, Tuple
+from urllib.parse import urljoin, urlsplit
 
 # ---------- Config ----------
 UI_REFRESH_INTERVAL = 0.5
+PLAIN_LOG_INTERVAL = 10.0    # status line cadence when stdout is not a TTY
+PROGRESS_SAMPLE_INTERVAL = 5.0   # --events: at most one progress event per job this often
+METRICS_FLUSH_INTERVAL = 10.0    # --prom: textfile rewrite cadence
+SCROLL_TICKS = 6             # UI ticks per page when active/failed jobs overflow the screen
 CONCURRENCY_CAP = 32
+ASYNC_CONCURRENCY_CAP = 512  # asyncio engine: one event loop, no threads per job
+ASYNC_STREAM_LIMIT = 1 << 20
+ADAPT_INTERVAL = 5.0         # adaptive scheduler: seconds between throughput samples
+ADAPT_GAIN = 0.05            # an extra slot must add >5% throughput to keep growing
+ADAPT_COLLAPSE = 0.25        # throughput this far below a smaller slot count => back off
+ADAPT_FAILURE_RATE = 0.2     # failure share of finished jobs per interval that triggers back-off
+ADAPT_BACKOFF = 0.5          # multiplicative decrease
+ADAPT_PROBE_EVERY = 6        # intervals on a plateau before probing one more slot
+VARIANT_FIT_HEADROOM = 0.8   # --variant fit: use at most this share of a job's slice of the link
+VARIANT_ESTIMATE_DECAY = 0.8 # --variant fit: per-sample decay of the link estimate's remembered peak
 FFPROBE_TIMEOUT = 15
+PROBE_CONCURRENCY = 4        # probe-stage workers, separate from the download pool
+PROBE_CACHE_MAX_ENTRIES = 5000
+PLAYLIST_PEEK_BYTES = 1 << 20
+SEGMENT_CONCURRENCY = 8      # parallel segment fetches per stream (native engine)
+STREAM_INFLIGHT_FACTOR = 4   # --stream: jobs admitted at once = download slots * this
+STREAM_SUMMARY_FAILURES = 50 # --stream: failures listed in the summary (the rest stay in --results)
+SEGMENT_RETRIES = 3
+OUTPUT_STAGING_NAME = ".m3u8pv-staging"  # default staging dir, inside the output dir (same filesystem)
+OUTPUT_COMMIT_BATCH = 32     # outputs fsynced and renamed into place per batch
+OUTPUT_COMMIT_INTERVAL = 0.25  # seconds a batch may wait to fill up
+PREALLOCATE_MIN_BYTES = 1 << 20  # smaller files aren't worth a fallocate call
+VERIFY_CONCURRENCY = 4       # --verify: default process-pool size (capped at the CPU count)
+VERIFY_TIMEOUT = 1800        # --verify: per ffmpeg scan/remux of one output
+VERIFY_DURATION_SLACK = 2.0  # --verify: seconds an output may come up short of the probed duration ...
+VERIFY_DURATION_RATIO = 0.01 # ... or this fraction of it, whichever is larger
+SEGMENT_CACHE_MAX_BYTES = 5 << 30  # shared segment cache cap (LRU eviction beyond it)
+LIVE_EDGE_SEGMENTS = 3       # --live: join this many segments behind the newest one listed
+LIVE_MIN_RELOAD = 0.5        # --live: floor on the playlist reload interval
+LIVE_DEFAULT_TARGET = 6.0    # --live: reload cadence when the playlist has no target duration
+LIVE_RELOAD_RETRIES = 5      # --live: consecutive playlist reload failures before giving up
+QUEUE_LEASE_SECONDS = 60.0   # --queue: a claimed job is reclaimable this long after its last heartbeat
+QUEUE_MAX_ATTEMPTS = 3       # --queue: claims per job before a repeatedly orphaned job is marked failed
+QUEUE_BUSY_TIMEOUT = 30.0    # --queue: seconds to wait on another worker's write lock
+QUEUE_POLL_INTERVAL = 5.0    # --queue: recheck for reclaimable jobs while others still hold leases
+HTTP_TIMEOUT = 20
+HTTP_MAX_IDLE_PER_HOST = 16
+HTTP_USER_AGENT = "m3u8pv/1.0"
 
 # ---------- Terminal color & emoji helpers ----------
 CSI = "\x1b["
@@ -94,6 +237,46 @@ def human_bytes(num: Optional[int]) -> str:
         num /= 1024.0
     return f"{num:.1f}PB"
 
+def parse_size(text: str) -> int:
+    """'500M', '2G', '1048576' -> bytes (argparse type)."""
+    text = text.strip().upper().rstrip("B")
+    mult = 1
+    if text and text[-1] in "KMGT":
+        mult = 1024 ** ("KMGT".index(text[-1]) + 1)
+        text = text[:-1]
+    try:
+        return int(float(text) * mult)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a size: {text!r}")
+
+def parse_bitrate(text: str) -> int:
+    """'2.5M', '800k', '1500000' -> bits/s (argparse type; decimal multipliers, like BANDWIDTH)."""
+    text = text.strip().lower()
+    for suffix in ("bps", "b/s", "bit/s"):
+        if text.endswith(suffix):
+            text = text[:-len(suffix)]
+            break
+    mult = 1
+    if text and text[-1] in "kmg":
+        mult = 1000 ** ("kmg".index(text[-1]) + 1)
+        text = text[:-1]
+    try:
+        value = int(float(text) * mult)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a bitrate: {text!r}")
+    if value <= 0:
+        raise argparse.ArgumentTypeError("bitrate must be positive")
+    return value
+
+def human_bitrate(bps: Optional[float]) -> str:
+    if not bps:
+        return "N/A"
+    for unit in ("b/s", "kb/s", "Mb/s"):
+        if bps < 1000.0:
+            return f"{bps:.1f}{unit}"
+        bps /= 1000.0
+    return f"{bps:.1f}Gb/s"
+
 def parse_ffmpeg_time(ts: str) -> Optional[float]:
     if not ts:
         return None
@@ -122,82 +305,1944 @@ def find_executable(name: str) -> Optional[str]:
     return shutil.which(name)
 
 # ---------- ffprobe helpers ----------
-def ffprobe_duration(url: str) -> Optional[float]:
+class ProbeResult:
+    def __init__(self, duration: Optional[float] = None, format_name: Optional[str] = None,
+                 bit_rate: Optional[int] = None, size: Optional[int] = None, streams: Optional[List[dict]] = None):
+        self.duration = duration
+        self.format_name = format_name
+        self.bit_rate = bit_rate
+        self.size = size
+        self.streams = streams or []  # [{"index", "type", "codec", ...}]
+
+    def codec_of(self, codec_type: str) -> Optional[str]:
+        for s in self.streams:
+            if s.get("type") == codec_type:
+                return s.get("codec")
+        return None
+
+    @property
+    def audio_is_aac(self) -> bool:
+        return (self.codec_of("audio") or "").lower() == "aac"
+
+    def to_dict(self) -> dict:
+        return {"duration": self.duration, "format_name": self.format_name,
+                "bit_rate": self.bit_rate, "size": self.size, "streams": self.streams}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ProbeResult":
+        return cls(d.get("duration"), d.get("format_name"), d.get("bit_rate"), d.get("size"), d.get("streams"))
+
+def _float_or_none(v) -> Optional[float]:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def _int_or_none(v) -> Optional[int]:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+def probe_stream(url: str) -> Optional[ProbeResult]:
+    """Duration, codecs and stream layout from a single ffprobe call (JSON output)."""
     ffprobe = find_executable("ffprobe")
     if not ffprobe:
         return None
-    cmd = [ffprobe, "-v", "error", "-show_entries", "format=duration",
-           "-of", "default=noprint_wrappers=1:nokey=1", url]
+    cmd = [ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", url]
     try:
         proc = subprocess.run(cmd, capture_output=True, text=True, timeout=FFPROBE_TIMEOUT)
         if proc.returncode != 0:
             return None
-        out = proc.stdout.strip()
-        if not out:
-            return None
-        return float(out)
+        data = json.loads(proc.stdout or "{}")
     except Exception:
         return None
+    fmt = data.get("format") or {}
+    streams = []
+    for s in data.get("streams") or []:
+        info = {"index": s.get("index"), "type": s.get("codec_type"), "codec": s.get("codec_name")}
+        if s.get("codec_type") == "video":
+            info["width"] = s.get("width")
+            info["height"] = s.get("height")
+        elif s.get("codec_type") == "audio":
+            info["channels"] = s.get("channels")
+            info["sample_rate"] = _int_or_none(s.get("sample_rate"))
+        br = _int_or_none(s.get("bit_rate"))
+        if br:
+            info["bit_rate"] = br
+        streams.append(info)
+    return ProbeResult(
+        duration=_float_or_none(fmt.get("duration")),
+        format_name=fmt.get("format_name"),
+        bit_rate=_int_or_none(fmt.get("bit_rate")),
+        size=_int_or_none(fmt.get("size")),
+        streams=streams,
+    )
 
-def ffprobe_audio_codec_is_aac(url: str) -> bool:
-    ffprobe = find_executable("ffprobe")
-    if not ffprobe:
+# ---------- HLS playlists ----------
+class HlsSegment:
+    def __init__(self, seq: int, uri: str, duration: float, byterange: Optional[Tuple[int, int]] = None):
+        self.seq = seq
+        self.uri = uri
+        self.duration = duration
+        self.byterange = byterange  # (length, offset) from EXT-X-BYTERANGE
+
+class MediaPlaylist:
+    def __init__(self):
+        self.target_duration: Optional[float] = None
+        self.media_sequence = 0
+        self.segments: List[HlsSegment] = []
+        self.endlist = False
+        self.encrypted = False
+        self.has_map = False
+
+    @property
+    def total_duration(self) -> float:
+        return sum(seg.duration for seg in self.segments)
+
+def _parse_attribute_list(text: str) -> Dict[str, str]:
+    attrs = {}
+    key = []
+    val = []
+    in_key = True
+    in_quotes = False
+    for ch in text:
+        if in_key:
+            if ch == "=":
+                in_key = False
+            else:
+                key.append(ch)
+            continue
+        if ch == '"':
+            in_quotes = not in_quotes
+        elif ch == "," and not in_quotes:
+            attrs["".join(key).strip()] = "".join(val)
+            key, val, in_key = [], [], True
+            continue
+        else:
+            val.append(ch)
+    if key:
+        attrs["".join(key).strip()] = "".join(val)
+    return attrs
+
+def is_master_playlist(text: str) -> bool:
+    return "#EXT-X-STREAM-INF" in text
+
+def parse_master_playlist(text: str, base_url: str) -> List[Dict[str, str]]:
+    """Return the variants of a master playlist as attribute dicts with an absolute 'URI'."""
+    variants = []
+    pending = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            pending = _parse_attribute_list(line.split(":", 1)[1])
+        elif line.startswith("#"):
+            continue
+        elif pending is not None:
+            pending["URI"] = urljoin(base_url, line)
+            variants.append(pending)
+            pending = None
+    return variants
+
+def variant_bitrate(variant: Dict[str, str]) -> int:
+    """Bits/s a variant needs: AVERAGE-BANDWIDTH when the playlist gives it, else the peak BANDWIDTH."""
+    for attr in ("AVERAGE-BANDWIDTH", "BANDWIDTH"):
+        try:
+            value = int(variant.get(attr) or 0)
+        except ValueError:
+            continue
+        if value:
+            return value
+    return 0
+
+class VariantPolicy:
+    """--variant: which rendition of a master playlist a job downloads.
+
+    max takes the highest BANDWIDTH; target the highest at or below target_bps; fit the highest
+    that fits this job's share of the link (scheduler.share(), x VARIANT_FIT_HEADROOM), starting
+    from target_bps (or the lowest variant) until the run has measured anything. When nothing is
+    low enough, the lowest variant is used.
+    """
+
+    def __init__(self, mode: str = "max", target_bps: Optional[int] = None):
+        self.mode = mode
+        self.target_bps = target_bps
+
+    def budget(self) -> Optional[float]:
+        """Bits/s a new job may use; None = no limit."""
+        if self.mode == "target":
+            return self.target_bps
+        if self.mode == "fit":
+            share = scheduler.share() if scheduler is not None else None
+            if share:
+                return share * 8 * VARIANT_FIT_HEADROOM
+            return self.target_bps or 0.0
+        return None
+
+    def choose(self, variants: List[Dict[str, str]]) -> Tuple[int, Dict[str, str], Optional[float]]:
+        """(index in the master playlist, variant, budget it was picked against)."""
+        budget = self.budget()
+        if budget is None:
+            i = max(range(len(variants)), key=lambda i: int(variants[i].get("BANDWIDTH", "0") or 0))
+            return i, variants[i], None
+        ranked = sorted(range(len(variants)), key=lambda i: (variant_bitrate(variants[i]), -i))
+        fitting = [i for i in ranked if variant_bitrate(variants[i]) <= budget]
+        i = fitting[-1] if fitting else ranked[0]
+        return i, variants[i], budget
+
+variant_policy: Optional[VariantPolicy] = None
+
+def parse_media_playlist(text: str, base_url: str) -> MediaPlaylist:
+    pl = MediaPlaylist()
+    seq = None
+    duration = None
+    byterange = None
+    last_range_end: Dict[str, int] = {}
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-TARGETDURATION:"):
+            try:
+                pl.target_duration = float(line.split(":", 1)[1])
+            except ValueError:
+                pass
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            try:
+                pl.media_sequence = int(line.split(":", 1)[1])
+            except ValueError:
+                pass
+        elif line.startswith("#EXTINF:"):
+            try:
+                duration = float(line.split(":", 1)[1].split(",", 1)[0])
+            except ValueError:
+                duration = 0.0
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            spec = line.split(":", 1)[1]
+            if "@" in spec:
+                length, offset = spec.split("@", 1)
+                byterange = (int(length), int(offset))
+            else:
+                byterange = (int(spec), -1)
+        elif line.startswith("#EXT-X-KEY:"):
+            method = _parse_attribute_list(line.split(":", 1)[1]).get("METHOD", "NONE")
+            if method != "NONE":
+                pl.encrypted = True
+        elif line.startswith("#EXT-X-MAP:"):
+            pl.has_map = True
+        elif line.startswith("#EXT-X-ENDLIST"):
+            pl.endlist = True
+        elif line.startswith("#"):
+            continue
+        else:
+            if seq is None:
+                seq = pl.media_sequence
+            uri = urljoin(base_url, line)
+            if byterange is not None and byterange[1] < 0:
+                # no explicit offset: continues where the previous sub-range of this resource ended
+                byterange = (byterange[0], last_range_end.get(uri, 0))
+            if byterange is not None:
+                last_range_end[uri] = byterange[0] + byterange[1]
+            pl.segments.append(HlsSegment(seq, uri, duration or 0.0, byterange))
+            seq += 1
+            duration = None
+            byterange = None
+    return pl
+
+# ---------- Pooled HTTP ----------
+class HttpError(Exception):
+    pass
+
+class HttpPool:
+    """Keep-alive HTTP(S) connections shared by all segment fetchers, pooled per host."""
+
+    def __init__(self, max_idle_per_host: int = HTTP_MAX_IDLE_PER_HOST, timeout: float = HTTP_TIMEOUT):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+
+    def _acquire(self, scheme: str, netloc: str) -> Tuple[http.client.HTTPConnection, bool]:
+        key = (scheme, netloc)
+        with self._lock:
+            conns = self._idle.get(key)
+            if conns:
+                return conns.pop(), True
+        return self._new_connection(scheme, netloc), False
+
+    def _release(self, scheme: str, netloc: str, conn: http.client.HTTPConnection):
+        key = (scheme, netloc)
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self.max_idle_per_host:
+                conns.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def _new_connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _open(self, url: str, byterange: Optional[Tuple[int, int]] = None, max_redirects: int = 5):
+        """Send a GET, following redirects. Returns (scheme, netloc, conn, resp) with a 200/206 response."""
+        for _ in range(max_redirects + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ("http", "https"):
+                raise HttpError(f"unsupported URL scheme: {parts.scheme or '(none)'}")
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            headers = {"User-Agent": HTTP_USER_AGENT, "Connection": "keep-alive"}
+            if byterange is not None:
+                length, offset = byterange
+                headers["Range"] = f"bytes={offset}-{offset + length - 1}"
+            conn, reused = self._acquire(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if not reused:
+                    raise
+                # the server dropped an idle keep-alive connection; retry once on a fresh one
+                conn = self._new_connection(parts.scheme, parts.netloc)
+                try:
+                    conn.request("GET", path, headers=headers)
+                    resp = conn.getresponse()
+                except Exception:
+                    conn.close()
+                    raise
+            if resp.status in (301, 302, 303, 307, 308):
+                location = resp.getheader("Location")
+                resp.read()
+                self._finish(parts.scheme, parts.netloc, conn, resp)
+                if not location:
+                    raise HttpError(f"HTTP {resp.status} without Location for {url}")
+                url = urljoin(url, location)
+                continue
+            if resp.status not in (200, 206):
+                resp.read()
+                self._finish(parts.scheme, parts.netloc, conn, resp)
+                raise HttpError(f"HTTP {resp.status} {resp.reason} for {url}")
+            return parts.scheme, parts.netloc, conn, resp
+        raise HttpError(f"too many redirects for {url}")
+
+    def _finish(self, scheme: str, netloc: str, conn: http.client.HTTPConnection, resp):
+        """Hand a fully-read connection back to the pool (or close it if the server won't keep it)."""
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(scheme, netloc, conn)
+
+    def fetch(self, url: str, dest: Optional[str] = None, byterange: Optional[Tuple[int, int]] = None,
+              on_bytes=None):
+        """GET url. Returns the body as bytes, or the byte count when streamed into dest."""
+        scheme, netloc, conn, resp = self._open(url, byterange)
+        # a range request must yield exactly the requested bytes; a server that ignores Range
+        # answers 200 with the whole resource, so the range is cut out of that here
+        skip, keep = (0, None) if byterange is None else \
+            (0 if resp.status == 206 else byterange[1], byterange[0])
+        tmp = None if dest is None else dest + ".part"
+        try:
+            if resp.status == 206:
+                self._check_content_range(resp, byterange, url)
+            if dest is None:
+                body = resp.read()
+                if keep is not None:
+                    body = body[skip:skip + keep]
+            else:
+                written = 0
+                with open(tmp, "wb") as fh:
+                    length = resp.getheader("Content-Length")
+                    if keep is not None:
+                        preallocate(fh, keep)
+                    elif length and length.isdigit():
+                        preallocate(fh, int(length))
+                    for chunk in self._range_chunks(resp, skip, keep):
+                        fh.write(chunk)
+                        written += len(chunk)
+                        if on_bytes:
+                            on_bytes(len(chunk))
+            if keep is not None and (len(body) if dest is None else written) != keep:
+                raise HttpError(f"short range {byterange[1]}+{keep} from {url}")
+            if tmp is not None:
+                os.replace(tmp, dest)
+        except BaseException:
+            conn.close()
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+            raise
+        if not resp.isclosed() and keep is not None:
+            conn.close()  # the rest of the resource is still unread
+        else:
+            self._finish(scheme, netloc, conn, resp)
+        return body if dest is None else written
+
+    @staticmethod
+    def _check_content_range(resp, byterange: Optional[Tuple[int, int]], url: str):
+        """A 206 must cover exactly the requested range (Content-Range: bytes first-last/total)."""
+        if byterange is None:
+            raise HttpError(f"HTTP 206 to a plain GET for {url}")
+        length, offset = byterange
+        unit, _, span = (resp.getheader("Content-Range") or "").partition("/")[0].strip().partition(" ")
+        if unit != "bytes" or span.strip() != f"{offset}-{offset + length - 1}":
+            raise HttpError(f"HTTP 206 with Content-Range {resp.getheader('Content-Range')!r} "
+                            f"for bytes {offset}-{offset + length - 1} of {url}")
+
+    @staticmethod
+    def _range_chunks(resp, skip: int, keep: Optional[int], size: int = 64 * 1024) -> Iterator[bytes]:
+        """The body in chunks, minus `skip` leading bytes and stopping after `keep` (None = all)."""
+        while True:
+            chunk = resp.read(size)
+            if not chunk:
+                return
+            if skip:
+                cut = min(skip, len(chunk))
+                chunk, skip = chunk[cut:], skip - cut
+            if keep is not None:
+                chunk = chunk[:keep]
+                keep -= len(chunk)
+            if chunk:
+                yield chunk
+            if keep == 0:
+                return
+
+    def peek(self, url: str, limit: int) -> Tuple[Dict[str, str], bytes]:
+        """GET at most `limit` bytes of url. Returns (lower-cased headers, body prefix)."""
+        scheme, netloc, conn, resp = self._open(url)
+        headers = {k.lower(): v for k, v in resp.getheaders()}
+        try:
+            body = resp.read(limit)
+            if resp.read(1):
+                conn.close()  # body longer than limit: the connection can't be reused
+                return headers, body
+        except Exception:
+            conn.close()
+            raise
+        self._finish(scheme, netloc, conn, resp)
+        return headers, body
+
+http_pool = HttpPool()
+abort_event = threading.Event()
+
+def load_media_playlist(url: str, st: Optional["DownloadStatus"] = None) -> Tuple[str, MediaPlaylist]:
+    """Fetch url; if it is a master playlist, follow the variant --variant picks (highest bandwidth by default)."""
+    text = http_pool.fetch(url).decode("utf-8", "replace")
+    if is_master_playlist(text):
+        variants = parse_master_playlist(text, url)
+        if not variants:
+            raise HttpError("master playlist without variants")
+        index, best, budget = (variant_policy or VariantPolicy()).choose(variants)
+        if st is not None:
+            note_variant(st, index, best, budget)
+        url = best["URI"]
+        text = http_pool.fetch(url).decode("utf-8", "replace")
+    return url, parse_media_playlist(text, url)
+
+def master_variants(url: str) -> List[Dict[str, str]]:
+    """Variants of url when it is a master playlist; [] otherwise or when it can't be read."""
+    try:
+        _, body = http_pool.peek(url, PLAYLIST_PEEK_BYTES)
+    except Exception:
+        return []
+    text = body.decode("utf-8", "replace")
+    return parse_master_playlist(text, url) if is_master_playlist(text) else []
+
+def note_variant(st: "DownloadStatus", index: int, variant: Dict[str, str], budget: Optional[float]):
+    st.variant_bps = variant_bitrate(variant)
+    what = variant.get("RESOLUTION") or f"variant {index}"
+    st.last_log = f"{EMOJI_TELESCOPE} {what} @ {human_bitrate(st.variant_bps)}" + \
+        (f" (budget {human_bitrate(budget)})" if budget else "")
+    if metrics is not None:
+        metrics.emit("variant", st, index=index, bandwidth=st.variant_bps, resolution=variant.get("RESOLUTION"),
+                     policy=variant_policy.mode if variant_policy else "max",
+                     budget=round(budget) if budget is not None else None)
+
+# ---------- Probe stage ----------
+def cache_dir() -> str:
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "m3u8pv")
+
+def playlist_fingerprint(url: str) -> str:
+    """Hash of the playlist text (or of the validators of a non-playlist URL); '' when unreachable."""
+    try:
+        headers, body = http_pool.peek(url, PLAYLIST_PEEK_BYTES)
+    except Exception:
+        return ""
+    if body.lstrip().startswith(b"#EXTM3U"):
+        return hashlib.sha1(body).hexdigest()
+    validators = "|".join(headers.get(h, "") for h in ("etag", "last-modified", "content-length"))
+    return hashlib.sha1(validators.encode("utf-8")).hexdigest() if validators.strip("|") else ""
+
+class ProbeCache:
+    """On-disk ffprobe results keyed by URL plus playlist fingerprint."""
+
+    def __init__(self, path: str, max_entries: int = PROBE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries: Dict[str, dict] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                self._entries = json.load(fh)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def key(url: str, fingerprint: str) -> str:
+        return hashlib.sha1(f"{url}\0{fingerprint}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[ProbeResult]:
+        with self._lock:
+            ent = self._entries.get(key)
+        return ProbeResult.from_dict(ent["result"]) if ent else None
+
+    def put(self, key: str, result: ProbeResult):
+        with self._lock:
+            self._entries[key] = {"t": time.time(), "result": result.to_dict()}
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = self._entries
+            if len(entries) > self.max_entries:
+                newest = sorted(entries.items(), key=lambda kv: kv[1].get("t", 0), reverse=True)
+                entries = self._entries = dict(newest[:self.max_entries])
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(entries, fh)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+probe_cache: Optional[ProbeCache] = None
+
+def probe_cached(url: str) -> Optional[ProbeResult]:
+    if probe_cache is None:
+        return probe_stream(url)
+    fingerprint = playlist_fingerprint(url)
+    if not fingerprint:
+        return probe_stream(url)  # nothing stable to key on (e.g. unreachable); don't cache
+    key = ProbeCache.key(url, fingerprint)
+    result = probe_cache.get(key)
+    if result is None:
+        result = probe_stream(url)
+        if result is not None:
+            probe_cache.put(key, result)
+    return result
+
+def probe_job(idx: int):
+    """Probe-stage worker: runs on its own small pool ahead of the download pool."""
+    st = statuses[idx]
+    if abort_event.is_set() or (journal is not None and journal.is_done(st.key)):
+        return
+    st.state = "probing"
+    st.last_log = f"{EMOJI_TELESCOPE} scanning target"
+    try:
+        st.probe = probe_cached(st.url)
+    except Exception:
+        st.probe = None
+    if variant_policy is not None and variant_policy.mode != "max":
+        # the choice itself waits for launch, when the link estimate is current
+        st.variants = master_variants(st.url)
+    st.duration_seconds = st.probe.duration if st.probe else None
+    st.probed = True
+    st.state = "queued"
+    st.last_log = f"{EMOJI_ROCKET} scanned, awaiting launch window"
+
+# ---------- Segment cache ----------
+class SegmentCache:
+    """Content-addressed on-disk segment store shared by all jobs (and later runs).
+
+    Entries are keyed by sha1 of the resolved segment URI plus byte range and sharded by the first
+    two hex digits. Files are hard-linked into a job's segment store where possible, so a hit costs
+    no copy. The total is capped with LRU eviction (recency = mtime, bumped on every hit).
+    Concurrent fetches of the same segment within one run are collapsed into one download.
+    """
+
+    def __init__(self, root: str, max_bytes: int = SEGMENT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: "collections.OrderedDict[str, int]" = collections.OrderedDict()  # key -> size, LRU first
+        self._inflight: Dict[str, threading.Event] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_bytes = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+        entries = []
+        for shard in os.scandir(root):
+            if not shard.is_dir():
+                continue
+            for ent in os.scandir(shard.path):
+                if ent.name.endswith(".tmp"):
+                    continue
+                try:
+                    stt = ent.stat()
+                except OSError:
+                    continue
+                entries.append((stt.st_mtime, ent.name, stt.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.bytes += size
+        self._evict()  # the cap may have shrunk since the last run
+
+    @staticmethod
+    def key(uri: str, byterange: Optional[Tuple[int, int]] = None) -> str:
+        spec = f"{uri}\0{byterange[0]}@{byterange[1]}" if byterange else uri
+        return hashlib.sha1(spec.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Path of a cached entry (marked most recently used), or None."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                size = self._index.pop(key, None)
+                if size is not None:
+                    self.bytes -= size  # evicted by another process
+            return None
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+            else:  # stored by another process since we indexed
+                self._index[key] = os.path.getsize(path)
+                self.bytes += self._index[key]
+        return path
+
+    def _store(self, key: str, src: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)  # different filesystem
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            if key not in self._index:
+                self.bytes += size
+            self._index[key] = size
+            self._index.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        evict = []
+        with self._lock:
+            while self.bytes > self.max_bytes and len(self._index) > 1:
+                old, old_size = self._index.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+                evict.append(old)
+        for old in evict:
+            try:
+                os.remove(self._path(old))
+            except OSError:
+                pass
+
+    def _claim(self, key: str) -> Optional[threading.Event]:
+        """Returns an Event to set when done if we own the fetch; waits out another owner otherwise."""
+        with self._lock:
+            ev = self._inflight.get(key)
+            if ev is None:
+                ev = self._inflight[key] = threading.Event()
+                return ev
+        ev.wait()
+        return None
+
+    def _release(self, key: str, ev: threading.Event):
+        with self._lock:
+            self._inflight.pop(key, None)
+        ev.set()
+
+    def fetch_to(self, uri: str, dest: str, byterange: Optional[Tuple[int, int]] = None, on_bytes=None) -> int:
+        """Like HttpPool.fetch into dest, served from the cache when possible."""
+        key = self.key(uri, byterange)
+        owner = None
+        while True:
+            cached = self._lookup(key)
+            if cached is not None:
+                tmp = dest + ".part"
+                try:
+                    os.link(cached, tmp)
+                except OSError:
+                    shutil.copyfile(cached, tmp)
+                os.replace(tmp, dest)
+                size = os.path.getsize(dest)
+                with self._lock:
+                    self.hits += 1
+                    self.saved_bytes += size
+                if on_bytes:
+                    on_bytes(size)
+                return size
+            owner = self._claim(key)
+            if owner is not None:
+                break
+            # someone else was fetching it: look again (and fetch ourselves if they failed)
+        try:
+            with self._lock:
+                self.misses += 1
+            size = http_pool.fetch(uri, dest=dest, byterange=byterange, on_bytes=on_bytes)
+            try:
+                self._store(key, dest)
+            except OSError:
+                pass  # cache trouble never fails a download
+            return size
+        finally:
+            self._release(key, owner)
+
+    def summary(self) -> str:
+        looked = self.hits + self.misses
+        rate = f" ({self.hits / looked * 100:.0f}% hit)" if looked else ""
+        return (f"segment cache: {self.hits} hit(s), {self.misses} miss(es){rate}, "
+                f"{human_bytes(self.saved_bytes)} not re-fetched, {human_bytes(self.bytes)} cached")
+
+segment_cache: Optional[SegmentCache] = None
+
+def fetch_segment_file(seg: HlsSegment, dest: str, on_bytes=None) -> int:
+    if segment_cache is not None:
+        return segment_cache.fetch_to(seg.uri, dest, byterange=seg.byterange, on_bytes=on_bytes)
+    return http_pool.fetch(seg.uri, dest=dest, byterange=seg.byterange, on_bytes=on_bytes)
+
+# ---------- Resume journal ----------
+class ResumeJournal:
+    """Append-only JSONL journal keyed by URL: output name, finished segments, finished outputs.
+
+    A rerun over the same urls file reuses the recorded output names, skips outputs that already
+    landed and, for the native engine, only fetches segments that are not on disk yet.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self._load()
+        self._compact()
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _entry(self, key: str) -> dict:
+        ent = self._entries.get(key)
+        if ent is None:
+            ent = self._entries[key] = {"outfile": None, "segs": set(), "done": False, "media": None}
+        return ent
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                ent = self._entry(rec["url"])
+                if "outfile" in rec:
+                    ent["outfile"] = rec["outfile"]
+                if "media" in rec:
+                    ent["media"] = rec["media"]
+                if "seg" in rec:
+                    ent["segs"].add(rec["seg"])
+                if rec.get("done"):
+                    ent["done"] = True
+                    ent["segs"].clear()
+                if rec.get("reset"):
+                    ent["segs"].clear()
+                    ent["done"] = False
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for key, ent in self._entries.items():
+                rec = {"url": key, "outfile": ent["outfile"], "done": ent["done"]}
+                if ent["media"]:
+                    rec["media"] = ent["media"]
+                fh.write(json.dumps(rec) + "\n")
+                for seq in sorted(ent["segs"]):
+                    fh.write(json.dumps({"url": key, "seg": seq}) + "\n")
+        os.replace(tmp, self.path)
+
+    def _append(self, rec: dict):
+        self._fh.write(json.dumps(rec) + "\n")
+        self._fh.flush()
+
+    def outfile_for(self, key: str) -> str:
+        """Return the output name recorded for key, assigning (and journaling) a new one if needed."""
+        with self._lock:
+            ent = self._entry(key)
+            if not ent["outfile"]:
+                ent["outfile"] = safe_filename()
+                self._append({"url": key, "outfile": ent["outfile"]})
+            return ent["outfile"]
+
+    def is_done(self, key: str) -> bool:
+        with self._lock:
+            ent = self._entries.get(key)
+            return bool(ent and ent["done"] and ent["outfile"] and os.path.isfile(ent["outfile"]))
+
+    def has_segment(self, key: str, seq: int) -> bool:
+        with self._lock:
+            ent = self._entries.get(key)
+            return bool(ent and seq in ent["segs"])
+
+    def segment_done(self, key: str, seq: int):
+        with self._lock:
+            self._entry(key)["segs"].add(seq)
+            self._append({"url": key, "seg": seq})
+
+    def mark_done(self, key: str, outfile: str):
+        with self._lock:
+            ent = self._entry(key)
+            ent["done"] = True
+            ent["outfile"] = outfile
+            ent["segs"].clear()
+            self._append({"url": key, "outfile": outfile, "done": True})
+
+    def use_media(self, key: str, media_url: str) -> bool:
+        """Record which media playlist (rendition) key's segments come from.
+
+        Returns True when segments were journaled for a different one (--variant can pick another
+        rendition on a rerun); those are forgotten and the caller must drop the files.
+        """
+        with self._lock:
+            ent = self._entry(key)
+            if ent["media"] == media_url:
+                return False
+            stale = bool(ent["segs"])
+            ent["segs"].clear()
+            ent["media"] = media_url
+            self._append({"url": key, "reset": True, "media": media_url})
+            return stale
+
+    def reset(self, key: str):
+        """Forget finished segments for key (e.g. the playlist changed under us)."""
+        with self._lock:
+            ent = self._entry(key)
+            ent["segs"].clear()
+            ent["done"] = False
+            self._append({"url": key, "reset": True})
+
+    def close(self):
+        with self._lock:
+            try:
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+            except Exception:
+                pass
+            self._fh.close()
+
+journal: Optional[ResumeJournal] = None
+
+def keyed_urls(urls: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """(url, journal key) per URL; repeated URLs get '#2', '#3', ... so they never share an output."""
+    seen: Dict[str, int] = {}
+    for url in urls:
+        n = seen.get(url, 0) + 1
+        seen[url] = n
+        yield url, url if n == 1 else f"{url}#{n}"
+
+# ---------- Metrics ----------
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+def stage_timings(st: "DownloadStatus") -> Dict[str, float]:
+    """Seconds spent per stage: probe, connect (launch -> first byte), transfer, remux, total."""
+    out = {}
+
+    def span(name, a, b):
+        if a is not None and b is not None and b >= a:
+            out[name] = b - a
+
+    span("probe", st.probe_started_at, st.probe_ended_at)
+    span("connect", st.started_at, st.first_byte_at)
+    span("transfer", st.first_byte_at, st.remux_started_at or st.verify_started_at or st.finished_at)
+    span("remux", st.remux_started_at, st.verify_started_at or st.finished_at)
+    span("verify", st.verify_started_at, st.finished_at)
+    span("total", st.queued_at, st.finished_at)
+    return out
+
+class MetricsSink:
+    """JSONL event stream and/or Prometheus textfile, fed from DownloadStatus transitions."""
+
+    def __init__(self, events_path: Optional[str] = None, prom_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._events = open(events_path, "a", encoding="utf-8") if events_path else None
+        self.prom_path = prom_path
+        self._hist: Dict[str, List[int]] = {}
+        self._hist_sum: Dict[str, float] = {}
+        self._hist_count: Dict[str, int] = {}
+        self._finished: Dict[str, int] = {"done": 0, "verified": 0, "failed": 0, "cancelled": 0}
+        self._last_sample: Dict[int, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def emit(self, event: str, st: Optional["DownloadStatus"] = None, **fields):
+        if self._events is None:
+            return
+        rec = {"ts": round(time.time(), 3), "event": event}
+        if st is not None:
+            rec["job"] = st.idx
+            rec["url"] = st.url
+        rec.update(fields)
+        line = json.dumps(rec)
+        with self._lock:
+            self._events.write(line + "\n")
+            self._events.flush()
+
+    def on_transition(self, st: "DownloadStatus", old: str, new: str):
+        if new == "probing":
+            self.emit("probe_start", st)
+        elif old == "probing":
+            fields = {}
+            if st.probe is not None:
+                fields = {"duration": st.probe.duration, "streams": len(st.probe.streams)}
+            self.emit("probe_end", st, **fields)
+
+    def on_first_byte(self, st: "DownloadStatus"):
+        self.emit("first_byte", st, connect_s=round(st.first_byte_at - st.started_at, 3) if st.started_at else None)
+
+    def on_progress(self, st: "DownloadStatus"):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sample.get(st.idx, 0.0) < PROGRESS_SAMPLE_INTERVAL:
+                return
+            self._last_sample[st.idx] = now
+        fields = {"live_lag": round(st.live_lag, 3)} if st.live_lag is not None else {}
+        self.emit("progress", st, bytes=st.size_bytes, seconds=st.progress_seconds,
+                  percent=st.percent, speed=st.speed_str, **fields)
+
+    def job_finished(self, st: "DownloadStatus"):
+        """Terminal event for st; called once per job from the engine's completion path."""
+        state = st.state if st.state in self._finished else "failed"
+        timings = stage_timings(st)
+        with self._lock:
+            self._finished[state] += 1
+            for stage, secs in timings.items():
+                buckets = self._hist.setdefault(stage, [0] * len(STAGE_BUCKETS))
+                for i, le in enumerate(STAGE_BUCKETS):
+                    if secs <= le:
+                        buckets[i] += 1
+                self._hist_sum[stage] = self._hist_sum.get(stage, 0.0) + secs
+                self._hist_count[stage] = self._hist_count.get(stage, 0) + 1
+            self._last_sample.pop(st.idx, None)
+        fields = {"bytes": st.size_bytes, "outfile": st.outfile,
+                  "stages": {k: round(v, 3) for k, v in timings.items()}}
+        if state == "failed":
+            err_lines = (st.err_message or st.last_log or "").strip().splitlines()
+            fields["error"] = err_lines[-1] if err_lines else None
+        self.emit(state, st, **fields)
+
+    def prometheus_text(self) -> str:
+        states: Dict[str, int] = {}
+        total_bytes = 0
+        with statuses_lock:
+            items = list(statuses.values())
+            if results is not None:
+                states.update(results.counts)
+                total_bytes = results.bytes
+        lags = []
+        for st in items:
+            states[st.state] = states.get(st.state, 0) + 1
+            total_bytes += st.size_bytes or 0
+            if st.live_lag is not None and st.state == "downloading":
+                lags.append(st.live_lag)
+        lines = [
+            "# HELP m3u8pv_jobs Jobs by current state.",
+            "# TYPE m3u8pv_jobs gauge",
+        ]
+        for state in ("queued", "probing", "downloading", "remuxing", "verifying", "done", "verified", "failed",
+                      "cancelled"):
+            lines.append(f'm3u8pv_jobs{{state="{state}"}} {states.get(state, 0)}')
+        lines += [
+            "# HELP m3u8pv_queue_depth Jobs waiting to be probed or for a download slot.",
+            "# TYPE m3u8pv_queue_depth gauge",
+            f"m3u8pv_queue_depth {states.get('queued', 0) + states.get('probing', 0)}",
+            "# HELP m3u8pv_bytes_total Bytes written by all jobs.",
+            "# TYPE m3u8pv_bytes_total counter",
+            f"m3u8pv_bytes_total {total_bytes}",
+        ]
+        if lags:
+            lines += [
+                "# HELP m3u8pv_live_lag_seconds Media time listed by live feeds but not yet recorded.",
+                "# TYPE m3u8pv_live_lag_seconds gauge",
+                f'm3u8pv_live_lag_seconds{{stat="max"}} {max(lags):.3f}',
+                f'm3u8pv_live_lag_seconds{{stat="mean"}} {sum(lags) / len(lags):.3f}',
+                "# HELP m3u8pv_live_feeds Live feeds being recorded.",
+                "# TYPE m3u8pv_live_feeds gauge",
+                f"m3u8pv_live_feeds {len(lags)}",
+            ]
+        if scheduler is not None:
+            lines += [
+                "# HELP m3u8pv_throughput_bytes_per_second Aggregate throughput at the last scheduler sample.",
+                "# TYPE m3u8pv_throughput_bytes_per_second gauge",
+                f"m3u8pv_throughput_bytes_per_second {scheduler.throughput:.1f}",
+                "# HELP m3u8pv_slots Download slots in use and the current limit.",
+                "# TYPE m3u8pv_slots gauge",
+                f'm3u8pv_slots{{kind="active"}} {scheduler.active}',
+                f'm3u8pv_slots{{kind="limit"}} {int(scheduler.limit)}',
+            ]
+            if scheduler.measure:
+                lines += [
+                    "# HELP m3u8pv_link_estimate_bytes_per_second Link capacity estimate used by --variant fit.",
+                    "# TYPE m3u8pv_link_estimate_bytes_per_second gauge",
+                    f"m3u8pv_link_estimate_bytes_per_second {scheduler.link_estimate:.1f}",
+                ]
+        if segment_cache is not None:
+            lines += [
+                "# HELP m3u8pv_segment_cache_lookups_total Segment cache lookups by result.",
+                "# TYPE m3u8pv_segment_cache_lookups_total counter",
+                f'm3u8pv_segment_cache_lookups_total{{result="hit"}} {segment_cache.hits}',
+                f'm3u8pv_segment_cache_lookups_total{{result="miss"}} {segment_cache.misses}',
+                "# HELP m3u8pv_segment_cache_bytes Bytes held in the segment cache.",
+                "# TYPE m3u8pv_segment_cache_bytes gauge",
+                f"m3u8pv_segment_cache_bytes {segment_cache.bytes}",
+            ]
+        with self._lock:
+            finished = dict(self._finished)
+            hist = {k: list(v) for k, v in self._hist.items()}
+            hsum = dict(self._hist_sum)
+            hcount = dict(self._hist_count)
+        lines += [
+            "# HELP m3u8pv_jobs_finished_total Jobs that reached a terminal state.",
+            "# TYPE m3u8pv_jobs_finished_total counter",
+        ]
+        for state, n in finished.items():
+            lines.append(f'm3u8pv_jobs_finished_total{{state="{state}"}} {n}')
+        lines += [
+            "# HELP m3u8pv_failures_total Failed jobs.",
+            "# TYPE m3u8pv_failures_total counter",
+            f"m3u8pv_failures_total {finished['failed']}",
+            "# HELP m3u8pv_stage_seconds Time spent per job stage.",
+            "# TYPE m3u8pv_stage_seconds histogram",
+        ]
+        for stage in sorted(hist):
+            for le, n in zip(STAGE_BUCKETS, hist[stage]):
+                lines.append(f'm3u8pv_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {n}')
+            lines.append(f'm3u8pv_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hcount[stage]}')
+            lines.append(f'm3u8pv_stage_seconds_sum{{stage="{stage}"}} {hsum[stage]:.3f}')
+            lines.append(f'm3u8pv_stage_seconds_count{{stage="{stage}"}} {hcount[stage]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        if not self.prom_path:
+            return
+        # textfile collectors may read at any time: write aside, then rename into place
+        tmp = f"{self.prom_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(self.prometheus_text())
+        os.replace(tmp, self.prom_path)
+
+    def _flush_loop(self):
+        while not self._stop.wait(METRICS_FLUSH_INTERVAL):
+            try:
+                self.write_prometheus()
+            except OSError:
+                pass
+
+    def start(self):
+        if self.prom_path:
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        try:
+            self.write_prometheus()
+        except OSError as e:
+            eprint(colored(f"Warning: could not write {self.prom_path}: {e}", COLOR_YELLOW))
+        if self._events is not None:
+            with self._lock:
+                self._events.close()
+                self._events = None
+
+metrics: Optional[MetricsSink] = None
+
+def record_bytes(st: "DownloadStatus"):
+    """Call after st.size_bytes moved: stamps first byte and feeds progress samples."""
+    if st.first_byte_at is None and st.size_bytes:
+        st.first_byte_at = time.time()
+        if metrics is not None:
+            metrics.on_first_byte(st)
+    if metrics is not None:
+        metrics.on_progress(st)
+
+# ---------- Output layout ----------
+class OutputManager:
+    """Where outputs are written and how they land.
+
+    Writers get a path in a staging directory on the same filesystem as the output directory, and
+    commit() renames the finished file into place, so anything watching the output directory only
+    ever sees complete files (with --verify, only checked ones: finish_verification commits last).
+    Commits are grouped: one flusher thread fsyncs a batch of files, renames them, then fsyncs
+    each directory it touched once. With shard_width set, outputs go into subdirectories named by
+    the first hex digits of a hash of the file name.
+    """
+
+    def __init__(self, out_dir: str = ".", staging_dir: Optional[str] = None, shard_width: int = 0,
+                 fsync: bool = True):
+        self.out_dir = out_dir
+        self.staging_dir = staging_dir or os.path.join(out_dir, OUTPUT_STAGING_NAME)
+        self.shard_width = max(0, min(shard_width, 8))
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        self._pending: List[list] = []  # [staging, final, landed Event, error, then]
+        self._thread: Optional[threading.Thread] = None
+        self.committed = 0
+        self.batches = 0
+
+    def place(self, name: str) -> Tuple[str, str]:
+        """(staging path, final path) for an output name (or a final path from an earlier run)."""
+        base = os.path.basename(name)
+        final_dir = self.out_dir
+        if self.shard_width:
+            final_dir = os.path.join(final_dir, hashlib.sha1(base.encode("utf-8")).hexdigest()[:self.shard_width])
+        return os.path.join(self.staging_dir, base), os.path.join(final_dir, base)
+
+    def commit(self, staging: str, final: str, then=None):
+        """Make staging durable and rename it to final; returns once it has landed.
+
+        With `then`, returns right away instead and then(error or None) is called once the file's
+        batch is done (from the committer thread, so it must not block).
+        """
+        if not self.fsync:
+            try:
+                os.makedirs(os.path.dirname(final) or ".", exist_ok=True)
+                os.replace(staging, final)
+            except OSError as e:
+                if then is None:
+                    raise
+                then(e)
+                return
+            if then is not None:
+                then(None)
+            return
+        item = [staging, final, threading.Event(), None, then]
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name="output-commit", daemon=True)
+                self._thread.start()
+            self._pending.append(item)
+            self._cond.notify()
+        if then is not None:
+            return
+        item[2].wait()
+        if item[3] is not None:
+            raise item[3]
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # let a batch build up for a moment; a full batch goes right away
+                deadline = time.monotonic() + OUTPUT_COMMIT_INTERVAL
+                while len(self._pending) < OUTPUT_COMMIT_BATCH:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                batch, self._pending = self._pending, []
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # keep the committer alive; whatever didn't land reports the error to its caller
+                for item in batch:
+                    if item[3] is None and os.path.lexists(item[0]):
+                        item[3] = e
+            finally:
+                for item in batch:
+                    item[2].set()
+                    if item[4] is not None:
+                        try:
+                            item[4](item[3])
+                        except Exception as e:
+                            eprint(colored(f"Warning: after committing {item[1]}: {e}", COLOR_YELLOW))
+
+    def _flush(self, batch: List[list]):
+        dirs = set()
+        for item in batch:
+            staging, final = item[0], item[1]
+            try:
+                fd = os.open(staging, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                final_dir = os.path.dirname(final) or "."
+                os.makedirs(final_dir, exist_ok=True)
+                os.replace(staging, final)
+                dirs.add(final_dir)
+                self.committed += 1
+            except Exception as e:
+                item[3] = e
+        for d in dirs:
+            try:
+                fd = os.open(d, os.O_RDONLY)
+                try:
+                    os.fsync(fd)  # persist the renames
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass  # directories can't be fsynced everywhere (e.g. Windows)
+        self.batches += 1
+
+outputs = OutputManager()
+
+def preallocate(fh, size: int):
+    """Reserve size bytes for a file about to be written front to back (fewer fragments)."""
+    if size < PREALLOCATE_MIN_BYTES or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fh.fileno(), 0, size)
+    except OSError:
+        pass  # not supported by this filesystem
+
+# ---------- Download worker and status ----------
+SUCCESS_STATES = ("done", "verified")  # verified: --verify checked the output before it landed
+FINISHED_STATES = SUCCESS_STATES + ("failed", "cancelled")
+
+class DownloadStatus:
+    # slots keep a resident status at a few hundred bytes; with --stream only in-flight jobs are resident
+    __slots__ = ("idx", "url", "key", "outfile", "_state", "progress_seconds", "duration_seconds", "percent",
+                 "size_bytes", "speed_str", "last_log", "returncode", "err_message", "probe", "probed",
+                 "queued_at", "probe_started_at", "probe_ended_at", "started_at", "first_byte_at",
+                 "remux_started_at", "verify_started_at", "finished_at", "live_lag", "variants", "variant_bps",
+                 "staging")
+
+    def __init__(self, idx: int, url: str):
+        self.idx = idx
+        self.url = url
+        self.key = url  # journal key (see keyed_urls)
+        self.outfile: Optional[str] = None
+        self._state: str = "queued"  # queued, probing, downloading, remuxing, [verifying,] done/verified, failed, cancelled
+        self.progress_seconds: Optional[float] = None
+        self.duration_seconds: Optional[float] = None
+        self.percent: Optional[float] = None
+        self.size_bytes: Optional[int] = None
+        self.speed_str: Optional[str] = None
+        self.last_log: str = ""
+        self.returncode: Optional[int] = None
+        self.err_message: Optional[str] = None
+        self.probe: Optional[ProbeResult] = None
+        self.probed = False  # set by the probe stage, even when ffprobe had nothing to say
+        # stage timestamps (epoch seconds), stamped on state transitions
+        self.queued_at: float = time.time()
+        self.probe_started_at: Optional[float] = None
+        self.probe_ended_at: Optional[float] = None
+        self.started_at: Optional[float] = None
+        self.first_byte_at: Optional[float] = None
+        self.remux_started_at: Optional[float] = None
+        self.verify_started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.live_lag: Optional[float] = None  # --live: media seconds listed by the server but not yet written
+        self.variants: Optional[List[Dict[str, str]]] = None  # --variant: master playlist variants, until launch
+        self.variant_bps: Optional[int] = None  # bits/s of the variant picked at launch
+        self.staging: Optional[str] = None  # --verify: finished output waiting in staging to be checked
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @state.setter
+    def state(self, new: str):
+        old = self._state
+        if new == old:
+            return
+        self._state = new
+        now = time.time()
+        if new == "probing":
+            self.probe_started_at = now
+        elif old == "probing":
+            self.probe_ended_at = now
+        if new == "downloading":
+            self.started_at = now
+        elif new == "remuxing":
+            self.remux_started_at = now
+        elif new == "verifying":
+            self.verify_started_at = now
+        elif new in FINISHED_STATES:
+            self.finished_at = now
+        if metrics is not None:
+            metrics.on_transition(self, old, new)
+
+    def brief_outfile(self, width=30):
+        if not self.outfile:
+            return "N/A"
+        s = self.outfile
+        if len(s) <= width:
+            return s
+        return "..." + s[-(width-3):]
+
+statuses_lock = threading.Lock()
+statuses: Dict[int, DownloadStatus] = {}
+active_procs_lock = threading.Lock()
+active_procs: Dict[int, subprocess.Popen] = {}
+
+def iter_urls(path: str) -> Iterator[str]:
+    """URLs from a urls file, read lazily (blank lines and # comments skipped)."""
+    with open(path, "r", encoding="utf-8") as fh:
+        for ln in fh:
+            ln = ln.strip()
+            if not ln or ln.startswith("#"):
+                continue
+            yield ln
+
+class ResultSpill:
+    """Finished jobs written to a JSONL results file and dropped from `statuses`.
+
+    Used by --stream so memory holds only in-flight jobs; the UI, scheduler and metrics add the
+    spilled counters to whatever is still resident.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fh = open(path, "w", encoding="utf-8")
+        self.counts: Dict[str, int] = {"done": 0, "verified": 0, "failed": 0, "cancelled": 0}
+        self.bytes = 0
+
+    def retire(self, st: DownloadStatus, drop: bool = True):
+        rec = {"job": st.idx, "url": st.url, "state": st.state, "outfile": st.outfile,
+               "bytes": st.size_bytes, "duration": st.duration_seconds}
+        if st.variant_bps is not None:
+            rec["variant_bps"] = st.variant_bps
+        if st.state not in SUCCESS_STATES:
+            rec["error"] = st.err_message or st.last_log
+        with statuses_lock:
+            # counters and the resident set change together so the UI never double-counts
+            if drop:
+                statuses.pop(st.idx, None)
+                self.counts[st.state if st.state in self.counts else "failed"] += 1
+                self.bytes += st.size_bytes or 0
+        self._write(st, rec)
+
+    def _write(self, st: DownloadStatus, rec: dict):
+        line = json.dumps(rec)
+        with self._lock:
+            self._fh.write(line + "\n")
+            self._fh.flush()
+
+    def failures(self) -> Iterator[dict]:
+        with open(self.path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("state") not in SUCCESS_STATES:
+                    yield rec
+
+    def close(self):
+        with self._lock:
+            self._fh.close()
+
+class JobQueue(ResultSpill):
+    """Shared SQLite job queue: several m3u8pv processes (or hosts) drain one batch.
+
+    A worker claims one queued job at a time inside a write transaction, holds it under a lease
+    that a heartbeat thread keeps extending, and records the outcome when the job finishes. A job
+    whose lease runs out (worker crashed or lost the disk) goes back up for grabs, up to
+    QUEUE_MAX_ATTEMPTS claims. Output names are fixed at enqueue time, so whoever picks a job up
+    writes the same file.
+
+    Doubles as the results store for --queue runs (same interface as ResultSpill).
+    """
+
+    def __init__(self, path: str, shared_fs: bool = False, lease: float = QUEUE_LEASE_SECONDS):
+        self.path = path
+        self._lock = threading.Lock()
+        self.counts = {"done": 0, "verified": 0, "failed": 0, "cancelled": 0}
+        self.bytes = 0
+        self.lease = lease
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._db = sqlite3.connect(path, timeout=QUEUE_BUSY_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+        # WAL needs shared memory, i.e. every worker on the same host; across a network
+        # filesystem fall back to the rollback journal and plain file locks
+        self._db.execute("PRAGMA journal_mode=" + ("DELETE" if shared_fs else "WAL"))
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                url TEXT NOT NULL,
+                outfile TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'queued',
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER,
+                error TEXT,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, lease_until);
+        """)
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    @contextlib.contextmanager
+    def _tx(self):
+        """BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same job."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._db
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def enqueue(self, urls: Iterable[str]) -> int:
+        """Add urls (duplicate URLs keyed '#2', '#3', ... like the journal); known keys are skipped."""
+        added = 0
+        now = time.time()
+        with self._lock, self._tx() as db:
+            for url, key in keyed_urls(urls):
+                cur = db.execute("INSERT OR IGNORE INTO jobs (key, url, outfile, updated_at) VALUES (?, ?, ?, ?)",
+                                 (key, url, safe_filename(), now))
+                added += cur.rowcount
+        return added
+
+    def claim(self) -> Optional[Tuple[int, str, str, str]]:
+        """Atomically take the next queued (or lease-expired) job: (id, key, url, outfile)."""
+        while True:
+            now = time.time()
+            with self._lock, self._tx() as db:
+                row = db.execute(
+                    "SELECT id, key, url, outfile, attempts FROM jobs WHERE state = 'queued'"
+                    " OR (state = 'claimed' AND lease_until < ?) ORDER BY id LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    return None
+                job_id, key, url, outfile, attempts = row
+                if attempts >= QUEUE_MAX_ATTEMPTS:
+                    db.execute("UPDATE jobs SET state = 'failed', worker = NULL, lease_until = NULL,"
+                               " error = ?, updated_at = ? WHERE id = ?",
+                               (f"lease expired {attempts} time(s); giving up", now, job_id))
+                    continue
+                db.execute("UPDATE jobs SET state = 'claimed', worker = ?, lease_until = ?,"
+                           " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                           (self.worker, now + self.lease, now, job_id))
+            return job_id, key, url, outfile
+
+    def pending(self) -> int:
+        """Jobs not finished yet (queued or held by some worker)."""
+        return self._read("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'claimed')")[0][0]
+
+    def _read(self, sql: str, params=()) -> list:
+        """Queries keep working after close() (the final summary runs once the queue is shut)."""
+        with self._lock:
+            if self._db is not None:
+                return self._db.execute(sql, params).fetchall()
+        db = sqlite3.connect(self.path, timeout=QUEUE_BUSY_TIMEOUT)
+        try:
+            return db.execute(sql, params).fetchall()
+        finally:
+            db.close()
+
+    def state_counts(self) -> Dict[str, int]:
+        return dict(self._read("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+
+    def start_heartbeat(self):
+        self._heartbeat = threading.Thread(target=self._beat, name="queue-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        while not self._stop.wait(self.lease / 3):
+            try:
+                with self._lock:
+                    self._db.execute("UPDATE jobs SET lease_until = ? WHERE state = 'claimed' AND worker = ?",
+                                     (time.time() + self.lease, self.worker))
+            except sqlite3.Error as e:
+                eprint(colored(f"Warning: queue heartbeat failed: {e}", COLOR_YELLOW))
+
+    def _write(self, st: DownloadStatus, rec: dict):
+        now = time.time()
+        with self._lock:
+            if self._db is None:
+                return  # finished after shutdown; the lease lapses and another worker redoes it
+            if st.state == "cancelled" or (abort_event.is_set() and st.state not in SUCCESS_STATES):
+                # stopped here (Ctrl-C kills ffmpeg, which reads as a failure), not a bad job:
+                # hand it straight back without burning an attempt
+                self._db.execute("UPDATE jobs SET state = 'queued', worker = NULL, lease_until = NULL,"
+                                 " attempts = MAX(attempts - 1, 0), updated_at = ? WHERE id = ? AND worker = ?",
+                                 (now, st.idx, self.worker))
+            else:
+                # the worker check drops the result if our lease lapsed and someone else took over
+                self._db.execute("UPDATE jobs SET state = ?, lease_until = NULL, bytes = ?,"
+                                 " error = ?, updated_at = ? WHERE id = ? AND worker = ?",
+                                 ("done" if st.state in SUCCESS_STATES else "failed", rec["bytes"], rec.get("error"),
+                                  now, st.idx, self.worker))
+
+    def failures(self) -> Iterator[dict]:
+        rows = self._read("SELECT id, url, state, error FROM jobs WHERE state = 'failed' AND worker = ?"
+                          " ORDER BY id", (self.worker,))
+        for job_id, url, state, error in rows:
+            yield {"job": job_id, "url": url, "state": state, "error": error}
+
+    def close(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join(timeout=2.0)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+results: Optional[ResultSpill] = None
+
+def assign_outfile(st: DownloadStatus) -> str:
+    """Name st's output; returns the staging path to write, st.outfile is where it lands."""
+    # --queue fixes the name at enqueue time so a reclaimed job resumes into the same file
+    name = st.outfile or (journal.outfile_for(st.key) if journal is not None else safe_filename())
+    staging, st.outfile = outputs.place(name)
+    os.makedirs(os.path.dirname(staging) or ".", exist_ok=True)
+    return staging
+
+def land_output(st: DownloadStatus, staging: str) -> bool:
+    """Commit a finished staging file to st.outfile and journal it; on failure st is marked failed.
+
+    With --verify nothing is committed here: st.staging holds the file for start_verify, and
+    finish_verification lands it only if it passes.
+    """
+    if verify_pool is not None:
+        st.staging = staging
+        return True
+    try:
+        outputs.commit(staging, st.outfile)
+    except OSError as e:
+        st.state = "failed"
+        st.err_message = f"could not move the output into place: {e}"
+        return False
+    if journal is not None:
+        journal.mark_done(st.key, st.outfile)
+    return True
+
+def skip_if_landed(st: DownloadStatus) -> bool:
+    """Mark st done straight from the resume journal when its output already landed."""
+    if journal is None or not journal.is_done(st.key):
+        return False
+    st.outfile = journal.outfile_for(st.key)
+    st.state = "done"
+    st.percent = 100.0
+    st.last_log = f"{EMOJI_PLANET} already landed (resume journal)"
+    return True
+
+def run_download(idx: int, url: str, engine: str = "ffmpeg", segment_workers: int = SEGMENT_CONCURRENCY):
+    st = statuses[idx]
+    if abort_event.is_set():
+        st.state = "cancelled"
+        return
+    if skip_if_landed(st):
+        return
+    if live_options is not None and run_live_download(st, url, segment_workers):
+        return
+    if engine == "native" and run_native_download(st, url, segment_workers):
+        return
+    run_ffmpeg_download(st, url)
+
+def run_native_download(st: DownloadStatus, url: str, segment_workers: int = SEGMENT_CONCURRENCY) -> bool:
+    """Fetch the HLS segments ourselves and remux them locally.
+
+    Returns False (without touching the output) when the stream is not something the native
+    engine handles, so the caller can fall back to plain ffmpeg.
+    """
+    st.state = "probing"
+    st.last_log = f"{EMOJI_TELESCOPE} reading flight plan"
+    try:
+        media_url, playlist = load_media_playlist(url, st)
+    except Exception as e:
+        st.last_log = f"native engine unavailable ({e}); falling back to ffmpeg"
+        return False
+    if not playlist.segments or not playlist.endlist or playlist.encrypted or playlist.has_map:
+        st.last_log = "playlist is live, encrypted or fMP4; falling back to ffmpeg"
+        return False
+
+    outname = assign_outfile(st)
+    st.duration_seconds = playlist.total_duration or None
+    seg_dir = outname + ".segments"
+    if journal is not None and journal.use_media(st.key, media_url):
+        shutil.rmtree(seg_dir, ignore_errors=True)  # segments of another rendition
+    os.makedirs(seg_dir, exist_ok=True)
+
+    segments = playlist.segments
+    seg_paths = [os.path.join(seg_dir, f"{seg.seq:06d}.ts") for seg in segments]
+    progress_lock = threading.Lock()
+    done_seconds = [0.0]
+    done_bytes = [0]
+    started = time.monotonic()
+
+    def on_bytes(n: int):
+        with progress_lock:
+            done_bytes[0] += n
+            st.size_bytes = done_bytes[0]
+            record_bytes(st)
+            elapsed = time.monotonic() - started
+            if elapsed > 0:
+                st.speed_str = human_bytes(done_bytes[0] / elapsed) + "/s"
+
+    failed = threading.Event()
+
+    def fetch_segment(i: int):
+        seg = segments[i]
+        if journal is not None and journal.has_segment(st.key, seg.seq) and os.path.isfile(seg_paths[i]):
+            on_bytes(os.path.getsize(seg_paths[i]))
+            segment_landed(seg, "already on disk")
+            return
+        last_exc = None
+        for attempt in range(SEGMENT_RETRIES):
+            if abort_event.is_set() or failed.is_set():
+                raise HttpError("aborted")
+            try:
+                fetch_segment_file(seg, seg_paths[i], on_bytes=on_bytes)
+                break
+            except Exception as e:
+                last_exc = e
+                time.sleep(0.5 * (attempt + 1))
+        else:
+            failed.set()
+            raise HttpError(f"segment {seg.seq}: {last_exc}")
+        if journal is not None:
+            journal.segment_done(st.key, seg.seq)
+        segment_landed(seg, "landed")
+
+    def segment_landed(seg: HlsSegment, how: str):
+        with progress_lock:
+            done_seconds[0] += seg.duration
+            st.progress_seconds = done_seconds[0]
+            if st.duration_seconds:
+                st.percent = min(100.0, done_seconds[0] / st.duration_seconds * 100.0)
+            st.last_log = f"{EMOJI_COMET} segment {seg.seq} {how} ({len(segments)} total)"
+
+    st.state = "downloading"
+    st.last_log = f"{EMOJI_COMET} fetching {len(segments)} segments from {urlsplit(media_url).netloc}"
+    workers = max(1, min(segment_workers, len(segments)))
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            for fut in concurrent.futures.as_completed([pool.submit(fetch_segment, i) for i in range(len(segments))]):
+                fut.result()
+    except Exception as e:
+        st.state = "failed"
+        st.err_message = f"segment fetch failed: {e}"
+        st.returncode = -1
+        return True
+
+    list_path = os.path.join(seg_dir, "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as fh:
+        for path in seg_paths:
+            fh.write(f"file '{os.path.basename(path)}'\n")
+    local_probe = probe_stream(seg_paths[0])
+    use_aac_bsf = bool(local_probe and local_probe.audio_is_aac)
+    if remux_segments(st, list_path, outname, use_aac_bsf):
+        shutil.rmtree(seg_dir, ignore_errors=True)
+    return True
+
+def remux_segments(st: DownloadStatus, list_path: str, outname: str, use_aac_bsf: bool) -> bool:
+    """Concat the local .ts files into outname with stream copy (what ts-concat.sh does by hand)."""
+    st.state = "remuxing"
+    st.last_log = f"{EMOJI_SATELLITE} docking segments"
+    cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "warning",
+           "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy"]
+    if use_aac_bsf:
+        cmd += ["-bsf:a", "aac_adtstoasc"]
+    cmd += [outname]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    except FileNotFoundError:
+        st.state = "failed"
+        st.err_message = "ffmpeg not found in PATH"
+        st.returncode = -1
         return False
-    cmd = [ffprobe, "-v", "error", "-select_streams", "a:0",
-           "-show_entries", "stream=codec_name",
-           "-of", "default=noprint_wrappers=1:nokey=1", url]
+    with active_procs_lock:
+        active_procs[st.idx] = proc
+    try:
+        _, err = proc.communicate()
+    finally:
+        with active_procs_lock:
+            active_procs.pop(st.idx, None)
+    st.returncode = proc.returncode
+    if proc.returncode != 0:
+        st.state = "failed"
+        st.err_message = (err or "").strip() or f"ffmpeg remux exited with code {proc.returncode}"
+        return False
+    if not land_output(st, outname):
+        return False
+    st.state = "done"
+    st.percent = 100.0
+    st.last_log = f"{EMOJI_PLANET} touchdown complete"
+    return True
+
+# ---------- Live capture ----------
+class LiveOptions:
+    def __init__(self, roll_bytes: Optional[int] = None, roll_seconds: Optional[float] = None,
+                 max_seconds: Optional[float] = None):
+        self.roll_bytes = roll_bytes      # start a new part once the current one reaches this size
+        self.roll_seconds = roll_seconds  # ... or holds this much media time
+        self.max_seconds = max_seconds    # stop recording after this much media time
+
+live_options: Optional[LiveOptions] = None
+
+def live_reload_interval(playlist: MediaPlaylist, changed: bool) -> float:
+    """RFC 8216 6.3.4: reload after one target duration, or half of it when nothing new showed up."""
+    target = playlist.target_duration or (playlist.segments[-1].duration if playlist.segments else 0.0)
+    target = target or LIVE_DEFAULT_TARGET
+    return max(LIVE_MIN_RELOAD, target if changed else target / 2)
+
+class LiveOutput:
+    """Growing MPEG-TS output rolled over to a new part at a size or media-time boundary.
+
+    TS packets can be concatenated as-is, so each segment is appended straight to the open part
+    (in staging) and a part lands in the output directory once it is rolled over or closed.
+    """
+
+    def __init__(self, base: str, opts: LiveOptions):
+        self.base = base
+        self.opts = opts
+        self.parts: List[str] = []  # final paths
+        self._fh = None
+        self._staging: Optional[str] = None
+        self._bytes = 0
+        self._seconds = 0.0
+
+    @property
+    def current(self) -> Optional[str]:
+        return self.parts[-1] if self.parts else None
+
+    def _due(self) -> bool:
+        if self._fh is None:
+            return True
+        if self.opts.roll_bytes and self._bytes >= self.opts.roll_bytes:
+            return True
+        return bool(self.opts.roll_seconds and self._seconds >= self.opts.roll_seconds)
+
+    def append(self, data: bytes, duration: float) -> bool:
+        """Write one segment; returns True when it started a new part."""
+        rolled = self._due()
+        if rolled:
+            self.close()
+            self._staging, final = outputs.place(f"{self.base}.part{len(self.parts) + 1:03d}.ts")
+            self._fh = open(self._staging, "wb")
+            if self.opts.roll_bytes:
+                preallocate(self._fh, self.opts.roll_bytes)  # trimmed to what was written on close
+            self.parts.append(final)
+            self._bytes = 0
+            self._seconds = 0.0
+        self._fh.write(data)
+        self._fh.flush()
+        self._bytes += len(data)
+        self._seconds += duration
+        return rolled
+
+    def close(self):
+        """Finish the open part and move it into place."""
+        if self._fh is None:
+            return
+        self._fh.truncate(self._bytes)
+        self._fh.close()
+        self._fh = None
+        outputs.commit(self._staging, self.parts[-1])
+
+def run_live_download(st: DownloadStatus, url: str, segment_workers: int = SEGMENT_CONCURRENCY) -> bool:
+    """Record a live HLS feed by polling its media playlist and appending new segments.
+
+    Starts a few segments behind the live edge (at the first segment when the playlist is already
+    complete), reloads at the target-duration cadence and only
+    fetches segments past the last one written. Stops on EXT-X-ENDLIST, abort or --live-duration.
+    st.live_lag is the media time the server lists beyond what has been written.
+    Returns False when the feed is encrypted or fMP4, so the caller falls back to ffmpeg.
+    """
+    opts = live_options or LiveOptions()
+    st.state = "probing"
+    st.last_log = f"{EMOJI_TELESCOPE} tuning in"
     try:
-        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=FFPROBE_TIMEOUT)
-        if proc.returncode != 0:
-            return False
-        codec = proc.stdout.strip().lower()
-        return codec == "aac"
-    except Exception:
+        media_url, playlist = load_media_playlist(url, st)
+    except Exception as e:
+        st.last_log = f"live capture unavailable ({e}); falling back to ffmpeg"
+        return False
+    if playlist.encrypted or playlist.has_map:
+        st.last_log = "feed is encrypted or fMP4; falling back to ffmpeg"
         return False
 
-# ---------- Download worker and status ----------
-class DownloadStatus:
-    def __init__(self, idx: int, url: str):
-        self.idx = idx
-        self.url = url
-        self.outfile: Optional[str] = None
-        self.state: str = "queued"  # queued, probing, downloading, done, failed, cancelled
-        self.progress_seconds: Optional[float] = None
-        self.duration_seconds: Optional[float] = None
-        self.percent: Optional[float] = None
-        self.size_bytes: Optional[int] = None
-        self.speed_str: Optional[str] = None
-        self.last_log: str = ""
-        self.returncode: Optional[int] = None
-        self.err_message: Optional[str] = None
+    out = LiveOutput(os.path.splitext(assign_outfile(st))[0], opts)
+    segments = playlist.segments
+    if playlist.endlist:
+        # VOD, or a feed that already ended: there is no edge to join, record all of it
+        next_seq = segments[0].seq if segments else playlist.media_sequence
+    else:
+        next_seq = segments[max(0, len(segments) - LIVE_EDGE_SEGMENTS)].seq if segments else playlist.media_sequence
+    recorded = 0.0
+    written = 0
+    gaps = 0
+    reload_failures = 0
+    started = time.monotonic()
+    st.state = "downloading"
+    st.last_log = f"{EMOJI_COMET} recording from {urlsplit(media_url).netloc}"
 
-    def brief_outfile(self, width=30):
-        if not self.outfile:
-            return "N/A"
-        s = self.outfile
-        if len(s) <= width:
-            return s
-        return "..." + s[-(width-3):]
+    def fetch(seg: HlsSegment) -> Optional[bytes]:
+        for attempt in range(SEGMENT_RETRIES):
+            if abort_event.is_set():
+                return None
+            try:
+                # never from the segment cache: a restarted encoder reuses segment names
+                return http_pool.fetch(seg.uri, byterange=seg.byterange)
+            except Exception:
+                time.sleep(0.5 * (attempt + 1))
+        return None
 
-statuses_lock = threading.Lock()
-statuses: Dict[int, DownloadStatus] = {}
-active_procs_lock = threading.Lock()
-active_procs: Dict[int, subprocess.Popen] = {}
+    def lag(pl: MediaPlaylist) -> float:
+        return sum(seg.duration for seg in pl.segments if seg.seq >= next_seq)
 
-def run_download(idx: int, url: str):
-    st = statuses[idx]
     try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, segment_workers)) as pool:
+            while not abort_event.is_set():
+                if playlist.segments and playlist.segments[-1].seq + 1 < next_seq:
+                    # media sequence went backwards: the encoder restarted, rejoin at the edge
+                    next_seq = playlist.segments[max(0, len(playlist.segments) - LIVE_EDGE_SEGMENTS)].seq
+                if playlist.segments and playlist.segments[0].seq > next_seq:
+                    gaps += playlist.segments[0].seq - next_seq  # slid out of the window before we got them
+                    next_seq = playlist.segments[0].seq
+                new = [seg for seg in playlist.segments if seg.seq >= next_seq]
+                # fetch ahead in parallel, append strictly in sequence order
+                for seg, data in zip(new, pool.map(fetch, new)):
+                    if abort_event.is_set():
+                        break
+                    next_seq = seg.seq + 1
+                    if data is None:
+                        gaps += 1
+                        continue
+                    if out.append(data, seg.duration):
+                        st.outfile = out.current
+                    written += len(data)
+                    recorded += seg.duration
+                    st.size_bytes = written
+                    st.progress_seconds = recorded
+                    st.live_lag = lag(playlist)
+                    elapsed = time.monotonic() - started
+                    if elapsed > 0:
+                        st.speed_str = human_bytes(written / elapsed) + "/s"
+                    record_bytes(st)
+                    if opts.max_seconds and recorded >= opts.max_seconds:
+                        break
+                if opts.max_seconds and recorded >= opts.max_seconds:
+                    st.last_log = f"{EMOJI_PLANET} recorded {recorded:.0f}s, stopping as asked"
+                    break
+                if playlist.endlist:
+                    st.last_log = f"{EMOJI_PLANET} feed ended"
+                    break
+                st.last_log = (f"{EMOJI_COMET} seg {next_seq - 1} | lag {st.live_lag or 0.0:.1f}s | "
+                               f"part {len(out.parts)}" + (f" | {gaps} missed" if gaps else ""))
+                if abort_event.wait(live_reload_interval(playlist, bool(new))):
+                    break
+                try:
+                    text = http_pool.fetch(media_url).decode("utf-8", "replace")
+                    playlist = parse_media_playlist(text, media_url)
+                    reload_failures = 0
+                except Exception as e:
+                    reload_failures += 1
+                    if reload_failures >= LIVE_RELOAD_RETRIES:
+                        raise HttpError(f"playlist reload failed {reload_failures} times: {e}")
+                    continue
+                st.live_lag = lag(playlist)
+        out.close()
+    except Exception as e:
+        try:
+            out.close()  # land what was recorded before the failure
+        except OSError:
+            pass
+        st.state = "failed"
+        st.err_message = f"live capture failed: {e}"
+        st.returncode = -1
+        return True
+    st.outfile = out.current or st.outfile
+    if not written:
+        st.state = "cancelled" if abort_event.is_set() else "failed"
+        st.err_message = st.err_message or "no segments recorded"
+        return True
+    # stopping a recording (Ctrl-C included) is the normal way to end it: keep what landed
+    st.state = "done"
+    st.last_log = (f"{EMOJI_PLANET} recorded {recorded:.0f}s in {len(out.parts)} part(s)"
+                   + (f", {gaps} segment(s) missed" if gaps else ""))
+    return True
+
+def apply_progress_line(st: DownloadStatus, line: str):
+    """Fold one `-progress` key=value line from ffmpeg into st."""
+    st.last_log = line
+    if "=" in line:
+        k, v = line.split("=", 1)
+        k = k.strip()
+        v = v.strip()
+        if k == "out_time":
+            st.progress_seconds = parse_ffmpeg_time(v)
+        elif k == "out_time_ms":
+            try:
+                msm = float(v)
+                if msm > 1e6:
+                    sec = msm / 1e6
+                else:
+                    sec = msm / 1000.0
+                st.progress_seconds = sec
+            except Exception:
+                pass
+        elif k == "total_size":
+            try:
+                st.size_bytes = int(v)
+                record_bytes(st)
+            except Exception:
+                pass
+        elif k == "speed":
+            st.speed_str = v
+    if st.progress_seconds is not None and st.duration_seconds:
+        try:
+            pct = (st.progress_seconds / st.duration_seconds) * 100.0
+            st.percent = min(100.0, max(0.0, pct))
+        except Exception:
+            st.percent = None
+
+def prepare_ffmpeg_download(st: DownloadStatus, url: str) -> Tuple[List[str], str]:
+    """Probe (if the probe stage didn't), pick the output name and build the ffmpeg command."""
+    if not st.probed:
+        # not scanned by the probe stage (e.g. native engine fell back); probe inline
         st.state = "probing"
         st.last_log = f"{EMOJI_TELESCOPE} scanning target"
-        dur = ffprobe_duration(url)
-        st.duration_seconds = dur
-        use_aac_bsf = ffprobe_audio_codec_is_aac(url)
-    except Exception:
-        st.duration_seconds = None
-        use_aac_bsf = False
+        try:
+            st.probe = probe_cached(url)
+        except Exception:
+            st.probe = None
+        if variant_policy is not None and variant_policy.mode != "max":
+            st.variants = master_variants(url)
+        st.probed = True
+    st.duration_seconds = st.probe.duration if st.probe else None
+    use_aac_bsf = bool(st.probe and st.probe.audio_is_aac)
+    # ffmpeg's HLS demuxer makes one program per variant, in playlist order
+    program = None
+    if st.variants:
+        program, variant, budget = variant_policy.choose(st.variants)
+        note_variant(st, program, variant, budget)
+    st.variants = None
 
-    outname = safe_filename()
-    st.outfile = outname
+    outname = assign_outfile(st)
 
     cmd = [
         "ffmpeg",
@@ -205,11 +2250,33 @@ def run_download(idx: int, url: str):
         "-loglevel", "warning",
         "-progress", "pipe:1",
         "-i", url,
-        "-c", "copy"
     ]
+    if program is not None:
+        cmd += ["-map", f"0:p:{program}"]
+    cmd += ["-c", "copy"]
     if use_aac_bsf:
         cmd += ["-bsf:a", "aac_adtstoasc"]
     cmd += [outname]
+    return cmd, outname
+
+def finish_ffmpeg_download(st: DownloadStatus, outname: str, returncode: int, stderr_lines):
+    st.returncode = returncode
+    if returncode == 0:
+        if not land_output(st, outname):
+            return
+        st.state = "done"
+        st.last_log = f"{EMOJI_PLANET} touchdown complete"
+    else:
+        try:
+            os.remove(outname)  # ffmpeg can't resume into a partial output anyway
+        except OSError:
+            pass
+        st.state = "failed"
+        tail = list(stderr_lines)[-30:]
+        st.err_message = "\n".join(tail) if tail else f"ffmpeg exited with code {returncode}"
+
+def run_ffmpeg_download(st: DownloadStatus, url: str):
+    cmd, outname = prepare_ffmpeg_download(st, url)
 
     st.state = "downloading"
     st.last_log = f"{EMOJI_COMET} initiating transfer"
@@ -227,9 +2294,9 @@ def run_download(idx: int, url: str):
         return
 
     with active_procs_lock:
-        active_procs[idx] = proc
+        active_procs[st.idx] = proc
 
-    stderr_lines = []
+    stderr_lines = collections.deque(maxlen=200)
     try:
         stdout = proc.stdout
         stderr = proc.stderr
@@ -237,17 +2304,13 @@ def run_download(idx: int, url: str):
         def stderr_reader():
             try:
                 for line in stderr:
-                    line = line.rstrip("\n")
-                    stderr_lines.append(line)
-                    if len(stderr_lines) > 200:
-                        stderr_lines.pop(0)
+                    stderr_lines.append(line.rstrip("\n"))
             except Exception:
                 pass
 
         stderr_thread = threading.Thread(target=stderr_reader, daemon=True)
         stderr_thread.start()
 
-        current = {}
         while True:
             line = stdout.readline()
             if line == "" and proc.poll() is not None:
@@ -258,48 +2321,240 @@ def run_download(idx: int, url: str):
             line = line.strip()
             if not line:
                 continue
-            st.last_log = line
-            if "=" in line:
-                k, v = line.split("=", 1)
-                current[k.strip()] = v.strip()
-                if k == "out_time":
-                    sec = parse_ffmpeg_time(v.strip())
-                    st.progress_seconds = sec
-                elif k == "out_time_ms":
-                    try:
-                        msm = float(v.strip())
-                        if msm > 1e6:
-                            sec = msm / 1e6
-                        else:
-                            sec = msm / 1000.0
-                        st.progress_seconds = sec
-                    except Exception:
-                        pass
-                elif k == "total_size":
-                    try:
-                        st.size_bytes = int(v.strip())
-                    except Exception:
-                        pass
-                elif k == "speed":
-                    st.speed_str = v.strip()
-                elif k == "progress":
-                    pass
-            if st.progress_seconds is not None and st.duration_seconds:
-                try:
-                    pct = (st.progress_seconds / st.duration_seconds) * 100.0
-                    st.percent = min(100.0, max(0.0, pct))
-                except Exception:
-                    st.percent = None
+            apply_progress_line(st, line)
 
         proc.wait()
         stderr_thread.join(timeout=1.0)
-        st.returncode = proc.returncode
-        if proc.returncode == 0:
-            st.state = "done"
-            st.last_log = f"{EMOJI_PLANET} touchdown complete"
-        else:
+        finish_ffmpeg_download(st, outname, proc.returncode, stderr_lines)
+    except Exception as e:
+        try:
+            proc.kill()
+        except Exception:
+            pass
+        st.state = "failed"
+        st.err_message = f"exception while running ffmpeg: {e}"
+    finally:
+        with active_procs_lock:
+            active_procs.pop(st.idx, None)
+
+# ---------- Verification ----------
+# Runs in the --verify process pool: ffprobe/ffmpeg scans of finished outputs never hold a download
+# slot or a download worker thread, and the bookkeeping here stays off the downloaders' GIL. Outputs
+# are checked (and repaired) in the staging directory; only those that pass are committed.
+MP4_FAMILY = (".mp4", ".m4a", ".m4v", ".mov")
+
+def scan_container(path: str) -> Optional[str]:
+    """Demux every packet (stream copy to the null muxer); returns the problem, or None when clean."""
+    cmd = ["ffmpeg", "-hide_banner", "-nostdin", "-v", "error", "-i", path, "-map", "0", "-c", "copy", "-f", "null", "-"]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=VERIFY_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return f"integrity scan timed out after {VERIFY_TIMEOUT}s"
+    except FileNotFoundError:
+        return "ffmpeg not found in PATH"
+    errors = [ln for ln in (proc.stderr or "").splitlines() if ln.strip()]
+    if proc.returncode != 0 or errors:
+        return (errors[-1] if errors else f"ffmpeg exited with code {proc.returncode}")
+    return None
+
+def remux_in_place(path: str, probe: Optional[ProbeResult]) -> Optional[str]:
+    """Rewrite path with stream copy (the ts-concat.sh .ts -> .mp4 step); returns an error or None."""
+    root, ext = os.path.splitext(path)
+    # dot-prefixed so watchers of the output directory skip the half-written copy
+    tmp = os.path.join(os.path.dirname(root), f".{os.path.basename(root)}.remux{ext}")
+    cmd = ["ffmpeg", "-y", "-hide_banner", "-nostdin", "-v", "error", "-i", path, "-map", "0", "-c", "copy"]
+    if ext.lower() in MP4_FAMILY and probe is not None and probe.audio_is_aac:
+        cmd += ["-bsf:a", "aac_adtstoasc"]
+    cmd += [tmp]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=VERIFY_TIMEOUT)
+    except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+        proc = None
+        err = str(e)
+    if proc is not None and proc.returncode == 0:
+        os.replace(tmp, path)
+        return None
+    try:
+        os.remove(tmp)
+    except OSError:
+        pass
+    if proc is not None:
+        err = (proc.stderr or "").strip().splitlines()[-1:] or [f"exit code {proc.returncode}"]
+        err = err[0]
+    return f"remux failed: {err}"
+
+def container_mismatch(path: str, probe: Optional[ProbeResult]) -> bool:
+    """MPEG-TS bytes in an .mp4-family file (what a raw capture leaves behind)."""
+    fmt = (probe.format_name or "") if probe is not None else ""
+    return os.path.splitext(path)[1].lower() in MP4_FAMILY and "mpegts" in fmt.split(",")
+
+def verify_output(path: str, expected: Optional[float]) -> dict:
+    """Process-pool entry point: integrity scan + duration check, one stream-copy remux to repair."""
+    result = {"ok": False, "duration": None, "remuxed": False, "error": None}
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        result["error"] = "output missing or empty"
+        return result
+    probe = probe_stream(path)
+    problem = scan_container(path) if probe is not None else "ffprobe cannot read the container"
+    if problem or container_mismatch(path, probe):
+        err = remux_in_place(path, probe)
+        if err:
+            result["error"] = f"{problem or 'wrong container'}; {err}"
+            return result
+        result["remuxed"] = True
+        probe = probe_stream(path)
+        problem = scan_container(path) if probe is not None else "ffprobe cannot read the container"
+        if problem:
+            result["error"] = f"still damaged after remux: {problem}"
+            return result
+    result["duration"] = probe.duration
+    if expected and probe.duration is not None:
+        if probe.duration < expected - max(VERIFY_DURATION_SLACK, expected * VERIFY_DURATION_RATIO):
+            result["error"] = f"truncated: {probe.duration:.1f}s of {expected:.1f}s expected"
+            return result
+    result["ok"] = True
+    return result
+
+verify_pool: Optional[concurrent.futures.Executor] = None
+
+def start_verify(st: DownloadStatus, then):
+    """Check st's output in staging; `then()` runs once st reaches its final state."""
+    st.state = "verifying"
+    st.last_log = f"{EMOJI_TELESCOPE} inspecting the landing"
+
+    def settle(fut: concurrent.futures.Future):
+        if fut.cancelled():
+            finish_verification(st, None, then)
+            return
+        try:
+            result = fut.result()
+        except Exception as e:
+            result = {"ok": False, "error": f"verifier crashed: {e}"}
+        finish_verification(st, result, then)
+
+    try:
+        verify_pool.submit(verify_output, st.staging, st.duration_seconds).add_done_callback(settle)
+    except RuntimeError:  # pool already shut down (abort)
+        finish_verification(st, None, then)
+
+def finish_verification(st: DownloadStatus, result: Optional[dict], then):
+    """Commit an output that passed, set a failed one aside; result None = not checked (abort)."""
+    staging, st.staging = st.staging, None
+
+    def settled():
+        try:
+            then()
+        except RuntimeError:
+            pass  # event loop already gone (abort)
+
+    if result is None:
+        st.state = "cancelled"  # never landed: a rerun fetches it again
+        st.last_log = f"verification cancelled; unchecked output left in {staging}"
+        settled()
+        return
+    if not result.get("ok"):
+        st.state = "failed"
+        st.err_message = f"verification failed: {result.get('error')}"
+        try:
+            os.replace(staging, staging + ".failed")
+            st.err_message += f" (kept as {staging}.failed)"
+        except OSError:
+            pass
+        if journal is not None:
+            journal.reset(st.key)  # so a rerun fetches it again instead of trusting the bad output
+        settled()
+        return
+
+    def landed(error: Optional[Exception]):
+        if error is not None:
             st.state = "failed"
-            st.err_message = "\n".join(stderr_lines[-30:]) if stderr_lines else f"ffmpeg exited with code {proc.returncode}"
+            st.err_message = f"could not move the output into place: {error}"
+        else:
+            if journal is not None:
+                journal.mark_done(st.key, st.outfile)
+            st.state = "verified"
+            note = ", remuxed" if result.get("remuxed") else ""
+            dur = result.get("duration")
+            st.last_log = f"{EMOJI_CHECK} verified" + (f" ({dur:.1f}s{note})" if dur else note)
+        settled()
+
+    outputs.commit(staging, st.outfile, then=landed)
+
+# ---------- asyncio engine ----------
+def install_async_child_watcher():
+    """On 3.8-3.11 the default child watcher spawns a thread per subprocess; use pidfds instead."""
+    if sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open") or not hasattr(asyncio, "PidfdChildWatcher"):
+        return
+    try:
+        pidfd = os.pidfd_open(os.getpid())
+        os.close(pidfd)
+        asyncio.set_child_watcher(asyncio.PidfdChildWatcher())
+    except Exception:
+        pass  # kernel without pidfd support: keep the default watcher
+
+def raise_fd_limit(wanted: int):
+    """Each ffmpeg job holds a few pipes; lift the soft RLIMIT_NOFILE toward the hard limit (best-effort)."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        if soft != resource.RLIM_INFINITY and soft < target:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    except Exception:
+        pass
+
+async def run_ffmpeg_download_async(st: DownloadStatus, url: str):
+    """Same job as run_ffmpeg_download, but on the event loop: no reader threads, no polling."""
+    if skip_if_landed(st):
+        return
+    # an unprobed job probes inline (ffprobe, playlist GETs, journal writes): keep it off the loop
+    cmd, outname = await asyncio.get_running_loop().run_in_executor(None, prepare_ffmpeg_download, st, url)
+
+    st.state = "downloading"
+    st.last_log = f"{EMOJI_COMET} initiating transfer"
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, limit=ASYNC_STREAM_LIMIT)
+    except FileNotFoundError:
+        st.state = "failed"
+        st.err_message = "ffmpeg not found in PATH"
+        st.returncode = -1
+        return
+    except Exception as e:
+        st.state = "failed"
+        st.err_message = f"failed to start ffmpeg: {e}"
+        st.returncode = -1
+        return
+
+    with active_procs_lock:
+        active_procs[st.idx] = proc
+
+    stderr_lines = collections.deque(maxlen=200)
+
+    async def read_progress():
+        async for raw in proc.stdout:
+            line = raw.decode("utf-8", "replace").strip()
+            if line:
+                apply_progress_line(st, line)
+
+    async def read_stderr():
+        async for raw in proc.stderr:
+            stderr_lines.append(raw.decode("utf-8", "replace").rstrip("\n"))
+
+    try:
+        await asyncio.gather(read_progress(), read_stderr())
+        returncode = await proc.wait()
+        # landing the output may wait on a batched fsync: keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(
+            None, finish_ffmpeg_download, st, outname, returncode, stderr_lines)
+    except asyncio.CancelledError:
+        try:
+            proc.terminate()
+        except Exception:
+            pass
+        st.state = "cancelled"
+        raise
     except Exception as e:
         try:
             proc.kill()
@@ -309,7 +2564,261 @@ def run_download(idx: int, url: str):
         st.err_message = f"exception while running ffmpeg: {e}"
     finally:
         with active_procs_lock:
-            active_procs.pop(idx, None)
+            active_procs.pop(st.idx, None)
+
+async def run_async_engine(indices: Iterable[int], sched: "AdaptiveScheduler", probe_executor: concurrent.futures.Executor,
+                           max_inflight: Optional[int] = None, on_finished=None):
+    """Probe on the (small) probe pool, then download whenever the scheduler grants a slot.
+
+    Jobs are pulled from `indices` lazily; with max_inflight set, at most that many are admitted
+    (and resident) at once.
+    """
+    loop = asyncio.get_running_loop()
+    admission = asyncio.Semaphore(max_inflight) if max_inflight else None
+
+    def grant(fut: asyncio.Future, host: str):
+        if fut.cancelled():
+            sched.release(host, None)  # job went away while queued
+        elif not fut.done():
+            fut.set_result(None)
+
+    async def job(idx: int):
+        try:
+            await run_job(idx)
+            st = statuses[idx]
+            if st.state == "done" and st.staging is not None:
+                # slot released in run_job: the next download starts while this one is checked
+                settled = loop.create_future()
+                start_verify(st, lambda: loop.call_soon_threadsafe(lambda: settled.done() or settled.set_result(None)))
+                await settled
+        finally:
+            st = statuses[idx]
+            if metrics is not None and st.state in FINISHED_STATES:
+                metrics.job_finished(st)
+            if on_finished is not None:
+                on_finished(st)
+            if admission is not None:
+                admission.release()
+
+    async def run_job(idx: int):
+        st = statuses[idx]
+        host = job_host(st.url)
+        try:
+            await loop.run_in_executor(probe_executor, probe_job, idx)
+            granted = loop.create_future()
+            # the scheduler may grant from its controller thread; hop back onto the loop
+            sched.enqueue(host, lambda: loop.call_soon_threadsafe(grant, granted, host))
+            await granted
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            st.state = "failed"
+            st.err_message = f"worker exception: {e}"
+            return
+        ok = None
+        try:
+            if abort_event.is_set():
+                st.state = "cancelled"
+                return
+            await run_ffmpeg_download_async(st, st.url)
+            ok = st.state == "done"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            ok = False
+            st.state = "failed"
+            st.err_message = f"worker exception: {e}"
+        finally:
+            sched.release(host, ok)
+
+    tasks = set()
+    jobs = iter(indices)
+    while True:
+        if admission is not None:
+            await admission.acquire()
+        # intake may block (lazy file reads, --queue claims and polls), so keep it off the loop
+        idx = await loop.run_in_executor(None, next, jobs, None)
+        if idx is None:
+            break
+        task = loop.create_task(job(idx))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*list(tasks))
+
+# ---------- Scheduler ----------
+def job_host(url: str) -> str:
+    return urlsplit(url).netloc.lower() or "(local)"
+
+def parse_speed(speed: Optional[str]) -> Optional[float]:
+    """ffmpeg's `speed=1.23x` realtime factor."""
+    if not speed or not speed.endswith("x"):
+        return None
+    try:
+        return float(speed[:-1])
+    except ValueError:
+        return None
+
+class AdaptiveScheduler:
+    """Hands out download slots: a global limit plus an optional per-host limit.
+
+    Jobs are queued per host and dispatched round-robin across hosts that still have room, so a
+    slow CDN only ever holds its own slots. With `adaptive` set, a controller thread samples the
+    aggregate throughput (sum of the `total_size` progress of every job) and ffmpeg's realtime
+    `speed` every ADAPT_INTERVAL seconds and moves the limit AIMD-style: +1 while an extra slot
+    still buys throughput, x ADAPT_BACKOFF when the failure rate rises or throughput collapses.
+    """
+
+    def __init__(self, limit: int, max_limit: int, per_host: Optional[int] = None,
+                 adaptive: bool = False, min_limit: int = 1, measure: bool = False):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(self.min_limit, limit)))
+        self.per_host = per_host
+        self.adaptive = adaptive
+        self.measure = measure or adaptive  # sample throughput even with a fixed limit (--variant fit)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._host_active: Dict[str, int] = {}
+        self._pending: Dict[str, collections.deque] = {}
+        self._rr: collections.deque = collections.deque()  # hosts with pending jobs, round-robin order
+        self._ok = 0
+        self._failed = 0
+        self.throughput = 0.0  # bytes/s, last sample
+        self.link_estimate = 0.0  # bytes/s, decaying peak of the samples taken while jobs were running
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def enqueue(self, host: str, start) -> None:
+        """Queue a job; `start()` is called (from whichever thread frees the slot) once it may run."""
+        with self._lock:
+            q = self._pending.get(host)
+            if q is None:
+                q = self._pending[host] = collections.deque()
+            if not q:
+                self._rr.append(host)
+            q.append(start)
+        self._pump()
+
+    def release(self, host: str, ok: Optional[bool]) -> None:
+        """Give back a slot. ok=None (cancelled) doesn't count toward the failure rate."""
+        with self._lock:
+            self._active -= 1
+            self._host_active[host] = self._host_active.get(host, 1) - 1
+            if ok is True:
+                self._ok += 1
+            elif ok is False:
+                self._failed += 1
+        self._pump()
+
+    def _pump(self) -> None:
+        while True:
+            with self._lock:
+                if self._active >= int(self.limit) or not self._rr:
+                    return
+                start = None
+                for _ in range(len(self._rr)):
+                    host = self._rr.popleft()
+                    q = self._pending[host]
+                    if self.per_host and self._host_active.get(host, 0) >= self.per_host:
+                        self._rr.append(host)
+                        continue
+                    start = q.popleft()
+                    if q:
+                        self._rr.append(host)
+                    self._active += 1
+                    self._host_active[host] = self._host_active.get(host, 0) + 1
+                    break
+                if start is None:
+                    return  # every host with pending work is at its per-host limit
+            start()
+
+    def share(self) -> Optional[float]:
+        """Bytes/s one running download can expect: the link estimate split over the active slots."""
+        if not self.link_estimate:
+            return None
+        return self.link_estimate / max(1, self._active)
+
+    def start(self) -> None:
+        if self.measure:
+            self._thread = threading.Thread(target=self._control_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _sample(self) -> Tuple[int, Optional[float]]:
+        with statuses_lock:
+            items = list(statuses.values())
+            total = results.bytes if results is not None else 0
+        speeds = []
+        for st in items:
+            total += st.size_bytes or 0
+            if st.state == "downloading":
+                sp = parse_speed(st.speed_str)
+                if sp is not None:
+                    speeds.append(sp)
+        return total, (sum(speeds) / len(speeds) if speeds else None)
+
+    def _control_loop(self) -> None:
+        last_bytes, _ = self._sample()
+        last_t = time.monotonic()
+        best_at: Dict[int, float] = {}  # best throughput seen at each slot count
+        quiet = 0
+        probing = False
+        while not self._stop.wait(ADAPT_INTERVAL):
+            now_bytes, mean_speed = self._sample()
+            now = time.monotonic()
+            rate = max(0.0, (now_bytes - last_bytes) / max(1e-6, now - last_t))
+            last_bytes, last_t = now_bytes, now
+            self.throughput = rate
+            if self._active:
+                self.link_estimate = max(rate, self.link_estimate * VARIANT_ESTIMATE_DECAY)
+            if not self.adaptive:
+                continue
+            with self._lock:
+                ok, failed = self._ok, self._failed
+                self._ok = self._failed = 0
+                saturated = self._active >= int(self.limit)
+                slots = int(self.limit)
+            finished = ok + failed
+            fail_rate = failed / finished if finished else 0.0
+            new_limit = self.limit
+            was_probing, probing = probing, False
+            if finished and fail_rate > ADAPT_FAILURE_RATE:
+                new_limit = self.limit * ADAPT_BACKOFF
+            elif saturated:
+                below = max((v for k, v in best_at.items() if k < slots), default=None)
+                best_here = best_at.get(slots, 0.0)
+                best_at[slots] = max(best_here, rate)
+                if below is not None and rate < below * (1.0 - ADAPT_COLLAPSE):
+                    new_limit = self.limit * ADAPT_BACKOFF  # more slots made it worse: congestion
+                elif below is None or rate > below * (1.0 + ADAPT_GAIN):
+                    new_limit = self.limit + 1  # the last slot still paid off
+                    quiet = 0
+                elif was_probing:
+                    new_limit = self.limit - 1  # the probe slot bought nothing; give it back
+                elif mean_speed is not None and mean_speed < 1.0:
+                    quiet = 0  # streams slower than realtime: link is full, hold
+                else:
+                    quiet += 1
+                    if quiet >= ADAPT_PROBE_EVERY:  # plateau: probe one more slot now and then
+                        quiet = 0
+                        probing = True
+                        new_limit = self.limit + 1
+            new_limit = min(self.max_limit, max(self.min_limit, new_limit))
+            if int(new_limit) != slots:
+                # throughput per slot count is only meaningful near the current operating point
+                for k in [k for k in best_at if k > int(new_limit)]:
+                    del best_at[k]
+            self.limit = new_limit
+            self._pump()
+
+scheduler: Optional[AdaptiveScheduler] = None
 
 # ---------- UI / monitor ----------
 def state_icon_and_color(state: str):
@@ -319,71 +2828,222 @@ def state_icon_and_color(state: str):
         return EMOJI_TELESCOPE, COLOR_CYAN
     if state == "downloading":
         return EMOJI_COMET, COLOR_BLUE
+    if state == "remuxing":
+        return EMOJI_SATELLITE, COLOR_CYAN
+    if state == "verifying":
+        return EMOJI_TELESCOPE, COLOR_BLUE
     if state == "done":
         return EMOJI_CHECK, COLOR_GREEN
+    if state == "verified":
+        return EMOJI_PLANET, COLOR_GREEN
     if state == "failed":
         return EMOJI_EXPLOSION, COLOR_RED
     if state == "cancelled":
         return EMOJI_CROSS, COLOR_MAGENTA
     return EMOJI_STAR, COLOR_MAGENTA
 
-def monitor_loop(total_count: int, stop_event: threading.Event):
-    spinner = "|/-\\"
-    spin_idx = 0
-    while not stop_event.is_set():
-        lines = []
-        header = f"{EMOJI_CONTROL} {COLOR_BOLD}Space Command — Mission Control{RESET} {EMOJI_STAR}"
-        lines.append(header)
-        lines.append(f"Mission clock: {datetime.now().astimezone().isoformat()}")
-        lines.append("=".ljust(80, "="))
+ACTIVE_STATES = ("downloading", "remuxing", "probing", "verifying")
+
+def format_job_rows(idx: int, st: DownloadStatus) -> List[str]:
+    icon, color = state_icon_and_color(st.state)
+    if st.live_lag is not None:
+        percent_str = f"L{min(st.live_lag, 9999):4.0f}s"  # live: lag behind the edge instead of a percentage
+    else:
+        percent_str = f"{st.percent:5.1f}%" if st.percent is not None else "  N/A "
+    dur_str = f"{st.progress_seconds:.1f}s" if st.progress_seconds is not None else "N/A"
+    size_str = human_bytes(st.size_bytes)
+    speed = st.speed_str or ""
+    outfile_brief = st.brief_outfile(34)
+    left = f"[{idx+1:02d}] {icon} {st.state.upper():10s}"
+    middle = f"{outfile_brief:34s} | {percent_str} | {dur_str:>7s} | {size_str:>8s} | {speed:>7s}"
+    rows = [f"{colored(left, color)}  {middle}"]
+    if st.state == "failed":
+        err = st.err_message or st.last_log
+        if err:
+            excerpt = err.strip().splitlines()[-2:]
+            for ln in excerpt:
+                rows.append(colored(f"       ERR: {ln}", COLOR_RED))
+    return rows
+
+class MissionRenderer:
+    """Mission Control screen.
+
+    On a TTY only rows that changed since the previous tick are rewritten (cursor-addressed), and
+    the job list is a scrolling window over active and failed jobs sized to the terminal; queued,
+    done and cancelled jobs only show up in the counters. Off a TTY it falls back to a plain
+    one-line log every PLAIN_LOG_INTERVAL seconds plus one line per job that finished.
+    """
+
+    def __init__(self, out, tty: bool, size=None):
+        self.out = out
+        self.tty = tty
+        self._size = size  # fixed (cols, rows) for benchmarks; None = ask the terminal
+        self._prev: List[str] = []
+        self._prev_dims = None
+        self._tick = 0
+        self._scroll = 0
+        self._reported: Dict[int, str] = {}
+
+    def dims(self) -> Tuple[int, int]:
+        if self._size:
+            return self._size
+        size = shutil.get_terminal_size((80, 24))
+        return size.columns, size.lines
+
+    def snapshot(self):
+        counts = {"active": 0, "queued": 0, "done": 0, "failed": 0, "cancelled": 0}
         with statuses_lock:
             items = sorted(statuses.items())
-        active = sum(1 for _, s in items if s.state == "downloading")
-        queued = sum(1 for _, s in items if s.state in ("queued", "probing"))
-        done = sum(1 for _, s in items if s.state == "done")
-        failed = sum(1 for _, s in items if s.state == "failed")
-        lines.append(f"{EMOJI_SATELLITE} Active: {active}    {EMOJI_ROCKET} Queued: {queued}    {EMOJI_PLANET} Done: {done}    {EMOJI_EXPLOSION} Failed: {failed}")
-        lines.append("-" * 80)
+            if results is not None:
+                for state, n in results.counts.items():
+                    counts["done" if state in SUCCESS_STATES else state] += n
+        window = []
         for idx, st in items:
-            icon, color = state_icon_and_color(st.state)
-            percent_str = f"{st.percent:5.1f}%" if st.percent is not None else "  N/A "
-            dur_str = f"{st.progress_seconds:.1f}s" if st.progress_seconds is not None else "N/A"
-            size_str = human_bytes(st.size_bytes)
-            speed = st.speed_str or ""
-            outfile_brief = st.brief_outfile(34)
-            left = f"[{idx+1:02d}] {icon} {st.state.upper():10s}"
-            middle = f"{outfile_brief:34s} | {percent_str} | {dur_str:>7s} | {size_str:>8s} | {speed:>7s}"
-            lines.append(f"{colored(left, color)}  {middle}")
-            if st.state == "failed":
-                err = st.err_message or st.last_log
-                if err:
-                    excerpt = err.strip().splitlines()[-2:]
-                    for ln in excerpt:
-                        lines.append(colored(f"       ERR: {ln}", COLOR_RED))
-        lines.append("")
-        lines.append(colored("Mission notes:", COLOR_BOLD))
-        lines.append(" - This console uses ffmpeg -c copy to maximize network throughput and minimize CPU usage.")
-        lines.append(" - Percent progress requires ffprobe to detect duration; live streams may show N/A.")
-        lines.append(colored(" - Tip: set M3U8_CONCURRENCY env var to override concurrency (e.g. export M3U8_CONCURRENCY=8)", COLOR_YELLOW))
-        lines.append(colored("Press Ctrl-C to abort mission (graceful termination will be attempted).", COLOR_MAGENTA))
-        out = "\n".join(lines)
-        # clear and print
-        sys.stdout.write("\x1b[2J\x1b[H")
-        sys.stdout.write(out + "\n")
-        sys.stdout.flush()
-        time.sleep(UI_REFRESH_INTERVAL)
-        spin_idx = (spin_idx + 1) % len(spinner)
+            state = st.state
+            if state in ACTIVE_STATES:
+                counts["active"] += 1
+                window.append((idx, st))
+            elif state == "failed":
+                counts["failed"] += 1
+            elif state in SUCCESS_STATES:
+                counts["done"] += 1
+            elif state == "cancelled":
+                counts["cancelled"] += 1
+            else:
+                counts["queued"] += 1
+        # active jobs first, failures after them
+        window += [(idx, st) for idx, st in items if st.state == "failed"]
+        return counts, window
+
+    def build_frame(self, counts: Dict[str, int], window, cols: int, rows: int) -> List[str]:
+        lines = [
+            f"{EMOJI_CONTROL} {COLOR_BOLD}Space Command — Mission Control{RESET} {EMOJI_STAR}",
+            f"Mission clock: {datetime.now().astimezone().isoformat(timespec='seconds')}",
+            "=" * min(80, cols),
+            f"{EMOJI_SATELLITE} Active: {counts['active']}    {EMOJI_ROCKET} Queued: {counts['queued']}    "
+            f"{EMOJI_PLANET} Done: {counts['done']}    {EMOJI_EXPLOSION} Failed: {counts['failed']}",
+            "-" * min(80, cols),
+        ]
+        if scheduler is not None:
+            slots = f"{EMOJI_ALIEN} Slots: {scheduler.active}/{int(scheduler.limit)}"
+            if scheduler.per_host:
+                slots += f" (max {scheduler.per_host}/host)"
+            if scheduler.adaptive:
+                slots += f"    Throughput: {human_bytes(scheduler.throughput)}/s (adaptive)"
+            if variant_policy is not None and variant_policy.mode == "fit":
+                slots += f"    Link: {human_bitrate(scheduler.link_estimate * 8)} (variant fit)"
+            lines.insert(4, slots)
+        if segment_cache is not None and segment_cache.hits + segment_cache.misses:
+            lines.insert(len(lines) - 1, f"{EMOJI_SATELLITE} {segment_cache.summary()}")
+        footer = [
+            "",
+            colored("Mission notes:", COLOR_BOLD),
+            " - This console uses ffmpeg -c copy to maximize network throughput and minimize CPU usage.",
+            " - Percent progress requires ffprobe to detect duration; live streams may show N/A.",
+            colored(" - Tip: set M3U8_CONCURRENCY env var to override concurrency (e.g. export M3U8_CONCURRENCY=8)", COLOR_YELLOW),
+            colored("Press Ctrl-C to abort mission (graceful termination will be attempted).", COLOR_MAGENTA),
+        ]
+        budget = rows - len(lines) - len(footer) - 2  # keep room for the scroll/aggregate lines
+        if budget < 3:
+            footer = footer[-1:]
+            budget = max(1, rows - len(lines) - len(footer) - 2)
+        body: List[str] = []
+        if window:
+            # each job takes 1 row (+2 ERR rows when failed); page through when they don't fit
+            per_page = max(1, budget // 3) if any(st.state == "failed" for _, st in window) else budget
+            pages = (len(window) + per_page - 1) // per_page
+            if pages > 1 and self._tick % SCROLL_TICKS == 0 and self._tick:
+                self._scroll = (self._scroll + 1) % pages
+            self._scroll %= pages
+            start = self._scroll * per_page
+            for idx, st in window[start:start + per_page]:
+                body.extend(format_job_rows(idx, st))
+            body = body[:budget]
+            if pages > 1:
+                body.append(colored(f"  ... showing {start + 1}-{min(start + per_page, len(window))} "
+                                    f"of {len(window)} active/failed (page {self._scroll + 1}/{pages})", COLOR_CYAN))
+        hidden = counts["queued"] + counts["done"] + counts["cancelled"]
+        if hidden:
+            body.append(f"  + {counts['queued']} queued · {counts['done']} done · {counts['cancelled']} cancelled (not listed)")
+        return lines + body + footer
+
+    def tick(self):
+        counts, window = self.snapshot()
+        if self.tty:
+            cols, rows = self.dims()
+            frame = self.build_frame(counts, window, cols, rows)
+            self.paint(frame, (cols, rows))
+        else:
+            self.log(counts)
+        self._tick += 1
+
+    def paint(self, frame: List[str], dims):
+        """Rewrite only rows that differ from the previous frame."""
+        parts = []
+        if dims != self._prev_dims or not self._prev:
+            parts.append("\x1b[2J\x1b[H")
+            parts.append("\n".join(line + "\x1b[K" for line in frame))
+            self._prev_dims = dims
+        else:
+            prev = self._prev
+            for row, line in enumerate(frame):
+                if row >= len(prev) or prev[row] != line:
+                    parts.append(f"{CSI}{row + 1};1H{line}\x1b[K")
+            if len(frame) < len(prev):
+                parts.append(f"{CSI}{len(frame) + 1};1H\x1b[J")
+        self._prev = frame
+        if parts:
+            parts.append(f"{CSI}{len(frame) + 1};1H")
+            self.out.write("".join(parts))
+            self.out.flush()
+
+    def log(self, counts: Dict[str, int]):
+        lines = []
+        with statuses_lock:
+            items = list(statuses.items())
+        for idx, st in items:
+            if st.state in FINISHED_STATES and self._reported.get(idx) != st.state:
+                self._reported[idx] = st.state
+                detail = st.outfile if st.state in SUCCESS_STATES else (st.err_message or st.last_log or "").strip().splitlines()[-1:]
+                if isinstance(detail, list):
+                    detail = detail[0] if detail else ""
+                lines.append(f"[{idx+1:02d}] {st.state}: {detail or st.url}")
+        # jobs retired from statuses (--stream) never come back; don't keep a line per job ever run
+        for idx in self._reported.keys() - {idx for idx, _ in items}:
+            del self._reported[idx]
+        stamp = datetime.now().astimezone().isoformat(timespec="seconds")
+        lines.append(f"{stamp} active={counts['active']} queued={counts['queued']} "
+                     f"done={counts['done']} failed={counts['failed']}")
+        self.out.write("\n".join(lines) + "\n")
+        self.out.flush()
+
+def monitor_loop(total_count: int, stop_event: threading.Event):
+    tty = sys.stdout.isatty()
+    renderer = MissionRenderer(sys.stdout, tty)
+    interval = UI_REFRESH_INTERVAL if tty else PLAIN_LOG_INTERVAL
+    while not stop_event.is_set():
+        renderer.tick()
+        stop_event.wait(interval)
     # final summary
     try:
-        sys.stdout.write("\x1b[2J\x1b[H")
+        if tty:
+            sys.stdout.write("\x1b[2J\x1b[H")
         with statuses_lock:
             items = sorted(statuses.items())
         lines = [f"{EMOJI_CONTROL} Final Mission Debrief:"]
+        if segment_cache is not None:
+            lines.append(f"  {segment_cache.summary()}")
+        if results is not None and total_count is None:
+            # streamed run: per-job rows live in the results file
+            c = results.counts
+            lines.append(f"  done {c['done'] + c['verified']}  failed {c['failed']}  cancelled {c['cancelled']}"
+                         f"  ({human_bytes(results.bytes)})")
+            lines.append(f"  per-job results: {results.path}")
         for idx, st in items:
             icon, color = state_icon_and_color(st.state)
             base = f"[{idx+1:02d}] {icon} {st.state.upper():8s} {st.brief_outfile(60)}"
             lines.append(colored(base, color))
-            if st.state == "done":
+            if st.state in SUCCESS_STATES:
                 lines.append(f"       -> stored: {st.outfile}")
             elif st.state == "failed":
                 lines.append(colored(f"       -> ERROR: {st.err_message or st.last_log}", COLOR_RED))
@@ -392,18 +3052,194 @@ def monitor_loop(total_count: int, stop_event: threading.Event):
     except Exception:
         pass
 
+def bench_render(counts=(10, 100, 1000, 5000, 20000), ticks: int = 20):
+    """Render cost per tick vs. job count, against a full repaint of every job row."""
+    import io
+    import random
+    rng = random.Random(0)
+    states = ("queued", "probing", "downloading", "done", "failed")
+    print(f"{'jobs':>7} {'diff ms/tick':>13} {'diff B/tick':>12} {'full ms/tick':>13} {'full B/tick':>12}")
+    for n in counts:
+        with statuses_lock:
+            statuses.clear()
+            for i in range(n):
+                st = DownloadStatus(i, f"http://bench.invalid/{i}.m3u8")
+                st.state = rng.choice(states)
+                st.outfile = safe_filename()
+                st.size_bytes = rng.randrange(1 << 30)
+                st.err_message = "HTTP 404 Not Found" if st.state == "failed" else None
+                statuses[i] = st
+        sink = io.StringIO()
+        renderer = MissionRenderer(sink, tty=True, size=(120, 50))
+        renderer.tick()  # first frame is a full paint in both modes
+        sink.seek(0)
+        sink.truncate()
+        t0 = time.perf_counter()
+        for _ in range(ticks):
+            for st in rng.sample(list(statuses.values()), max(1, n // 20)):
+                st.size_bytes = (st.size_bytes or 0) + 188 * 1000
+                st.percent = rng.random() * 100
+            renderer.tick()
+        diff_ms = (time.perf_counter() - t0) * 1000 / ticks
+        diff_bytes = len(sink.getvalue()) // ticks
+        # baseline: every job row rebuilt and the whole screen rewritten each tick
+        t0 = time.perf_counter()
+        full_bytes = 0
+        for _ in range(ticks):
+            with statuses_lock:
+                items = sorted(statuses.items())
+            rows = ["\x1b[2J\x1b[H"]
+            for idx, st in items:
+                rows.extend(format_job_rows(idx, st))
+            full_bytes += len("\n".join(rows))
+        full_ms = (time.perf_counter() - t0) * 1000 / ticks
+        print(f"{n:>7} {diff_ms:>13.2f} {diff_bytes:>12} {full_ms:>13.2f} {full_bytes // ticks:>12}")
+    with statuses_lock:
+        statuses.clear()
+
 # ---------- Main ----------
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="m3u8_space_command.py",
+                                     description="Space Command — M3U8 downloader with ffmpeg (-c copy).")
+    parser.add_argument("urls_file", nargs="?", help="text file with one URL per line (# comments allowed)")
+    parser.add_argument("--engine", choices=("ffmpeg", "native", "asyncio"), default="ffmpeg",
+                        help="ffmpeg: one ffmpeg process per URL on a thread pool; "
+                             "native: parallel segment fetch + local remux; "
+                             "asyncio: ffmpeg processes driven from one event loop (hundreds of streams)")
+    parser.add_argument("--segment-workers", type=int, default=None,
+                        help=f"parallel segment fetches per stream for the native engine (default {SEGMENT_CONCURRENCY})")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="adjust the number of active downloads at runtime from measured throughput (AIMD)")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="ceiling for --adaptive (default: engine cap)")
+    parser.add_argument("--per-host", type=int, default=None,
+                        help="at most N active downloads per host")
+    parser.add_argument("--variant", choices=("max", "target", "fit"), default="max",
+                        help="rendition of master playlists to download: highest bandwidth, highest at or below "
+                             "--target-bitrate, or highest that fits each job's share of the measured throughput")
+    parser.add_argument("--target-bitrate", type=parse_bitrate, default=None, metavar="RATE",
+                        help="bits/s for --variant target, e.g. 2.5M (with fit: the starting point before "
+                             "anything is measured)")
+    parser.add_argument("--probe-workers", type=int, default=PROBE_CONCURRENCY,
+                        help=f"ffprobe workers running ahead of the download pool (default {PROBE_CONCURRENCY})")
+    parser.add_argument("--no-probe-cache", action="store_true",
+                        help="always re-probe instead of using the on-disk probe cache")
+    parser.add_argument("--segment-cache", default=None, metavar="DIR",
+                        help="shared segment cache for the native engine (default: ~/.cache/m3u8pv/segments)")
+    parser.add_argument("--segment-cache-size", type=parse_size, default=SEGMENT_CACHE_MAX_BYTES, metavar="SIZE",
+                        help="segment cache cap, least recently used evicted first; 0 disables it (default: 5G)")
+    parser.add_argument("--journal", default=None,
+                        help="resume journal path (default: <urls_file>.journal; --stream and --queue only journal when given)")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="do not record or resume progress")
+    parser.add_argument("--events", default=None, metavar="PATH",
+                        help="append a JSONL event stream (queued, probe_start/end, first_byte, progress, done, failed)")
+    parser.add_argument("--prom", default=None, metavar="PATH",
+                        help="maintain a Prometheus textfile (throughput, bytes, queue depth, stage latency histograms)")
+    parser.add_argument("--stream", action="store_true",
+                        help="read the urls file lazily and keep only in-flight jobs in memory; finished jobs go to --results")
+    parser.add_argument("--results", default=None, metavar="PATH",
+                        help="write one JSON line per finished job (default with --stream: <urls_file>.results.jsonl)")
+    parser.add_argument("--max-inflight", type=int, default=None,
+                        help=f"--stream: jobs admitted at once (default: download slots x {STREAM_INFLIGHT_FACTOR})")
+    parser.add_argument("--output-dir", default=".", metavar="DIR",
+                        help="where finished outputs land (default: current directory)")
+    parser.add_argument("--staging-dir", default=None, metavar="DIR",
+                        help=f"where outputs are written until complete; same filesystem as --output-dir "
+                             f"(default: <output-dir>/{OUTPUT_STAGING_NAME})")
+    parser.add_argument("--shard", type=int, default=0, metavar="N",
+                        help="spread outputs over subdirectories named by N hex digits of a hash (2 = 256 dirs)")
+    parser.add_argument("--no-fsync", action="store_true",
+                        help="rename outputs into place without fsyncing them first")
+    parser.add_argument("--verify", action="store_true",
+                        help="check each finished output (full demux scan, duration vs. probe), remux to repair; "
+                             "runs on a process pool next to the downloads")
+    parser.add_argument("--verify-workers", type=int, default=None,
+                        help=f"verification processes (default: min({VERIFY_CONCURRENCY}, CPUs))")
+    parser.add_argument("--live", action="store_true",
+                        help="record live feeds: poll the playlist, append new segments to .partNNN.ts outputs")
+    parser.add_argument("--roll-size", type=parse_size, default=None, metavar="SIZE",
+                        help="with --live: start a new part after this many bytes (e.g. 2G)")
+    parser.add_argument("--roll-time", type=float, default=None, metavar="SECONDS",
+                        help="with --live: start a new part after this much media time")
+    parser.add_argument("--live-duration", type=float, default=None, metavar="SECONDS",
+                        help="with --live: stop each recording after this much media time")
+    parser.add_argument("--queue", default=None, metavar="DB",
+                        help="work from a shared SQLite job queue (urls_file, if given, is added to it first)")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="with --queue: add urls_file to the queue and exit without downloading")
+    parser.add_argument("--queue-lease", type=float, default=QUEUE_LEASE_SECONDS, metavar="SECONDS",
+                        help=f"with --queue: reclaim a job this long after its worker's last heartbeat (default {QUEUE_LEASE_SECONDS:g})")
+    parser.add_argument("--queue-shared-fs", action="store_true",
+                        help="with --queue: the DB lives on a network filesystem used by several hosts (no WAL)")
+    parser.add_argument("--bench-render", action="store_true",
+                        help="benchmark Mission Control render cost per tick vs. job count, then exit")
+    return parser
+
 def main():
+    global journal, probe_cache, scheduler, metrics, results, live_options, segment_cache, verify_pool, outputs, \
+        variant_policy
     enable_windows_ansi_support()
 
-    if len(sys.argv) != 2:
-        eprint("Usage: python m3u8_space_command.py <urls_file>")
-        sys.exit(2)
-    urls_file = sys.argv[1]
-    if not os.path.isfile(urls_file):
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    if args.bench_render:
+        bench_render()
+        sys.exit(0)
+    if not args.urls_file and not args.queue:
+        parser.error("the following arguments are required: urls_file")
+    if args.enqueue and not (args.queue and args.urls_file):
+        parser.error("--enqueue needs --queue and a urls_file")
+    if args.queue and args.results:
+        parser.error("--results cannot be combined with --queue (the queue keeps the results)")
+    if args.live:
+        if args.engine == "asyncio":
+            parser.error("--live runs on the threaded engines (--engine ffmpeg or native)")
+        live_options = LiveOptions(args.roll_size, args.roll_time, args.live_duration)
+    if args.variant == "target" and not args.target_bitrate:
+        parser.error("--variant target needs --target-bitrate")
+    if args.variant != "max":
+        variant_policy = VariantPolicy(args.variant, args.target_bitrate)
+    urls_file = args.urls_file
+    if urls_file and not os.path.isfile(urls_file):
         eprint(f"File not found: {urls_file}")
         sys.exit(2)
 
+    outputs = OutputManager(args.output_dir, args.staging_dir, args.shard, fsync=not args.no_fsync)
+    try:
+        os.makedirs(outputs.out_dir, exist_ok=True)
+        os.makedirs(outputs.staging_dir, exist_ok=True)
+        same_fs = os.stat(outputs.out_dir).st_dev == os.stat(outputs.staging_dir).st_dev
+    except OSError as e:
+        eprint(colored(f"Error: output directory: {e}", COLOR_RED))
+        sys.exit(1)
+    if not same_fs:
+        eprint(colored(f"Error: staging dir {outputs.staging_dir} must be on the same filesystem as "
+                       f"{outputs.out_dir} (outputs are renamed into place)", COLOR_RED))
+        sys.exit(1)
+
+    queue: Optional[JobQueue] = None
+    if args.queue:
+        try:
+            queue = JobQueue(args.queue, shared_fs=args.queue_shared_fs, lease=max(3.0, args.queue_lease))
+            added = queue.enqueue(iter_urls(urls_file)) if urls_file else 0
+            counts = queue.state_counts()
+        except sqlite3.Error as e:
+            eprint(colored(f"Error: job queue {args.queue}: {e}", COLOR_RED))
+            sys.exit(1)
+        summary = ", ".join(f"{n} {state}" for state, n in sorted(counts.items())) or "empty"
+        if urls_file:
+            eprint(colored(f"{EMOJI_SATELLITE} Queued {added} new job(s) in {args.queue} ({summary})", COLOR_CYAN))
+        if args.enqueue:
+            queue.close()
+            sys.exit(0)
+        if not counts.get("queued") and not counts.get("claimed"):
+            eprint(colored(f"Nothing to do: no queued jobs in {args.queue} ({summary}).", COLOR_YELLOW))
+            queue.close()
+            sys.exit(0)
+        # a queue run is always streamed: jobs arrive as they are claimed and leave once recorded
+        args.stream = True
+
     ffmpeg = find_executable("ffmpeg")
     ffprobe = find_executable("ffprobe")
     if not ffmpeg:
@@ -414,56 +3250,250 @@ def main():
     if not ffprobe:
         eprint(colored("Warning: ffprobe not found. Percent progress may be unavailable for some streams.", COLOR_YELLOW))
 
-    with open(urls_file, "r", encoding="utf-8") as fh:
-        raw_lines = [ln.strip() for ln in fh.readlines()]
-    urls = []
-    for ln in raw_lines:
-        if not ln:
-            continue
-        if ln.lstrip().startswith("#"):
-            continue
-        urls.append(ln)
-    if not urls:
-        eprint(colored("No URLs found (after removing comments/blank lines).", COLOR_RED))
-        sys.exit(1)
+    if queue is not None:
+        urls = ()
+        total = None
+    elif args.stream:
+        # lazy intake: only check that there is something to do
+        if next(iter_urls(urls_file), None) is None:
+            eprint(colored("No URLs found (after removing comments/blank lines).", COLOR_RED))
+            sys.exit(1)
+        urls: Iterable[str] = iter_urls(urls_file)
+        total = None
+    else:
+        urls = list(iter_urls(urls_file))
+        if not urls:
+            eprint(colored("No URLs found (after removing comments/blank lines).", COLOR_RED))
+            sys.exit(1)
+        total = len(urls)
 
-    total = len(urls)
     env_j = os.getenv("M3U8_CONCURRENCY")
     if env_j:
         try:
             concurrency = max(1, int(env_j))
         except Exception:
             concurrency = None
+    elif args.engine == "asyncio":
+        concurrency = ASYNC_CONCURRENCY_CAP
     else:
         cpu = os.cpu_count() or 1
         concurrency = min(CONCURRENCY_CAP, max(1, cpu * 2))
-    concurrency = min(concurrency, total)
+    if total is not None:
+        concurrency = min(concurrency, total)
+        if args.live and not env_j:
+            concurrency = total  # feeds run until they end; each needs its own slot
+
+    segment_workers = args.segment_workers
+    if segment_workers is None:
+        try:
+            segment_workers = int(os.getenv("M3U8_SEGMENT_CONCURRENCY", SEGMENT_CONCURRENCY))
+        except ValueError:
+            segment_workers = SEGMENT_CONCURRENCY
+    segment_workers = max(1, segment_workers)
 
-    eprint(colored(f"{EMOJI_CONTROL} Launching {total} mission target(s), concurrency = {concurrency}", COLOR_CYAN))
+    targets = f"{total} mission target(s)" if total is not None else "streamed mission targets"
+    eprint(colored(f"{EMOJI_CONTROL} Launching {targets}, concurrency = {concurrency}", COLOR_CYAN))
+    if args.adaptive:
+        eprint(colored(f"{EMOJI_SATELLITE} Adaptive scheduler: slots float between 1 and "
+                       f"{args.max_concurrency or 'the engine cap'} from measured throughput", COLOR_CYAN))
+    if variant_policy is not None:
+        eprint(colored(f"{EMOJI_SATELLITE} Variant policy: {args.variant}"
+                       + (f", target {human_bitrate(args.target_bitrate)}" if args.target_bitrate else ""), COLOR_CYAN))
+    if args.engine == "native":
+        eprint(colored(f"{EMOJI_SATELLITE} Native segment engine: {segment_workers} fetcher(s) per stream", COLOR_CYAN))
     eprint("")
 
+    # with --queue the queue already tracks output names, and with --stream a journal would index
+    # every URL of the list; in both cases it is only kept on request
+    # live recordings are never "landed", so there is nothing to resume
+    if not args.no_journal and not args.live and ((queue is None and not args.stream) or args.journal):
+        journal_path = args.journal or urls_file + ".journal"
+        try:
+            journal = ResumeJournal(journal_path)
+        except OSError as e:
+            eprint(colored(f"Warning: cannot open resume journal {journal_path}: {e}", COLOR_YELLOW))
+            journal = None
+
+    if not args.no_probe_cache:
+        probe_cache = ProbeCache(os.path.join(cache_dir(), "probe-cache.json"))
+
+    # only the native engine goes through the cache; --live segments are fetched fresh
+    if args.engine == "native" and args.segment_cache_size > 0:
+        cache_root = args.segment_cache or os.path.join(cache_dir(), "segments")
+        try:
+            segment_cache = SegmentCache(cache_root, args.segment_cache_size)
+        except OSError as e:
+            eprint(colored(f"Warning: segment cache disabled ({cache_root}: {e})", COLOR_YELLOW))
+
+    if args.events or args.prom:
+        try:
+            metrics = MetricsSink(args.events, args.prom)
+        except OSError as e:
+            eprint(colored(f"Error: cannot open metrics output: {e}", COLOR_RED))
+            sys.exit(1)
+
+    results_path = args.results or (urls_file + ".results.jsonl" if args.stream and queue is None else None)
+    if queue is not None:
+        results = queue
+    elif results_path:
+        try:
+            results = ResultSpill(results_path)
+        except OSError as e:
+            eprint(colored(f"Error: cannot open results file {results_path}: {e}", COLOR_RED))
+            sys.exit(1)
+
     with statuses_lock:
         statuses.clear()
-        for i, url in enumerate(urls):
-            statuses[i] = DownloadStatus(i, url)
+
+    def intake() -> Iterator[int]:
+        """Create each job's status as it is admitted; keys only matter when journaling."""
+        # telling duplicate URLs apart means remembering every URL seen: only worth it for the journal
+        pairs = keyed_urls(urls) if journal is not None else ((url, url) for url in urls)
+        for i, (url, key) in enumerate(pairs):
+            st = DownloadStatus(i, url)
+            st.key = key
+            with statuses_lock:
+                statuses[i] = st
+            if metrics is not None:
+                metrics.emit("queued", st)
+            yield i
+
+    def queue_intake() -> Iterator[int]:
+        """Claim jobs one at a time; while other workers still hold leases, wait in case they lapse."""
+        while not abort_event.is_set():
+            job = queue.claim()
+            if job is None:
+                if queue.pending() == 0:
+                    return
+                abort_event.wait(QUEUE_POLL_INTERVAL)
+                continue
+            job_id, key, url, outfile = job
+            st = DownloadStatus(job_id, url)
+            st.key = key
+            st.outfile = outfile
+            with statuses_lock:
+                statuses[job_id] = st
+            if metrics is not None:
+                metrics.emit("queued", st)
+            yield job_id
+
+    if args.verify:
+        # spawn, not fork: this process is already full of threads
+        verify_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max(1, args.verify_workers or min(VERIFY_CONCURRENCY, os.cpu_count() or 1)),
+            mp_context=multiprocessing.get_context("spawn"))
+
+    if metrics is not None:
+        metrics.start()
 
     stop_event = threading.Event()
     monitor_thread = threading.Thread(target=monitor_loop, args=(total, stop_event), daemon=True)
     monitor_thread.start()
 
-    executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
-    futures = []
-    try:
-        for i, url in enumerate(urls):
-            fut = executor.submit(run_download, i, url)
-            futures.append(fut)
-        for fut in concurrent.futures.as_completed(futures):
+    # Probe stage runs on its own small pool and hands each job to the download pool as soon as
+    # it is scanned, so probe latency overlaps with transfers instead of holding download slots.
+    # The native engine reads the playlist itself and skips the remote probe.
+    probe_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.probe_workers))
+    max_limit = concurrency
+    if args.adaptive:
+        cap = ASYNC_CONCURRENCY_CAP if args.engine == "asyncio" else CONCURRENCY_CAP
+        max_limit = max(concurrency, min(args.max_concurrency or cap, total or cap))
+    scheduler = AdaptiveScheduler(concurrency, max_limit, per_host=args.per_host, adaptive=args.adaptive,
+                                  measure=args.variant == "fit")
+    # workers only ever run jobs the scheduler already granted a slot, so none sit blocked
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=scheduler.max_limit)
+    # --stream admits at most this many jobs at once (probing + queued + downloading)
+    max_inflight = max(args.max_inflight or scheduler.max_limit * STREAM_INFLIGHT_FACTOR, scheduler.max_limit) \
+        if args.stream else None
+    inflight = threading.BoundedSemaphore(max_inflight) if max_inflight else None
+    progress_lock = threading.Lock()
+    counters = {"admitted": 0, "finished": 0, "intake_done": False}
+    all_done = threading.Event()
+
+    def retire(st: DownloadStatus):
+        if results is not None:
+            results.retire(st, drop=args.stream)
+
+    def job_finished(fut: concurrent.futures.Future):
+        if not fut.cancelled() and fut.exception() is not None:
+            eprint(colored("Worker exception: " + str(fut.exception()), COLOR_RED))
+        if inflight is not None:
+            inflight.release()
+        with progress_lock:
+            counters["finished"] += 1
+            if counters["intake_done"] and counters["finished"] == counters["admitted"]:
+                all_done.set()
+
+    def launch(i: int, url: str):
+        host = job_host(url)
+
+        def done(fut: concurrent.futures.Future):
+            st = statuses[i]
+            if st.state not in FINISHED_STATES:
+                st.state = "failed"  # worker raised; job_finished reports the exception
+                st.err_message = st.err_message or (str(fut.exception()) if not fut.cancelled() else None)
+            scheduler.release(host, None if st.state == "cancelled" else st.state == "done")
+
+            def settled():
+                if metrics is not None:
+                    metrics.job_finished(st)
+                retire(st)
+                job_finished(fut)
+
+            # the download slot is already free; verification overlaps with the next downloads
+            if st.state == "done" and st.staging is not None:
+                start_verify(st, settled)
+            else:
+                settled()
+
+        def start():
             try:
-                fut.result()
-            except Exception as e:
-                eprint(colored("Worker exception: " + str(e), COLOR_RED))
+                fut = executor.submit(run_download, i, url, args.engine, segment_workers)
+            except RuntimeError:  # executor already shut down (abort)
+                statuses[i].state = "cancelled"
+                fut = concurrent.futures.Future()
+                fut.cancel()
+            fut.add_done_callback(done)
+
+        scheduler.enqueue(host, start)
+
+    jobs = queue_intake() if queue is not None else intake()
+    if queue is not None:
+        queue.start_heartbeat()
+    try:
+        if args.engine == "asyncio":
+            install_async_child_watcher()
+            raise_fd_limit(scheduler.max_limit * 4 + 256)
+            scheduler.start()
+            asyncio.run(run_async_engine(jobs, scheduler, probe_executor, max_inflight, retire))
+        else:
+            scheduler.start()
+            while True:
+                if inflight is not None:
+                    while not inflight.acquire(timeout=0.5):
+                        pass
+                i = next(jobs, None)
+                if i is None:
+                    if inflight is not None:
+                        inflight.release()
+                    break
+                with progress_lock:
+                    counters["admitted"] += 1
+                url = statuses[i].url
+                if args.engine == "native" or args.live:
+                    launch(i, url)
+                else:
+                    pfut = probe_executor.submit(probe_job, i)
+                    pfut.add_done_callback(lambda _f, i=i, url=url: launch(i, url))
+            with progress_lock:
+                counters["intake_done"] = True
+                if counters["finished"] == counters["admitted"]:
+                    all_done.set()
+            while not all_done.wait(0.5):
+                pass
     except KeyboardInterrupt:
         eprint(colored("\nAbort signal received — commanding all craft to stand down...", COLOR_MAGENTA))
+        abort_event.set()
         with active_procs_lock:
             for k, p in list(active_procs.items()):
                 try:
@@ -474,17 +3504,60 @@ def main():
                     except Exception:
                         pass
         eprint("Sent terminate to ffmpeg processes. Waiting briefly...")
+        if queue is not None:
+            eprint(f"Unfinished jobs go back to {queue.path} for the next worker.")
+        elif journal is not None:
+            eprint(f"Progress is kept in {journal.path}; rerun the same urls file to resume.")
         time.sleep(1.0)
     finally:
-        executor.shutdown(wait=False)
+        scheduler.stop()
+        if metrics is not None:
+            metrics.close()
+        probe_executor.shutdown(wait=False, cancel_futures=True)
+        executor.shutdown(wait=False, cancel_futures=True)
+        if verify_pool is not None:
+            verify_pool.shutdown(wait=not abort_event.is_set(), cancel_futures=True)
+        http_pool.close()
+        if probe_cache is not None:
+            try:
+                probe_cache.save()
+            except OSError as e:
+                eprint(colored(f"Warning: could not save probe cache: {e}", COLOR_YELLOW))
+        if journal is not None:
+            journal.close()
         stop_event.set()
         monitor_thread.join(timeout=2.0)
+        if results is not None:
+            results.close()
+
+    if args.stream:
+        c = results.counts
+        with statuses_lock:
+            unfinished = len(statuses)  # still in flight when the run was aborted
+        n_failed = c["failed"] + c["cancelled"] + unfinished
+        eprint("")
+        eprint(colored(f"{EMOJI_PLANET} Mission Summary:", COLOR_BOLD))
+        eprint(colored(f"  succeeded: {c['done'] + c['verified']}", COLOR_GREEN))
+        eprint(colored(f"  failed or incomplete: {n_failed}", COLOR_RED if n_failed else COLOR_GREEN))
+        for n, rec in enumerate(results.failures()):
+            if n == STREAM_SUMMARY_FAILURES:
+                eprint(colored(f"    ... {n_failed - n} more in {results.path}", COLOR_YELLOW))
+                break
+            eprint(colored(f"    - url: {rec['url']}", COLOR_YELLOW))
+            eprint(colored(f"      state: {rec['state']}  error: {rec.get('error')}", COLOR_RED))
+        eprint(f"  per-job results: {results.path}")
+        if queue is not None:
+            counts = queue.state_counts()
+            eprint("  queue now: " + ", ".join(f"{n} {state}" for state, n in sorted(counts.items())))
+        if segment_cache is not None:
+            eprint(f"  {segment_cache.summary()}")
+        sys.exit(2 if n_failed else 0)
 
     successes = []
     failures = []
     with statuses_lock:
         for idx, st in statuses.items():
-            if st.state == "done":
+            if st.state in SUCCESS_STATES:
                 successes.append(st)
             else:
                 failures.append(st)
@@ -498,6 +3571,8 @@ def main():
     for f in failures:
         eprint(colored(f"    - url: {f.url}", COLOR_YELLOW))
         eprint(colored(f"      state: {f.state}  error: {f.err_message or f.last_log}", COLOR_RED))
+    if segment_cache is not None:
+        eprint(f"  {segment_cache.summary()}")
 
     if failures:
         sys.exit(2)
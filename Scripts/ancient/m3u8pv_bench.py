@@ -0,0 +1,351 @@
+#!/home/dan/.local/env/misc/bin/python
+"""
+m3u8pv_bench.py
+
+Benchmark harness for m3u8pv.py against a synthetic HLS origin on loopback — no network needed.
+
+The origin serves /v<N>/master.m3u8 -> /v<N>/media.m3u8 -> /v<N>/seg<i>.ts for any N, with a
+configurable segment count, segment size, per-request latency, per-connection bandwidth
+throttle and error rate (503s on segment requests). Segments are real MPEG-TS cut by ffmpeg
+when it is available, otherwise MPEG-TS null packets (only useful with --fetch-only).
+
+Each run starts m3u8pv.py as a subprocess for every (engine, concurrency) pair and reports
+jobs/sec, bytes/sec, per-job overhead (probe + connect + remux, from the --events stream) and
+peak RSS of the m3u8pv process. --fetch-only skips ffmpeg entirely and times the native
+engine's playlist parser and pooled segment fetcher in-process.
+
+Usage:
+    python m3u8pv_bench.py
+    python m3u8pv_bench.py --engines native,asyncio --concurrency 1,8,32 --jobs 64 \\
+        --segments 50 --segment-size 200000 --latency-ms 20 --bandwidth 2000000 --error-rate 0.01
+    python m3u8pv_bench.py --fetch-only --concurrency 1,4,16
+    python m3u8pv_bench.py --serve   # just run the origin (prints its base URL)
+
+Mission Control render cost is benchmarked by `m3u8pv.py --bench-render`.
+"""
+
+from __future__ import annotations
+import argparse
+import concurrent.futures
+import http.server
+import importlib.util
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+M3U8PV = os.path.join(HERE, "m3u8pv.py")
+TS_PACKET = 188
+SEGMENT_SECONDS = 2.0
+
+# ---------- Synthetic origin ----------
+def null_ts_payload(size: int) -> bytes:
+    """MPEG-TS null packets (PID 0x1FFF): valid transport stream framing, no programs."""
+    packet = bytes([0x47, 0x1F, 0xFF, 0x10]) + b"\xff" * (TS_PACKET - 4)
+    return packet * max(1, size // TS_PACKET)
+
+def ffmpeg_ts_payload(size: int, workdir: str) -> Optional[bytes]:
+    """One SEGMENT_SECONDS test-pattern segment, padded with null packets up to ~size bytes."""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    out = os.path.join(workdir, "seed.ts")
+    cmd = [ffmpeg, "-v", "error", "-y",
+           "-f", "lavfi", "-i", f"testsrc=size=320x180:rate=25:duration={SEGMENT_SECONDS}",
+           "-f", "lavfi", "-i", f"sine=frequency=440:duration={SEGMENT_SECONDS}",
+           "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-f", "mpegts", out]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=60)
+        with open(out, "rb") as fh:
+            data = fh.read()
+    except Exception:
+        return None
+    if len(data) < size:
+        data += null_ts_payload(size - len(data))
+    return data
+
+class OriginConfig:
+    def __init__(self, segments: int, payload: bytes, latency: float, bandwidth: Optional[float], error_rate: float):
+        self.segments = segments
+        self.payload = payload
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.rng = random.Random(0)
+        self.lock = threading.Lock()
+        self.bytes_served = 0
+        self.requests = 0
+        self.errors = 0
+
+    def media_playlist(self) -> bytes:
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{int(SEGMENT_SECONDS)}",
+                 "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD"]
+        for i in range(self.segments):
+            lines.append(f"#EXTINF:{SEGMENT_SECONDS:.3f},")
+            lines.append(f"seg{i}.ts")
+        lines.append("#EXT-X-ENDLIST")
+        return ("\n".join(lines) + "\n").encode("ascii")
+
+    @staticmethod
+    def master_playlist() -> bytes:
+        return (b"#EXTM3U\n"
+                b"#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=320x180,CODECS=\"avc1.42c00d,mp4a.40.2\"\n"
+                b"media.m3u8\n")
+
+class OriginHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like a real CDN
+    cfg: OriginConfig = None  # set by start_origin
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str):
+        cfg = self.cfg
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not cfg.bandwidth:
+            self.wfile.write(body)
+        else:
+            chunk = 16 * 1024
+            for off in range(0, len(body), chunk):
+                piece = body[off:off + chunk]
+                self.wfile.write(piece)
+                time.sleep(len(piece) / cfg.bandwidth)
+        with cfg.lock:
+            cfg.bytes_served += len(body)
+
+    def do_GET(self):
+        cfg = self.cfg
+        with cfg.lock:
+            cfg.requests += 1
+        if cfg.latency:
+            time.sleep(cfg.latency)
+        path = self.path.split("?", 1)[0]
+        name = path.rsplit("/", 1)[-1]
+        if name == "master.m3u8":
+            return self._send(200, cfg.master_playlist(), "application/vnd.apple.mpegurl")
+        if name == "media.m3u8":
+            return self._send(200, cfg.media_playlist(), "application/vnd.apple.mpegurl")
+        if name.startswith("seg") and name.endswith(".ts"):
+            with cfg.lock:
+                fail = cfg.error_rate and cfg.rng.random() < cfg.error_rate
+                if fail:
+                    cfg.errors += 1
+            if fail:
+                return self._send(503, b"injected failure\n", "text/plain")
+            return self._send(200, cfg.payload, "video/mp2t")
+        return self._send(404, b"not found\n", "text/plain")
+
+def start_origin(cfg: OriginConfig):
+    handler = type("BoundOriginHandler", (OriginHandler,), {"cfg": cfg})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# ---------- Runs ----------
+def peak_rss_watch(pid: int, stop: threading.Event, result: Dict[str, int]):
+    """Poll /proc/<pid>/status for the m3u8pv process's own high-water mark (Linux)."""
+    status = f"/proc/{pid}/status"
+    while not stop.is_set():
+        try:
+            with open(status, "r") as fh:
+                for line in fh:
+                    if line.startswith(("VmHWM:", "VmRSS:")):
+                        kb = int(line.split()[1])
+                        result["peak_kb"] = max(result.get("peak_kb", 0), kb)
+        except (OSError, ValueError):
+            break
+        stop.wait(0.05)
+
+def job_overheads(events_path: str) -> List[float]:
+    out = []
+    try:
+        with open(events_path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                rec = json.loads(line)
+                if rec.get("event") in ("done", "failed"):
+                    stages = rec.get("stages") or {}
+                    out.append(sum(stages.get(k, 0.0) for k in ("probe", "connect", "remux")))
+    except (OSError, ValueError):
+        pass
+    return out
+
+def run_m3u8pv(base: str, engine: str, concurrency: int, jobs: int, master: bool, workdir: str) -> dict:
+    rundir = tempfile.mkdtemp(prefix=f"{engine}-c{concurrency}-", dir=workdir)
+    urls_file = os.path.join(rundir, "urls.txt")
+    entry = "master.m3u8" if master else "media.m3u8"
+    with open(urls_file, "w", encoding="utf-8") as fh:
+        for i in range(jobs):
+            fh.write(f"{base}/v{i}/{entry}\n")
+    events = os.path.join(rundir, "events.jsonl")
+    cmd = [sys.executable, M3U8PV, "--engine", engine, "--no-journal", "--no-probe-cache",
+           "--segment-cache-size", "0", "--events", events, urls_file]
+    env = dict(os.environ, M3U8_CONCURRENCY=str(concurrency))
+    rss: Dict[str, int] = {}
+    stop = threading.Event()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=rundir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    watcher = threading.Thread(target=peak_rss_watch, args=(proc.pid, stop, rss), daemon=True)
+    watcher.start()
+    _, err = proc.communicate()
+    wall = time.perf_counter() - t0
+    stop.set()
+    watcher.join(timeout=1.0)
+    out_bytes = 0
+    done = 0
+    for name in os.listdir(rundir):
+        if name.endswith(".mp4"):
+            out_bytes += os.path.getsize(os.path.join(rundir, name))
+            done += 1
+    overheads = job_overheads(events)
+    shutil.rmtree(rundir, ignore_errors=True)
+    return {
+        "engine": engine, "concurrency": concurrency, "jobs": jobs, "ok": done,
+        "wall_s": wall, "jobs_per_s": jobs / wall if wall else 0.0,
+        "bytes_per_s": out_bytes / wall if wall else 0.0,
+        "overhead_ms": (sum(overheads) / len(overheads) * 1000.0) if overheads else None,
+        "peak_rss_mb": rss.get("peak_kb", 0) / 1024.0 if rss else None,
+        "returncode": proc.returncode,
+        "stderr_tail": (err or "").strip().splitlines()[-1:] if proc.returncode not in (0, 2) else [],
+    }
+
+def load_m3u8pv():
+    spec = importlib.util.spec_from_file_location("m3u8pv", M3U8PV)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def run_fetch_only(mod, base: str, concurrency: int, jobs: int, segment_workers: int, master: bool) -> dict:
+    """Native engine fetch path only (playlist parse + pooled segment fetch), in-process, into memory."""
+    import resource
+    entry = "master.m3u8" if master else "media.m3u8"
+    pool = mod.HttpPool()
+    mod.http_pool = pool
+    fetched = [0]
+    lock = threading.Lock()
+
+    def one(i: int) -> Tuple[float, bool]:
+        """(playlist setup seconds, whether every segment was fetched)."""
+        t0 = time.perf_counter()
+        try:
+            _, playlist = mod.load_media_playlist(f"{base}/v{i}/{entry}")
+        except mod.HttpError:
+            return time.perf_counter() - t0, False
+        setup = time.perf_counter() - t0
+
+        def seg(s):
+            for attempt in range(mod.SEGMENT_RETRIES):
+                try:
+                    n = len(pool.fetch(s.uri, byterange=s.byterange))
+                    with lock:
+                        fetched[0] += n
+                    return True
+                except mod.HttpError:
+                    time.sleep(0.05 * (attempt + 1))
+            return False
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=segment_workers) as segs:
+            ok = all(list(segs.map(seg, playlist.segments)))
+        return setup, ok
+
+    t0 = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as ex:
+        outcomes = list(ex.map(one, range(jobs)))
+    wall = time.perf_counter() - t0
+    pool.close()
+    return {
+        "engine": "fetch-only", "concurrency": concurrency, "jobs": jobs, "ok": sum(ok for _, ok in outcomes),
+        "wall_s": wall, "jobs_per_s": jobs / wall, "bytes_per_s": fetched[0] / wall,
+        "overhead_ms": sum(setup for setup, _ in outcomes) / len(outcomes) * 1000.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "returncode": 0, "stderr_tail": [],
+    }
+
+def human_rate(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024.0:
+            return f"{n:6.1f}{unit}/s"
+        n /= 1024.0
+    return f"{n:6.1f}TB/s"
+
+def print_row(r: dict):
+    overhead = f"{r['overhead_ms']:9.1f}" if r["overhead_ms"] is not None else "      N/A"
+    rss = f"{r['peak_rss_mb']:8.1f}" if r["peak_rss_mb"] else "     N/A"
+    print(f"{r['engine']:>10} {r['concurrency']:>5} {r['ok']:>4}/{r['jobs']:<4} {r['wall_s']:8.2f} "
+          f"{r['jobs_per_s']:8.2f} {human_rate(r['bytes_per_s']):>11} {overhead} {rss}")
+    for ln in r["stderr_tail"]:
+        print(f"{'':>10} rc={r['returncode']}: {ln}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark m3u8pv.py against a local synthetic HLS origin.")
+    parser.add_argument("--engines", default="ffmpeg,native,asyncio", help="comma-separated m3u8pv engines")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency settings")
+    parser.add_argument("--jobs", type=int, default=16, help="URLs per run")
+    parser.add_argument("--segments", type=int, default=30, help="segments per media playlist")
+    parser.add_argument("--segment-size", type=int, default=256 * 1024, help="bytes per segment")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added latency per request")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="per-connection throttle in bytes/s (0 = unthrottled)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of segment requests answered with 503")
+    parser.add_argument("--master", action="store_true", help="hand m3u8pv master playlists instead of media playlists")
+    parser.add_argument("--segment-workers", type=int, default=8, help="per-stream fetchers for --fetch-only")
+    parser.add_argument("--fetch-only", action="store_true", help="time the native fetch path in-process (no ffmpeg)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    parser.add_argument("--serve", action="store_true", help="only run the origin until Ctrl-C")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="m3u8pv-bench-")
+    try:
+        payload = None if args.fetch_only else ffmpeg_ts_payload(args.segment_size, workdir)
+        if payload is None:
+            if not args.fetch_only and not args.serve:
+                print("ffmpeg not found: only --fetch-only runs are meaningful without it.", file=sys.stderr)
+                sys.exit(1)
+            payload = null_ts_payload(args.segment_size)
+        cfg = OriginConfig(args.segments, payload, args.latency_ms / 1000.0, args.bandwidth or None, args.error_rate)
+        server, base = start_origin(cfg)
+        print(f"origin: {base}  segments={args.segments} x {len(payload)}B  latency={args.latency_ms}ms  "
+              f"bandwidth={human_rate(args.bandwidth) if args.bandwidth else 'unthrottled'}  errors={args.error_rate:.1%}",
+              file=sys.stderr)
+        if args.serve:
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                return
+
+        concurrencies = [int(c) for c in args.concurrency.split(",") if c.strip()]
+        engines = ["fetch-only"] if args.fetch_only else [e.strip() for e in args.engines.split(",") if e.strip()]
+        mod = load_m3u8pv() if args.fetch_only else None
+        if not args.json:
+            print(f"{'engine':>10} {'conc':>5} {'ok/jobs':>9} {'wall s':>8} {'jobs/s':>8} {'bytes/s':>11} "
+                  f"{'ovh ms/job':>9} {'peak MB':>8}")
+        for engine in engines:
+            for conc in concurrencies:
+                if args.fetch_only:
+                    r = run_fetch_only(mod, base, conc, args.jobs, args.segment_workers, args.master)
+                else:
+                    r = run_m3u8pv(base, engine, conc, args.jobs, args.master, workdir)
+                if args.json:
+                    print(json.dumps(r))
+                else:
+                    print_row(r)
+                sys.stdout.flush()
+        print(f"origin served {cfg.requests} requests, {cfg.bytes_served} bytes, {cfg.errors} injected errors",
+              file=sys.stderr)
+        server.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
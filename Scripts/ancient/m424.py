@@ -1,12 +1,47 @@
 #!/home/dan/.local/env/misc/bin/python
 # converts m4a or mp4 without video to video
+#
+#   m424.py talk.m4a                 -> talk.mp4
+#   m424.py talk.mp4                 -> talk_video.mp4
+#   m424.py --image cover.jpg a.m4a  -> a.mp4 with cover.jpg as the picture
+#   m424.py podcasts/ -j 4           -> every audio-only .m4a/.mp4 in podcasts/, 4 at a time
+#   m424.py --trim-silence talk.m4a  -> talk.mp4 with pauses longer than --min-silence cut out
+#
+# Fast path: ffmpeg loops one still frame at 1 fps (black unless --image is given) and copies the
+# audio stream as is when MP4 can carry it (AAC, ALAC, MP3); anything else is encoded to AAC.
+# A podcast-length file takes seconds. MoviePy (old frame-by-frame pipeline) is only used when
+# ffmpeg is not installed.
+#
+# Silence trimming (replaces running trim_silence.sh first, which decoded and encoded everything
+# twice): one ffmpeg decodes to PCM on a pipe, NumPy measures the RMS of every 10 ms frame a
+# chunk at a time and drops the middle of each pause, and the kept PCM goes straight into the
+# encoding ffmpeg. Only about --min-silence of audio is ever held, so memory does not grow with
+# the length of the file. Without NumPy the same cut is left to ffmpeg's silenceremove filter in
+# the encoding pass. m424_bench.py compares both against trim_silence.sh.
 
+import argparse
+import concurrent.futures
+import json
 import os
+import shutil
+import subprocess
 import sys
 import tempfile
-from moviepy import AudioFileClip, ImageClip
-import moviepy
-from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:  # only needed for --trim-silence; ffmpeg's silenceremove is used without it
+    np = None
+
+INPUT_EXTS = ('.m4a', '.mp4')
+COPY_AUDIO_CODECS = ('aac', 'alac', 'mp3')  # go into MP4 without re-encoding
+AUDIO_BITRATE = '64k'  # only used when the audio has to be re-encoded
+WIDTH, HEIGHT = 640, 360
+SILENCE_THRESHOLD_DB = -50.0  # same level trim_silence.sh used
+MIN_SILENCE = 0.5  # seconds; shorter pauses are left alone
+SILENCE_PAD = 0.1  # seconds of each long pause that are kept on both sides
+FRAME_SECONDS = 0.01  # RMS window
+CHUNK_FRAMES = 500  # frames per read from the decoder (5 s of audio)
 
 # Function to validate file existence and extension
 def validate_file(file_path, expected_exts):
@@ -15,55 +50,301 @@ def validate_file(file_path, expected_exts):
     if not any(file_path.lower().endswith(ext) for ext in expected_exts):
         raise ValueError(f"File must have one of {expected_exts} extensions: {file_path}")
 
+# Function to generate output path automatically from input path
+def output_path_for(input_path):
+    base, ext = os.path.splitext(input_path)
+    return base + ('_video' if ext.lower() == '.mp4' else '') + '.mp4'
+
+# Function to find the first stream of each type ({"audio": {...ffprobe stream...}}); None when ffprobe can't read it
+def probe_streams(path):
+    cmd = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_streams', path]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    streams = {}
+    for s in json.loads(proc.stdout or '{}').get('streams') or []:
+        # attached cover art shows up as a video stream; it doesn't make the file a video
+        if s.get('disposition', {}).get('attached_pic'):
+            continue
+        streams.setdefault(s.get('codec_type'), s)
+    return streams
+
+# Function to check whether the output is newer than its input (and the still image)
+def up_to_date(input_path, output_path, image=None):
+    if not os.path.isfile(output_path):
+        return False
+    newest = os.path.getmtime(input_path)
+    if image:
+        newest = max(newest, os.path.getmtime(image))
+    return os.path.getmtime(output_path) >= newest
+
+# Function to build the ffmpeg command: one looped still frame + the given audio input
+def ffmpeg_command(audio_input, output_path, audio_options, image=None):
+    if image:
+        picture = ['-loop', '1', '-framerate', '1', '-i', image]
+    else:
+        picture = ['-f', 'lavfi', '-i', f'color=c=black:s={WIDTH}x{HEIGHT}:r=1']
+    return [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+        *picture, *audio_input,
+        '-map', '0:v:0', '-map', '1:a:0',
+        # 1 fps and stillimage tuning: the encoder sees one frame per second of audio
+        '-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'stillimage', '-r', '1',
+        '-vf', f'scale={WIDTH}:{HEIGHT}:force_original_aspect_ratio=decrease,'
+               f'pad={WIDTH}:{HEIGHT}:(ow-iw)/2:(oh-ih)/2,format=yuv420p',
+        *audio_options,
+        '-shortest', '-movflags', '+faststart',
+        output_path,
+    ]
+
+# Function to build ffmpeg's own version of the trim, used in the encoding pass when NumPy is missing
+def silenceremove_filter(trim):
+    threshold_db, min_silence, pad = trim
+    return (f'silenceremove=start_periods=1:start_threshold={threshold_db}dB:start_silence={pad}:'
+            f'stop_periods=-1:stop_duration={min_silence}:stop_threshold={threshold_db}dB:stop_silence={pad}')
+
+# Class to drop the middle of every pause of at least min_frames quiet frames, keeping pad_frames
+# on each side. Frames arrive in chunks; only the current pause is held back, and once it is known
+# to be long enough to cut, only its last pad_frames are.
+class SilenceGate:
+    def __init__(self, write, threshold_db, min_frames, pad_frames):
+        self.write = write
+        # compare mean squares of int16 samples against the threshold instead of taking sqrt/log per frame
+        self.threshold = (10 ** (threshold_db / 20) * 32768) ** 2
+        self.min_frames = max(1, min_frames)
+        self.pad_frames = pad_frames
+        self.run = 0  # quiet frames in the current pause so far
+        self.held = []  # frames of the pause past the leading pad, not written yet
+        self.held_count = 0
+        self.kept = 0
+        self.dropped = 0
+
+    def feed(self, frames):
+        samples = frames.astype(np.float32)
+        quiet = np.mean(samples * samples, axis=1) < self.threshold
+        edges = np.flatnonzero(quiet[1:] != quiet[:-1]) + 1
+        for a, b in zip(np.concatenate(([0], edges)), np.concatenate((edges, [len(quiet)]))):
+            if quiet[a]:
+                self._quiet(frames[a:b])
+            else:
+                self.close()
+                self._emit(frames[a:b])
+
+    def _quiet(self, frames):
+        head = max(0, min(len(frames), self.pad_frames - self.run))
+        if head:
+            self._emit(frames[:head])
+        self.run += len(frames)
+        if head < len(frames):
+            self.held.append(frames[head:])
+            self.held_count += len(frames) - head
+        if self.run >= self.min_frames and self.held_count > self.pad_frames:
+            tail = np.concatenate(self.held)[self.held_count - self.pad_frames:]
+            self.dropped += self.held_count - len(tail)
+            self.held, self.held_count = [tail], len(tail)
+
+    # Function to end the current pause: a short one is written whole, a long one only its trailing pad
+    def close(self):
+        for frames in self.held:
+            self._emit(frames)
+        self.held, self.held_count, self.run = [], 0, 0
+
+    def _emit(self, frames):
+        if len(frames):
+            self.write(frames.tobytes())
+            self.kept += len(frames)
+
+# Function to convert with silence trimming in one pass: decoder -> SilenceGate -> encoder
+def convert_trimmed(input_path, tmp_path, audio_stream, image, trim):
+    threshold_db, min_silence, pad = trim
+    rate = str(audio_stream.get('sample_rate') or 48000)
+    channels = str(audio_stream.get('channels') or 2)
+    frame_len = max(1, round(int(rate) * FRAME_SECONDS)) * int(channels)
+    frame_bytes = frame_len * 2
+    pcm = ['-f', 's16le', '-ar', rate, '-ac', channels]
+    decode = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-i', input_path,
+              '-map', '0:a:0', '-c:a', 'pcm_s16le', *pcm, 'pipe:1']
+    encode = ffmpeg_command([*pcm, '-i', 'pipe:0'], tmp_path, ['-c:a', 'aac', '-b:a', AUDIO_BITRATE], image)
+    # stderr goes to files: an unread stderr pipe could fill up and stall either side
+    with tempfile.TemporaryFile() as dec_err, tempfile.TemporaryFile() as enc_err:
+        dec = subprocess.Popen(decode, stdout=subprocess.PIPE, stderr=dec_err)
+        enc = subprocess.Popen(encode, stdin=subprocess.PIPE, stderr=enc_err)
+        gate = SilenceGate(enc.stdin.write, threshold_db,
+                           round(min_silence / FRAME_SECONDS), round(pad / FRAME_SECONDS))
+        try:
+            while True:
+                buf = dec.stdout.read(CHUNK_FRAMES * frame_bytes)
+                if not buf:
+                    break
+                whole = len(buf) - len(buf) % frame_bytes
+                if whole:
+                    gate.feed(np.frombuffer(buf, dtype='<i2', count=whole // 2).reshape(-1, frame_len))
+                if whole < len(buf):  # last partial frame at end of stream
+                    gate.close()
+                    enc.stdin.write(buf[whole:])
+            gate.close()
+            enc.stdin.close()
+        except BrokenPipeError:  # encoder died; its exit status and stderr say why
+            dec.kill()
+        dec.stdout.close()
+        dec.wait()
+        enc.wait()
+        for proc, err, name in ((enc, enc_err, 'ffmpeg (encode)'), (dec, dec_err, 'ffmpeg (decode)')):
+            if proc.returncode != 0:
+                err.seek(0)
+                message = err.read().decode(errors='replace').strip()
+                raise RuntimeError(message or f"{name} exited with code {proc.returncode}")
+    return gate.kept * FRAME_SECONDS, gate.dropped * FRAME_SECONDS
+
+# Function to convert with ffmpeg; writes next to the output and renames so no partial file is left.
+# Returns a note on what happened to the audio.
+def convert_ffmpeg(input_path, output_path, audio_stream, image=None, trim=None):
+    tmp_path = os.path.join(os.path.dirname(output_path) or '.', '.' + os.path.basename(output_path))
+    codec = audio_stream.get('codec_name')
+    try:
+        if trim and np is not None:
+            kept, dropped = convert_trimmed(input_path, tmp_path, audio_stream, image, trim)
+            how = f"cut {dropped:.1f}s of silence, kept {kept:.1f}s, audio encoded to AAC {AUDIO_BITRATE}"
+        else:
+            if trim:
+                audio = ['-af', silenceremove_filter(trim), '-c:a', 'aac', '-b:a', AUDIO_BITRATE]
+                how = f"silence cut by ffmpeg (no numpy), audio encoded to AAC {AUDIO_BITRATE}"
+            elif codec in COPY_AUDIO_CODECS:
+                audio, how = ['-c:a', 'copy'], 'audio copied'
+            else:
+                audio, how = ['-c:a', 'aac', '-b:a', AUDIO_BITRATE], f"audio encoded to AAC {AUDIO_BITRATE}"
+            proc = subprocess.run(ffmpeg_command(['-i', input_path], tmp_path, audio, image),
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise RuntimeError(proc.stderr.strip() or f"ffmpeg exited with code {proc.returncode}")
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+    return how
+
 # Function to create a minimal solid black JPG
-def create_black_image(output_path, width=640, height=360):
+def create_black_image(output_path, width=WIDTH, height=HEIGHT):
+    from PIL import Image
     # Create a black image using PIL with minimal resolution
     image = Image.new('RGB', (width, height), (0, 0, 0))  # Black color
     image.save(output_path, 'JPEG', quality=10)  # Very low quality to minimize file size
     return output_path
 
-# Check if correct number of arguments is provided
-if len(sys.argv) != 2:
-    print("Usage: python convert_audio_to_mp4.py <input_audio> (supports .m4a or .mp4)")
-    sys.exit(1)
+# Function to convert with MoviePy (slow: renders frames through Python, re-encodes audio)
+def convert_moviepy(input_path, output_path, image=None):
+    from moviepy import AudioFileClip, ImageClip
 
-# Get command-line argument
-input_path = sys.argv[1]
+    image_path = image
+    if not image_path:
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_image:
+            image_path = create_black_image(temp_image.name)
+    try:
+        audio = AudioFileClip(input_path)
+        video = ImageClip(image_path).with_duration(audio.duration).with_audio(audio)
+        video.write_videofile(
+            output_path,
+            codec='libx264',
+            audio_codec='aac',
+            bitrate='500k',  # Low video bitrate for minimal file size
+            audio_bitrate=AUDIO_BITRATE,
+            fps=1  # Single frame for static image
+        )
+    finally:
+        if not image and os.path.exists(image_path):
+            os.remove(image_path)
 
-# Validate input
-validate_file(input_path, ('.m4a', '.mp4'))
+# Function to convert one file; returns (input, status, detail) so it can run in a worker process
+# (trim is (threshold_db, min_silence, pad) or None)
+def convert(input_path, image=None, force=False, batch=False, trim=None):
+    output_path = output_path_for(input_path)
+    if not force and up_to_date(input_path, output_path, image):
+        return input_path, 'skipped', f"up to date: {output_path}"
+    if not shutil.which('ffmpeg'):
+        if trim:
+            print(f"Warning: silence trimming needs ffmpeg; {input_path} is converted untrimmed", file=sys.stderr)
+        convert_moviepy(input_path, output_path, image)
+        return input_path, 'converted', f"{output_path} (moviepy)"
+    streams = probe_streams(input_path)
+    if streams is None or 'audio' not in streams:
+        return input_path, 'failed', "no audio stream found"
+    if 'video' in streams:
+        if batch:
+            return input_path, 'skipped', "already has video"
+        print(f"Warning: {input_path} already has a video stream; it will be replaced", file=sys.stderr)
+    try:
+        how = convert_ffmpeg(input_path, output_path, streams['audio'], image, trim)
+    except RuntimeError as e:
+        return input_path, 'failed', str(e)
+    return input_path, 'converted', f"{output_path} ({how})"
 
-# Generate output path automatically from input_path
-base, ext = os.path.splitext(input_path)
-output_path = base + ('_video' if ext.lower() == '.mp4' else '') + '.mp4'
+# Function to find the inputs of a batch: audio files, not our own outputs
+def batch_inputs(directory):
+    entries = sorted((e for e in os.scandir(directory) if e.is_file()), key=lambda e: e.name)
+    outputs = {output_path_for(e.path) for e in entries if e.name.lower().endswith('.m4a')}
+    inputs = []
+    for entry in entries:
+        if not entry.name.lower().endswith(INPUT_EXTS) or entry.name.startswith('.'):
+            continue
+        if entry.name.lower().endswith('_video.mp4') or entry.path in outputs:
+            continue
+        inputs.append(entry.path)
+    return inputs
 
-# Create a temporary black JPG image
-with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_image:
-    image_path = create_black_image(temp_image.name)
+def main():
+    parser = argparse.ArgumentParser(description="Turn audio-only .m4a/.mp4 files into .mp4 videos with a still picture.")
+    parser.add_argument('input', help="audio file, or a directory to convert in batch")
+    parser.add_argument('--image', help="still picture to show (default: black frame)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="parallel conversions in batch mode (default: CPU count)")
+    parser.add_argument('-f', '--force', action='store_true', help="convert even if the output is up to date")
+    parser.add_argument('--trim-silence', action='store_true', help="cut long pauses out of the audio")
+    parser.add_argument('--silence-threshold', type=float, default=SILENCE_THRESHOLD_DB,
+                        help=f"level in dBFS below which audio counts as silence (default: {SILENCE_THRESHOLD_DB})")
+    parser.add_argument('--min-silence', type=float, default=MIN_SILENCE,
+                        help=f"shortest pause in seconds that gets cut (default: {MIN_SILENCE})")
+    parser.add_argument('--silence-pad', type=float, default=SILENCE_PAD,
+                        help=f"seconds of a cut pause kept on each side (default: {SILENCE_PAD})")
+    args = parser.parse_args()
+    trim = (args.silence_threshold, args.min_silence, args.silence_pad) if args.trim_silence else None
 
-try:
-    # Load the audio
-    audio = AudioFileClip(input_path)
+    if args.image and not os.path.isfile(args.image):
+        print(f"Error: image not found: {args.image}", file=sys.stderr)
+        sys.exit(1)
 
-    # Create a video clip from the black image, set to the audio's duration
-    video = ImageClip(image_path).with_duration(audio.duration)
+    if not os.path.isdir(args.input):
+        try:
+            validate_file(args.input, INPUT_EXTS)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        _, status, detail = convert(args.input, args.image, args.force, trim=trim)
+        if status == 'failed':
+            print(f"Error: {detail}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Successfully created {detail}" if status == 'converted' else f"Skipped, {detail}")
+        return
 
-    # Set the audio to the video clip
-    video = video.with_audio(audio)
+    inputs = batch_inputs(args.input)
+    if not inputs:
+        print(f"No {'/'.join(INPUT_EXTS)} files in {args.input}")
+        return
+    counts = {'converted': 0, 'skipped': 0, 'failed': 0}
+    # each conversion is one ffmpeg process; the pool just keeps -j of them running
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {pool.submit(convert, path, args.image, args.force, True, trim): path for path in inputs}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                path, status, detail = future.result()
+            except Exception as e:
+                path, status, detail = futures[future], 'failed', str(e)
+            counts[status] += 1
+            print(f"[{status}] {os.path.basename(path)}: {detail}", file=sys.stderr if status == 'failed' else sys.stdout)
+    print(f"{counts['converted']} converted, {counts['skipped']} skipped, {counts['failed']} failed")
+    if counts['failed']:
+        sys.exit(1)
 
-    # Write the output MP4 file with optimized compression
-    video.write_videofile(
-        output_path,
-        codec='libx264',
-        audio_codec='aac',
-        bitrate='500k',  # Low video bitrate for minimal file size
-        audio_bitrate='64k',  # Low audio bitrate
-        fps=1  # Single frame for static image
-    )
-
-    print(f"Successfully created {output_path}")
-
-finally:
-    # Clean up the temporary image file
-    if os.path.exists(image_path):
-        os.remove(image_path)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/home/dan/.local/env/misc/bin/python
+"""
+m424_bench.py
+
+Benchmark m424.py's silence trimming against the old two-step pipeline.
+
+A synthetic "podcast" is generated with ffmpeg: a tone with a pause of --pause seconds every
+--period seconds, --minutes long, encoded to AAC in an .m4a. Then, for each variant:
+
+    shell   trim_silence.sh input.m4a, then m424.py on input_TRIMMED.m4a (two encodes)
+    numpy   m424.py --trim-silence input.m4a (streaming NumPy gate, one encode)
+    ffmpeg  m424.py --trim-silence with NumPy hidden (silenceremove in the encoding pass)
+    plain   m424.py input.m4a (no trimming, audio stream-copied; the floor)
+
+it reports wall time, peak RSS of the m424.py process (Linux) and the output duration. Note that
+trim_silence.sh only removes leading silence (silenceremove=1:0:-50dB), so its output is longer.
+
+Usage:
+    python m424_bench.py
+    python m424_bench.py --minutes 60 --variants shell,numpy
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+M424 = os.path.join(HERE, "m424.py")
+TRIM_SILENCE = os.path.join(HERE, "trim_silence.sh")
+# run m424.py with numpy made unimportable, to time the silenceremove fallback
+NO_NUMPY = "import sys, runpy; sys.modules['numpy'] = None; sys.argv = sys.argv[1:]; runpy.run_path(sys.argv[0], run_name='__main__')"
+
+def make_input(path: str, minutes: float, period: float, pause: float):
+    expr = f"if(lt(mod(t\\,{period})\\,{period - pause})\\,0.3*sin(2*PI*440*t)\\,0)"
+    cmd = ["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", f"aevalsrc={expr}:s=44100:d={minutes * 60}",
+           "-c:a", "aac", "-b:a", "96k", path]
+    subprocess.run(cmd, check=True)
+
+def duration(path: str) -> Optional[float]:
+    cmd = ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", path]
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        return float(json.loads(out)["format"]["duration"])
+    except (OSError, subprocess.CalledProcessError, KeyError, ValueError):
+        return None
+
+def peak_rss_watch(pid: int, stop: threading.Event, result: Dict[str, int]):
+    """Poll /proc/<pid>/status for the process's own high-water mark (Linux)."""
+    status = f"/proc/{pid}/status"
+    while not stop.is_set():
+        try:
+            with open(status, "r") as fh:
+                for line in fh:
+                    if line.startswith(("VmHWM:", "VmRSS:")):
+                        kb = int(line.split()[1])
+                        result["peak_kb"] = max(result.get("peak_kb", 0), kb)
+        except (OSError, ValueError):
+            break
+        stop.wait(0.05)
+
+def timed(cmd: List[str], watch: bool) -> Dict[str, object]:
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    stop, rss = threading.Event(), {}
+    watcher = threading.Thread(target=peak_rss_watch, args=(proc.pid, stop, rss), daemon=True)
+    if watch:
+        watcher.start()
+    _, err = proc.communicate()
+    stop.set()
+    return {"wall_s": time.perf_counter() - start, "returncode": proc.returncode,
+            "peak_kb": rss.get("peak_kb", 0), "stderr_tail": err.strip().splitlines()[-3:]}
+
+def run_variant(variant: str, src: str, workdir: str) -> Dict[str, object]:
+    # every variant works on its own copy so outputs never look up to date
+    name = os.path.join(workdir, variant + ".m4a")
+    shutil.copyfile(src, name)
+    base = os.path.splitext(name)[0]
+    if variant == "shell":
+        first = timed(["bash", TRIM_SILENCE, name], watch=False)
+        second = timed([sys.executable, M424, base + "_TRIMMED.m4a"], watch=True)
+        r = dict(second, wall_s=first["wall_s"] + second["wall_s"],
+                 returncode=first["returncode"] or second["returncode"],
+                 stderr_tail=first["stderr_tail"] + second["stderr_tail"])
+        output = base + "_TRIMMED.mp4"
+    else:
+        if variant == "numpy":
+            cmd = [sys.executable, M424, "--trim-silence", name]
+        elif variant == "ffmpeg":
+            cmd = [sys.executable, "-c", NO_NUMPY, M424, "--trim-silence", name]
+        else:
+            cmd = [sys.executable, M424, name]
+        r = timed(cmd, watch=True)
+        output = base + ".mp4"
+    r["variant"] = variant
+    r["duration_s"] = duration(output) if r["returncode"] == 0 else None
+    return r
+
+def print_row(r: dict):
+    rss = f"{r['peak_kb'] / 1024:8.1f}" if r["peak_kb"] else "     N/A"
+    dur = f"{r['duration_s']:9.1f}" if r["duration_s"] is not None else "      N/A"
+    print(f"{r['variant']:>7} {r['wall_s']:8.2f} {rss} {dur}")
+    for ln in r["stderr_tail"]:
+        print(f"{'':>7} rc={r['returncode']}: {ln}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark m424.py --trim-silence against trim_silence.sh + m424.py.")
+    parser.add_argument("--minutes", type=float, default=30.0, help="length of the synthetic input")
+    parser.add_argument("--period", type=float, default=10.0, help="seconds between pauses")
+    parser.add_argument("--pause", type=float, default=3.0, help="length of each pause in seconds")
+    parser.add_argument("--variants", default="shell,numpy,ffmpeg,plain", help="comma-separated variants to run")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        print("ffmpeg/ffprobe not found.", file=sys.stderr)
+        sys.exit(1)
+    workdir = tempfile.mkdtemp(prefix="m424-bench-")
+    try:
+        src = os.path.join(workdir, "source.m4a")
+        make_input(src, args.minutes, args.period, args.pause)
+        print(f"input: {args.minutes:g} min, {args.pause:g}s pause every {args.period:g}s "
+              f"({duration(src) or 0:.1f}s, {os.path.getsize(src)} bytes)", file=sys.stderr)
+        if not args.json:
+            print(f"{'variant':>7} {'wall s':>8} {'peak MB':>8} {'output s':>9}")
+        for variant in (v.strip() for v in args.variants.split(",") if v.strip()):
+            r = run_variant(variant, src, workdir)
+            if args.json:
+                print(json.dumps(r))
+            else:
+                print_row(r)
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
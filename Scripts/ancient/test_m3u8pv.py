@@ -0,0 +1,232 @@
+"""
+Regression tests for m3u8pv.py against the loopback HLS origin from m3u8pv_bench.py (no network,
+no ffmpeg needed for the paths covered here).
+
+    python -m unittest Scripts/ancient/test_m3u8pv.py
+"""
+
+import concurrent.futures
+import http.server
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import m3u8pv_bench as bench  # noqa: E402
+
+
+def load_m3u8pv():
+    spec = importlib.util.spec_from_file_location("m3u8pv_under_test", os.path.join(HERE, "m3u8pv.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+class RangeOriginHandler(http.server.BaseHTTPRequestHandler):
+    """Serves `files`; `ranges` is "honor" (206), "ignore" (200 with everything) or "shift" (wrong 206)."""
+
+    protocol_version = "HTTP/1.1"
+    files = {}
+    ranges = "honor"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        body = self.files.get(self.path.split("?", 1)[0])
+        if body is None:
+            self.send_error(404)
+            return
+        status, headers = 200, {}
+        spec = self.headers.get("Range")
+        if spec and self.ranges != "ignore":
+            first, last = (int(n) for n in spec.split("=", 1)[1].split("-"))
+            if self.ranges == "shift":
+                first, last = first + 1, last + 1
+            headers["Content-Range"] = f"bytes {first}-{last}/{len(body)}"
+            status, body = 206, body[first:last + 1]
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class NativeEngineTest(unittest.TestCase):
+    """The native engine fetches every segment, whole files and EXT-X-BYTERANGE slices alike."""
+
+    SEGMENTS = 4
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="m3u8pv-test-")
+        self.chunks = [bytes([0x47, i]) * (94 * (i + 1)) for i in range(self.SEGMENTS)]
+        files = {f"/seg{i}.ts": chunk for i, chunk in enumerate(self.chunks)}
+        files["/all.ts"] = b"".join(self.chunks)
+        files["/files.m3u8"] = self.playlist(f"seg{i}.ts" for i in range(self.SEGMENTS))
+        offsets = [sum(len(c) for c in self.chunks[:i]) for i in range(self.SEGMENTS)]
+        files["/ranges.m3u8"] = self.playlist(f"#EXT-X-BYTERANGE:{len(c)}@{off}\nall.ts"
+                                              for c, off in zip(self.chunks, offsets))
+        self.handler = type("BoundRangeOriginHandler", (RangeOriginHandler,), {"files": files})
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.m = load_m3u8pv()
+        self.m.outputs = self.m.OutputManager(self.tmp, fsync=False)
+        os.makedirs(self.m.outputs.staging_dir, exist_ok=True)
+
+    def tearDown(self):
+        self.m.http_pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    @staticmethod
+    def playlist(entries) -> bytes:
+        body = "".join(f"#EXTINF:2.0,\n{entry}\n" for entry in entries)
+        return f"#EXTM3U\n#EXT-X-VERSION:4\n#EXT-X-TARGETDURATION:2\n{body}#EXT-X-ENDLIST\n".encode()
+
+    def download(self, name):
+        st = self.m.DownloadStatus(0, f"{self.base}/{name}")
+        self.assertTrue(self.m.run_native_download(st, st.url, segment_workers=3))
+        self.assertEqual(st.size_bytes, sum(len(c) for c in self.chunks))
+        if shutil.which("ffmpeg"):
+            self.assertEqual(st.state, "done", st.err_message)
+        else:  # no remux here: the fetched segments are still on disk
+            seg_dir, = (os.path.join(d, sub) for d, subs, _ in os.walk(self.m.outputs.staging_dir)
+                        for sub in subs if sub.endswith(".segments"))
+            got = [open(os.path.join(seg_dir, f"{i:06d}.ts"), "rb").read() for i in range(self.SEGMENTS)]
+            self.assertEqual(got, self.chunks)
+        return st
+
+    def test_whole_segments(self):
+        self.download("files.m3u8")
+
+    def test_byterange_segments(self):
+        for ranges in ("honor", "ignore"):
+            with self.subTest(ranges=ranges):
+                self.handler.ranges = ranges
+                shutil.rmtree(self.m.outputs.staging_dir, ignore_errors=True)
+                os.makedirs(self.m.outputs.staging_dir)
+                self.download("ranges.m3u8")
+
+    def test_misaligned_206_is_rejected(self):
+        self.handler.ranges = "shift"
+        dest = os.path.join(self.tmp, "seg.ts")
+        with self.assertRaises(self.m.HttpError):
+            self.m.http_pool.fetch(f"{self.base}/all.ts", dest, byterange=(len(self.chunks[0]), 0))
+        self.assertEqual(os.listdir(self.tmp), [os.path.basename(self.m.outputs.staging_dir)])
+
+
+class LiveEndlistTest(unittest.TestCase):
+    """--live on a playlist that already carries EXT-X-ENDLIST records every segment."""
+
+    SEGMENTS = 5
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="m3u8pv-test-")
+        self.payload = bench.null_ts_payload(188 * 100)
+        cfg = bench.OriginConfig(self.SEGMENTS, self.payload, latency=0.0, bandwidth=None, error_rate=0.0)
+        self.server, self.base = bench.start_origin(cfg)
+        self.m = load_m3u8pv()
+        self.m.outputs = self.m.OutputManager(self.tmp, fsync=False)
+        os.makedirs(self.m.outputs.staging_dir, exist_ok=True)
+        self.m.live_options = self.m.LiveOptions()
+
+    def tearDown(self):
+        self.m.http_pool.close()
+        self.server.shutdown()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_endlist_playlist_is_recorded_whole(self):
+        for entry in ("media.m3u8", "master.m3u8"):
+            with self.subTest(entry=entry):
+                st = self.m.DownloadStatus(0, f"{self.base}/v0/{entry}")
+                self.assertTrue(self.m.run_live_download(st, st.url, segment_workers=2))
+                self.assertEqual(st.state, "done", st.err_message)
+                self.assertEqual(st.size_bytes, self.SEGMENTS * len(self.payload))
+                self.assertEqual(os.path.getsize(st.outfile), self.SEGMENTS * len(self.payload))
+
+
+class VerifyLandingTest(unittest.TestCase):
+    """With --verify an output is only committed to the output directory once it passed."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="m3u8pv-test-")
+        self.m = load_m3u8pv()
+        self.m.outputs = self.m.OutputManager(os.path.join(self.tmp, "out"))
+        os.makedirs(self.m.outputs.staging_dir)
+        self.m.journal = self.m.ResumeJournal(os.path.join(self.tmp, "urls.txt.journal"))
+        self.m.verify_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def tearDown(self):
+        self.m.verify_pool.shutdown()
+        self.m.journal.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def finish(self, result):
+        st = self.m.DownloadStatus(0, "http://h/media.m3u8")
+        staging = self.m.assign_outfile(st)
+        with open(staging, "wb") as fh:
+            fh.write(b"\x47" * 188)
+        self.assertTrue(self.m.land_output(st, staging))
+        self.assertFalse(os.path.exists(st.outfile))  # nothing lands before the check
+        settled = threading.Event()
+        self.m.finish_verification(st, result, settled.set)
+        self.assertTrue(settled.wait(5))
+        return st, staging
+
+    def test_passed_output_lands(self):
+        st, _ = self.finish({"ok": True, "duration": 1.0})
+        self.assertEqual(st.state, "verified")
+        self.assertTrue(os.path.isfile(st.outfile))
+        self.assertTrue(self.m.journal.is_done(st.key))
+
+    def test_failed_output_is_set_aside(self):
+        st, staging = self.finish({"ok": False, "error": "truncated"})
+        self.assertEqual(st.state, "failed")
+        self.assertFalse(os.path.exists(st.outfile))
+        self.assertTrue(os.path.isfile(staging + ".failed"))
+        self.assertFalse(self.m.journal.is_done(st.key))
+
+
+class ResumeJournalVariantTest(unittest.TestCase):
+    """Resumed segments are only reused for the rendition they were fetched from."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="m3u8pv-test-")
+        self.m = load_m3u8pv()
+        self.path = os.path.join(self.tmp, "urls.txt.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_other_rendition_drops_segments(self):
+        j = self.m.ResumeJournal(self.path)
+        self.assertFalse(j.use_media("job", "http://h/hi.m3u8"))
+        j.segment_done("job", 0)
+        j.segment_done("job", 1)
+        j.close()
+
+        j = self.m.ResumeJournal(self.path)  # rerun: same rendition keeps its segments
+        self.assertFalse(j.use_media("job", "http://h/hi.m3u8"))
+        self.assertTrue(j.has_segment("job", 1))
+        self.assertTrue(j.use_media("job", "http://h/lo.m3u8"))
+        self.assertFalse(j.has_segment("job", 0))
+        j.close()
+
+        j = self.m.ResumeJournal(self.path)
+        self.assertFalse(j.has_segment("job", 1))
+        self.assertFalse(j.use_media("job", "http://h/lo.m3u8"))
+        j.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
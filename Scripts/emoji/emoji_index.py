@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Emoji picker index with usage ranking, for the rofi picker in ./emoji.
+
+The index is built once from emoji-data-full.txt (fully-qualified emoji, skin-tone variants left
+out, plus anything newer that only emoji.txt has) and cached as ready-to-print menu lines:
+
+    😀 grinning face  · Smileys & Emotion › face-smiling
+
+so rofi's fuzzy matcher finds an emoji by its name, group or subgroup. It is rebuilt when either
+data file changes.
+
+Every pick is recorded in ~/.local/share/emoji-picker/usage.tsv as one decayed score per emoji
+(frecency: each use adds 1, the total halves every HALF_LIFE_DAYS), so the store never grows
+past one line per distinct emoji no matter how long it is used. The menu lists used emoji by
+score first, then everything else in Unicode order.
+
+    emoji_index.py menu                 # print the menu
+    emoji_index.py pick "<menu line>"   # record the pick, print the emoji
+    emoji_index.py build                # rebuild the index now
+    emoji_index.py --bench              # launch-to-menu latency vs. usage history size
+"""
+
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+EMOJI_DATA = os.path.join(HERE, 'emoji-data-full.txt')
+EMOJI_LIST = os.path.join(HERE, 'emoji.txt')
+HALF_LIFE_DAYS = 30.0
+SKIN_TONES = {chr(cp) for cp in range(0x1F3FB, 0x1F400)}
+INDEX_VERSION = 1
+
+
+# ---------------------------------------------------------------------------
+# Paths
+# ---------------------------------------------------------------------------
+
+def _cache_dir() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'emoji-picker')
+
+
+def _usage_path() -> str:
+    base = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'emoji-picker', 'usage.tsv')
+
+
+def _write_atomic(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        fh.write(text)
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+def _signature() -> str:
+    """Identifies the data the index was built from: both files' size and mtime."""
+    parts = [f'v{INDEX_VERSION}']
+    for path in (EMOJI_DATA, EMOJI_LIST):
+        try:
+            st = os.stat(path)
+            parts.append(f'{st.st_size}:{st.st_mtime_ns}')
+        except OSError:
+            parts.append('-')
+    return ' '.join(parts)
+
+
+def parse_emoji_data(path: str = EMOJI_DATA) -> list[tuple[str, str, str, str, str]]:
+    """(emoji, name, group, subgroup, status) for every entry of an emoji-test style file."""
+    entries = []
+    group = subgroup = ''
+    with open(path, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            if line.startswith('# group:'):
+                group = line.split(':', 1)[1].strip()
+            elif line.startswith('# subgroup:'):
+                subgroup = line.split(':', 1)[1].strip()
+            elif line.strip() and not line.startswith('#'):
+                codepoints, rest = line.split(';', 1)
+                status, _, comment = rest.partition('#')
+                emoji = ''.join(chr(int(cp, 16)) for cp in codepoints.split())
+                # the comment is "<emoji> [E13.0 ]name"; newer files add the version
+                name = comment.strip().split(' ', 1)[-1]
+                if name[:1] == 'E' and name.split(' ', 1)[0][1:].replace('.', '').isdigit():
+                    name = name.split(' ', 1)[1]
+                entries.append((emoji, name, group, subgroup, status.strip()))
+    return entries
+
+
+def menu_line(emoji: str, name: str, group: str, subgroup: str) -> str:
+    where = f'  · {group} › {subgroup}' if group else ''
+    return f'{emoji} {name}{where}'
+
+
+def build_index() -> list[str]:
+    """Build the menu lines and cache them; returns them."""
+    lines, seen = [], set()
+    for emoji, name, group, subgroup, status in parse_emoji_data():
+        if status != 'fully-qualified' or SKIN_TONES.intersection(emoji) or group == 'Component':
+            continue
+        lines.append(menu_line(emoji, name, group, subgroup))
+        seen.add(emoji)
+    # emoji.txt may be newer than the data file; keep whatever only it has
+    try:
+        with open(EMOJI_LIST, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                emoji, _, name = line.rstrip('\n').partition(' ')
+                if emoji and emoji not in seen:
+                    lines.append(menu_line(emoji, name, '', ''))
+                    seen.add(emoji)
+    except OSError:
+        pass
+    try:
+        _write_atomic(os.path.join(_cache_dir(), 'index.txt'), _signature() + '\n' + ''.join(l + '\n' for l in lines))
+    except OSError:
+        pass
+    return lines
+
+
+def load_index() -> list[str]:
+    """The cached menu lines, rebuilt first if the data files changed."""
+    try:
+        with open(os.path.join(_cache_dir(), 'index.txt'), 'r', encoding='utf-8') as fh:
+            signature = fh.readline().rstrip('\n')
+            if signature == _signature():
+                return fh.read().splitlines()
+    except OSError:
+        pass
+    return build_index()
+
+
+# ---------------------------------------------------------------------------
+# Usage store (frecency)
+# ---------------------------------------------------------------------------
+
+def load_usage() -> dict[str, tuple[float, float]]:
+    """emoji -> (score, last used as epoch seconds)."""
+    usage = {}
+    try:
+        with open(_usage_path(), 'r', encoding='utf-8') as fh:
+            for line in fh:
+                try:
+                    emoji, score, last = line.rstrip('\n').split('\t')
+                    usage[emoji] = (float(score), float(last))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return usage
+
+
+def decayed(score: float, last: float, now: float) -> float:
+    return score * 0.5 ** ((now - last) / (HALF_LIFE_DAYS * 86400))
+
+
+def record_use(emoji: str, now: float = None) -> None:
+    now = time.time() if now is None else now
+    usage = load_usage()
+    score, last = usage.get(emoji, (0.0, now))
+    usage[emoji] = (decayed(score, last, now) + 1.0, now)
+    _write_atomic(_usage_path(), ''.join(f'{e}\t{s:.6g}\t{l:.0f}\n' for e, (s, l) in usage.items()))
+
+
+def ranked_menu(lines: list[str], usage: dict[str, tuple[float, float]], now: float = None) -> list[str]:
+    """Used emoji by current score, highest first, then the rest in index order."""
+    if not usage:
+        return lines
+    now = time.time() if now is None else now
+    used, rest = [], []
+    for line in lines:
+        entry = usage.get(line.split(' ', 1)[0])
+        if entry:
+            used.append((-decayed(entry[0], entry[1], now), len(used), line))
+        else:
+            rest.append(line)
+    used.sort()
+    return [line for _, _, line in used] + rest
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def _bench() -> None:
+    import random
+    import subprocess
+    import tempfile
+
+    with tempfile.TemporaryDirectory(prefix='emoji-bench-') as tmp:
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(tmp, 'cache'), XDG_DATA_HOME=os.path.join(tmp, 'data'))
+        os.environ.update(env)
+        start = time.perf_counter()
+        lines = build_index()
+        print(f'index: {len(lines)} entries, built in {(time.perf_counter() - start) * 1000:.1f} ms')
+        rng = random.Random(1)
+        now = time.time()
+        for used in (0, 10, 100, 1000, len(lines)):
+            picks = rng.sample(lines, min(used, len(lines)))
+            _write_atomic(_usage_path(), ''.join(f"{l.split(' ', 1)[0]}\t{rng.uniform(1, 50):.6g}\t"
+                                                 f"{now - rng.uniform(0, 3e7):.0f}\n" for l in picks))
+            runs = 50
+            start = time.perf_counter()
+            for _ in range(runs):
+                ranked_menu(load_index(), load_usage())
+            in_process = (time.perf_counter() - start) / runs * 1000
+            start = time.perf_counter()
+            for _ in range(5):
+                subprocess.run([sys.executable, os.path.abspath(__file__), 'menu'], env=env,
+                               stdout=subprocess.DEVNULL, check=True)
+            launch = (time.perf_counter() - start) / 5 * 1000
+            print(f'{used:5d} emoji in history: load+rank {in_process:6.2f} ms, launch to menu {launch:6.1f} ms')
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def main() -> None:
+    args = sys.argv[1:]
+    if args == ['menu']:
+        sys.stdout.write(''.join(line + '\n' for line in ranked_menu(load_index(), load_usage())))
+    elif len(args) == 2 and args[0] == 'pick':
+        emoji = args[1].split(' ', 1)[0]
+        if emoji:
+            # rofi hands back free text too; only real entries go into the history
+            if any(line.split(' ', 1)[0] == emoji for line in load_index()):
+                record_use(emoji)
+            print(emoji)
+    elif args == ['build']:
+        print(f'{len(build_index())} entries')
+    elif args == ['--bench']:
+        _bench()
+    else:
+        print(
+            "Usage:\n"
+            "  emoji_index.py menu\n"
+            "  emoji_index.py pick <menu line>\n"
+            "  emoji_index.py build\n"
+            "  emoji_index.py --bench",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Conflict-safe bulk renaming, shared by paddington and android-sanitize.
+
+For each directory every new name is computed before anything is touched:
+
+  - a target that already exists and is not itself being renamed away is a conflict
+  - two entries renamed to the same target are all conflicts
+  - an entry whose rename is dropped keeps its name, which can make further renames conflicts
+  - chains (a→b while b→c) are ordered so each target is free when its rename runs
+  - cycles (a→b, b→a) are broken with a temporary name
+
+Conflicting entries are left alone and reported. Applied renames are appended to an undo journal
+(JSON lines, written ahead of each directory's renames) that undo() replays backwards.
+Directories are walked with os.scandir one at a time, so memory is bounded by the largest single
+directory, not the tree; with recursion a directory's entries are renamed before descending into
+its subdirectories under their new names.
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+
+TEMP_PREFIX = '.renameplan-tmp'
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+@dataclass
+class DirPlan:
+    """The renames for one directory, in an order that is safe to apply."""
+    path: str
+    moves: list = field(default_factory=list)        # (src, dst), temporary names included
+    conflicts: list = field(default_factory=list)    # (src, dst, reason)
+    cycles: int = 0
+    subdirs: list = field(default_factory=list)      # (name, planned new name) of subdirectories
+    entries: int = 0
+    renamed: dict = field(default_factory=dict)      # src -> dst of the renames apply_plan() made
+
+
+def plan_directory(path: str, new_name: Optional[Callable[[str], str]] = None, names: Optional[list] = None,
+                   assign: Optional[Callable[[list], dict]] = None) -> DirPlan:
+    """
+    Plan renames for the entries of *path*. new_name(name) returns the wanted name (or the same
+    name); alternatively assign([(name, is_dir)]) returns {name: new name} for the whole directory
+    when names depend on each other. *names* may be given as [(name, is_dir)] to skip the scandir.
+    """
+    plan = DirPlan(path)
+    if assign is not None:
+        names = list(_scan(path)) if names is None else names
+        mapping = assign(names)
+        new_name = lambda name: mapping.get(name, name)
+    existing = set()
+    moves = {}
+    subdirs = []
+    for name, is_dir in (_scan(path) if names is None else names):
+        existing.add(name)
+        if is_dir:
+            subdirs.append(name)
+        target = new_name(name)
+        if target != name:
+            if not target or '/' in target or '\0' in target or target in ('.', '..'):
+                plan.conflicts.append((name, target, 'invalid name'))
+            else:
+                moves[name] = target
+    plan.entries = len(existing)
+
+    # drop conflicting renames until stable: an entry that stays blocks anything aimed at it
+    by_target = {}
+    shared = {}  # targets wanted by more than one entry -> all of those entries
+    for src, dst in moves.items():
+        first = by_target.setdefault(dst, src)
+        if first != src:
+            shared.setdefault(dst, [first]).append(src)
+    reasons = dict.fromkeys(shared, 'same target as another entry')
+    blocked = list(shared)
+    for dst in by_target:
+        if dst in existing and dst not in moves:
+            reasons.setdefault(dst, 'target exists')
+            blocked.append(dst)
+    while blocked:
+        dst = blocked.pop()
+        srcs = shared.pop(dst, None) or [by_target.get(dst)]
+        by_target.pop(dst, None)
+        for src in srcs:
+            if src is None or moves.pop(src, None) is None:
+                continue
+            plan.conflicts.append((src, dst, reasons.get(dst, 'target is kept by a skipped rename')))
+            # src keeps its name now; whatever was going to move onto it can't
+            if src in by_target:
+                reasons.setdefault(src, 'target is kept by a skipped rename')
+                blocked.append(src)
+    del by_target, reasons
+    plan.subdirs = [(name, moves.get(name, name)) for name in subdirs]
+
+    # order chains, break cycles; each target has at most one source, so following dst pointers
+    # from any source either ends at a free name or comes back to where it started
+    pending = moves  # consumed as renames get ordered
+    taken = existing
+    taken.update(moves.values())
+    temp_n = 0
+    for start in list(moves):
+        if start not in pending:
+            continue
+        chain = [start]
+        cur = pending[start]
+        while cur in pending and cur != start:
+            chain.append(cur)
+            cur = pending[cur]
+        if cur == start:
+            while f'{TEMP_PREFIX}-{os.getpid()}-{temp_n}' in taken:
+                temp_n += 1
+            temp = f'{TEMP_PREFIX}-{os.getpid()}-{temp_n}'
+            taken.add(temp)
+            plan.cycles += 1
+            plan.moves.append((start, temp))
+            for src in reversed(chain[1:]):
+                plan.moves.append((src, pending[src]))
+            plan.moves.append((temp, pending[start]))
+        else:
+            for src in reversed(chain):
+                plan.moves.append((src, pending[src]))
+        for src in chain:
+            del pending[src]
+    return plan
+
+
+def _scan(path: str) -> Iterator[tuple]:
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                yield entry.name, entry.is_dir(follow_symlinks=False)
+            except OSError:
+                yield entry.name, False
+
+
+# ---------------------------------------------------------------------------
+# Journal
+# ---------------------------------------------------------------------------
+
+class Journal:
+    """Append-only undo log; one JSON object per rename. The file is created on first use."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+
+    def write(self, directory: str, moves: list) -> None:
+        if not moves:
+            return
+        if self._fh is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._fh = open(self.path, 'a', encoding='utf-8')
+        d = os.path.abspath(directory)
+        self._fh.write(''.join(json.dumps({'dir': d, 'from': s, 'to': t}, ensure_ascii=False) + '\n'
+                               for s, t in moves))
+        self._fh.flush()
+
+    def failed(self, directory: str, src: str, dst: str) -> None:
+        """Mark a journaled rename that did not happen, so undo leaves dst alone."""
+        rec = {'dir': os.path.abspath(directory), 'from': src, 'to': dst, 'failed': True}
+        self._fh.write(json.dumps(rec, ensure_ascii=False) + '\n')
+        self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def default_journal_path(tool: str) -> str:
+    base = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(base, tool, time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}.jsonl')
+
+
+def _reverse_lines(path: str, block: int = 1 << 16) -> Iterator[str]:
+    """Lines of a file from last to first, reading fixed-size blocks from the end."""
+    with open(path, 'rb') as fh:
+        fh.seek(0, os.SEEK_END)
+        pos = fh.tell()
+        tail = b''
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            fh.seek(pos)
+            lines = (fh.read(step) + tail).split(b'\n')
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode('utf-8')
+        if tail.strip():
+            yield tail.decode('utf-8')
+
+
+def undo(journal_path: str, report: Callable[[str], None] = print) -> tuple:
+    """
+    Reverse a journal, newest rename first, streaming it backwards. Returns (undone, skipped).
+    A directory of journal parts (one per worker) is undone part by part in reverse name order.
+    """
+    if os.path.isdir(journal_path):
+        undone = skipped = 0
+        for name in sorted((n for n in os.listdir(journal_path) if n.endswith('.jsonl')), reverse=True):
+            u, s = undo(os.path.join(journal_path, name), report)
+            undone += u
+            skipped += s
+        return undone, skipped
+    failed = set()
+    with open(journal_path, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            if '"failed": true' in line:
+                r = json.loads(line)
+                failed.add((r['dir'], r['from'], r['to']))
+    undone = skipped = 0
+    for line in _reverse_lines(journal_path):
+        rec = json.loads(line)
+        if rec.get('failed'):
+            continue
+        if (rec['dir'], rec['from'], rec['to']) in failed:
+            failed.discard((rec['dir'], rec['from'], rec['to']))
+            skipped += 1
+            continue
+        src = os.path.join(rec['dir'], rec['to'])
+        dst = os.path.join(rec['dir'], rec['from'])
+        # journal lines are written before the renames, so some may never have happened
+        if not os.path.lexists(src) or os.path.lexists(dst):
+            skipped += 1
+            continue
+        try:
+            os.rename(src, dst)
+            undone += 1
+        except OSError as e:
+            report(f"Error undoing {src}: {e}")
+            skipped += 1
+    return undone, skipped
+
+
+# ---------------------------------------------------------------------------
+# Applying
+# ---------------------------------------------------------------------------
+
+def visible_moves(moves: list) -> list:
+    """The (src, dst) renames as the user sees them: a cycle's src→temp→dst hops become src→dst."""
+    via = {}
+    out = []
+    for src, dst in moves:
+        if dst.startswith(TEMP_PREFIX):
+            via[dst] = src
+        elif src.startswith(TEMP_PREFIX):
+            if src in via:  # both hops happened
+                out.append((via.pop(src), dst))
+        else:
+            out.append((src, dst))
+    return out
+
+
+def apply_plan(plan: DirPlan, journal: Optional[Journal], report: Callable[[str], None] = print) -> tuple:
+    """
+    Run the plan's renames in order. Returns (renamed, failed): the visible_moves() that actually
+    happened (also kept in plan.renamed), and the number of renames that failed.
+    """
+    if journal is not None:
+        journal.write(plan.path, plan.moves)
+    done = []
+    failed = 0
+    for src, dst in plan.moves:
+        src_path = os.path.join(plan.path, src)
+        dst_path = os.path.join(plan.path, dst)
+        # something may have appeared since planning; os.rename would silently replace it
+        if os.path.lexists(dst_path):
+            error = f"{dst} appeared after planning"
+        else:
+            try:
+                os.rename(src_path, dst_path)
+                done.append((src, dst))
+                continue
+            except OSError as e:
+                error = str(e)
+        report(f"Error renaming {src_path}: {error}")
+        failed += 1
+        if journal is not None:
+            journal.failed(plan.path, src, dst)
+    done = visible_moves(done)
+    plan.renamed = dict(done)
+    return done, failed
+
+
+def walk_plans(root: str, new_name: Optional[Callable[[str], str]] = None, recursive: bool = False,
+               apply: Callable[[DirPlan], None] = None,
+               assign: Optional[Callable[[list], dict]] = None,
+               descend: Optional[Callable[[str], bool]] = None) -> Iterator[DirPlan]:
+    """
+    Plan *root* (and with *recursive* every directory below it), yielding each DirPlan. If *apply*
+    is given it is called on each plan before its subdirectories are visited under their new names.
+    *descend(path)* can veto visiting a subdirectory.
+    """
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            plan = plan_directory(path, new_name, assign=assign)
+        except OSError:
+            continue
+        if apply is not None:
+            apply(plan)
+        yield plan
+        if recursive:
+            subdirs = subdir_paths(plan, applied=apply is not None)
+            if descend is not None:
+                subdirs = [sub for sub in subdirs if descend(sub)]
+            stack.extend(reversed(subdirs))
+
+
+def subdir_paths(plan: DirPlan, applied: bool) -> list:
+    """Paths of the plan's subdirectories: new names once applied, old names for a dry run."""
+    # only renames that actually happened count; a skipped or failed one leaves the old name, and
+    # whatever sits at the planned new name is not ours to descend into
+    renamed = plan.renamed if applied else {}
+    return [os.path.join(plan.path, renamed.get(old, old)) for old, _ in plan.subdirs]
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Terminal display width of strings, shared by ascii_center and ascii_box.
+
+Width rules (same as ascii_center has always used):
+  - C0/C1 controls                      → 0
+  - East-Asian Wide / Fullwidth         → 2
+  - Combining marks and format chars    → 0   (Mn, Me, Cf: ZWJ, variation selectors, …)
+  - everything else                     → 1   (a regional-indicator pair is 1 + 1 = 2, one flag)
+  - ANSI escape sequences               → 0
+
+The per-code-point widths come from a two-level lookup table (a block index over 256-code-point
+blocks, identical blocks stored once), built from unicodedata once and cached in
+~/.cache/termwidth/ per Unicode database version. Lines that are plain printable ASCII are
+measured with len(), ANSI stripping only runs on lines containing ESC, and repeated lines are
+memoized.
+
+Emoji sequences (ZWJ families, skin tones, keycaps, VS16 presentation, tag flags) are one
+2-column glyph, not the sum of their code points. The multi-code-point sequences listed in
+emoji/emoji-data-full.txt whose per-code-point sum is not already 2 (flags are) are compiled into a trie stored as flat uint32 words in
+~/.cache/termwidth/emoji-trie.bin (rebuilt when the data file changes). The file is mmap'd and
+only opened the first time a line contains a sequence marker (ZWJ, VS16, keycap, skin tone);
+on such lines the trie is walked only from just before each marker,
+left to right, longest match first.
+
+    python3 termwidth.py --bench [--mb 4]                  # compare against the old per-code-point loop
+    python3 termwidth.py --compile-emoji [data.txt] [out]  # (re)build the sequence trie
+"""
+
+import mmap
+import os
+import re
+import sys
+import unicodedata
+from array import array
+from functools import lru_cache
+
+BLOCK = 256
+MAX_CP = 0x110000
+CACHE_MAGIC = b'TWID1'
+TRIE_MAGIC = 0x54574531  # 'TWE1'
+EMOJI_DATA = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'emoji', 'emoji-data-full.txt')
+# Code points that show up in (nearly) every emoji sequence that needs the trie: ZWJ, VS16,
+# combining keycap, skin tones. The compiler adds more if the data needs them.
+SEQUENCE_MARKERS = (0x200D, 0xFE0F, 0x20E3, *range(0x1F3FB, 0x1F400))
+
+ANSI_ESCAPE = re.compile(
+    r'\x1b'          # ESC
+    r'(?:'
+    r'\[[0-9;?]*[ -/]*[@-~]'   # CSI sequences  (ESC [ ... final)
+    r'|[@-Z\\-_]'              # Fe sequences    (ESC followed by 0x40–0x5F)
+    r'|\][^\x07\x1b]*(?:\x07|\x1b\\)'  # OSC     (ESC ] ... ST)
+    r')'
+)
+
+
+# ---------------------------------------------------------------------------
+# Lookup table
+# ---------------------------------------------------------------------------
+
+def _compute_width(cp: int) -> int:
+    """Width of one code point straight from unicodedata (only used to build the table)."""
+    # C0/C1 controls → 0
+    if cp < 32 or 0x07F <= cp < 0x0A0:
+        return 0
+    ch = chr(cp)
+    if unicodedata.east_asian_width(ch) in ('W', 'F'):
+        return 2
+    # Combining / non-spacing marks → 0
+    if unicodedata.category(ch) in ('Mn', 'Me', 'Cf'):
+        return 0
+    return 1
+
+
+def _build_table() -> tuple:
+    """Return (index, blocks): width of cp is blocks[index[cp >> 8] * BLOCK + (cp & 0xFF)]."""
+    index = array('H')
+    blocks = bytearray()
+    seen = {}
+    for start in range(0, MAX_CP, BLOCK):
+        block = bytes(_compute_width(cp) for cp in range(start, start + BLOCK))
+        if block not in seen:
+            seen[block] = len(seen)
+            blocks += block
+        index.append(seen[block])
+    return index, bytes(blocks)
+
+
+def _cache_path() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'termwidth', f'widths-{unicodedata.unidata_version}.bin')
+
+
+def _load_table() -> tuple:
+    """Read the table from the cache, or build it and try to cache it (a read-only HOME is fine)."""
+    path = _cache_path()
+    try:
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        if data.startswith(CACHE_MAGIC):
+            index = array('H')
+            n_index = MAX_CP // BLOCK
+            index.frombytes(data[len(CACHE_MAGIC):len(CACHE_MAGIC) + 2 * n_index])
+            blocks = data[len(CACHE_MAGIC) + 2 * n_index:]
+            if len(index) == n_index and len(blocks) % BLOCK == 0 and max(index) * BLOCK < len(blocks):
+                return index, blocks
+    except (OSError, ValueError):
+        pass
+
+    index, blocks = _build_table()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(CACHE_MAGIC + index.tobytes() + blocks)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return index, blocks
+
+
+_INDEX, _BLOCKS = _load_table()
+
+
+def char_width(ch: str) -> int:
+    """Display width of a single code point."""
+    cp = ord(ch)
+    return _BLOCKS[_INDEX[cp >> 8] * BLOCK + (cp & 0xFF)]
+
+
+class _TranslateWidths(dict):
+    """
+    str.translate() table that replaces every character with as many characters as it is wide
+    ('' / itself / two of itself), so len(text.translate(_WIDTHS)) is the width, computed in C.
+    Entries are filled from the lookup table the first time a character is seen.
+    """
+
+    def __missing__(self, cp: int):
+        w = _BLOCKS[_INDEX[cp >> 8] * BLOCK + (cp & 0xFF)]
+        value = None if w == 0 else chr(cp) * w
+        self[cp] = value
+        return value
+
+
+_WIDTHS = _TranslateWidths()
+
+
+# ---------------------------------------------------------------------------
+# Emoji sequence trie
+# ---------------------------------------------------------------------------
+#
+# Layout, all native-endian uint32 words:
+#   header   TRIE_MAGIC, source size, source mtime (low, high), max lead, n_markers, n_nodes, n_edges
+#   markers  n_markers code points; every sequence contains one, at most max lead code points in
+#   nodes    (first edge, n_edges << 8 | width) per node, node 0 is the root; width 0 = not a sequence end
+#   edges    (code point, child node) per edge, sorted by code point within each node
+
+HEADER_WORDS = 8
+
+
+def _source_signature(path: str) -> tuple:
+    st = os.stat(path)
+    return st.st_size & 0xFFFFFFFF, st.st_mtime_ns & 0xFFFFFFFF, (st.st_mtime_ns >> 32) & 0xFFFFFFFF
+
+
+def compile_emoji_trie(src: str = EMOJI_DATA, dst: str = None) -> str:
+    """Compile the multi-code-point sequences of an emoji-test style file into the trie format."""
+    dst = dst or os.path.join(os.path.dirname(_cache_path()), 'emoji-trie.bin')
+    sequences = set()
+    with open(src, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            fields = line.split('#', 1)[0].split(';')
+            if len(fields) != 2:
+                continue
+            seq = tuple(int(cp, 16) for cp in fields[0].split())
+            if len(seq) >= 2:  # single code points are already right in the width table
+                sequences.add(seq)
+
+    # every listed sequence renders as one wide glyph; keep those the width table gets wrong, and
+    # the ones extending them so longest-match still picks the whole sequence
+    wrong = {seq for seq in sequences if sum(_BLOCKS[_INDEX[cp >> 8] * BLOCK + (cp & 0xFF)] for cp in seq) != 2}
+    keep = {seq for seq in sequences if any(seq[:n] in wrong for n in range(2, len(seq) + 1))}
+
+    root = {}
+    markers = set(SEQUENCE_MARKERS)
+    max_lead = 0
+    for seq in sorted(keep):
+        if not markers.intersection(seq):
+            markers.add(seq[1])
+        max_lead = max(max_lead, next(i for i, cp in enumerate(seq) if cp in markers))
+        node = root
+        for cp in seq:
+            node = node.setdefault(cp, {})
+        node[None] = 2
+
+    # breadth-first so each node's children get consecutive ids
+    nodes, edges, queue = [], [], [root]
+    next_id = 1
+    while len(nodes) < len(queue):
+        node = queue[len(nodes)]
+        children = sorted(cp for cp in node if cp is not None)
+        nodes.append((len(edges), len(children) << 8 | node.get(None, 0)))
+        for cp in children:
+            edges.append((cp, next_id))
+            queue.append(node[cp])
+            next_id += 1
+
+    words = array('I', [TRIE_MAGIC, *_source_signature(src), max_lead, len(markers), len(nodes), len(edges)])
+    words.extend(sorted(markers))
+    for pair in nodes + edges:
+        words.extend(pair)
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    tmp = f'{dst}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(words.tobytes())
+    os.replace(tmp, dst)
+    return dst
+
+
+class _EmojiTrie:
+    """Read-only view of a compiled trie; lookups go straight to the mmap'd words."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.words = memoryview(self._map).cast('I')
+        self.max_lead, n_markers, n_nodes, n_edges = self.words[4:8]
+        self.nodes = HEADER_WORDS + n_markers
+        self.edges = self.nodes + 2 * n_nodes
+        if self.words[0] != TRIE_MAGIC or len(self.words) != self.edges + 2 * n_edges:
+            raise ValueError(f'corrupt emoji trie: {path}')
+        cps = ''.join(re.escape(chr(cp)) for cp in self.words[HEADER_WORDS:self.nodes])
+        self.markers = re.compile(f'[{cps}]')
+        self._steps = {}  # (node << 21 | cp) -> (child, width), filled as edges get used
+
+    def child(self, node: int, cp: int) -> int:
+        """Binary search of node's edges for cp; -1 when there is none."""
+        words = self.words
+        base = self.nodes + 2 * node
+        lo = words[base]
+        hi = lo + (words[base + 1] >> 8)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            edge_cp = words[self.edges + 2 * mid]
+            if edge_cp < cp:
+                lo = mid + 1
+            elif edge_cp > cp:
+                hi = mid
+            else:
+                return words[self.edges + 2 * mid + 1]
+        return -1
+
+    def longest(self, text: str, start: int) -> tuple:
+        """(end, width) of the longest sequence starting at text[start], or (0, 0)."""
+        steps = self._steps
+        node = 0
+        end = width = 0
+        for j in range(start, len(text)):
+            key = node << 21 | ord(text[j])
+            step = steps.get(key)
+            if step is None:
+                child = self.child(node, ord(text[j]))
+                step = steps[key] = (child, self.words[self.nodes + 2 * child + 1] & 0xFF if child >= 0 else 0)
+            node, w = step
+            if node < 0:
+                break
+            if w:
+                end, width = j + 1, w
+        return end, width
+
+
+def _load_emoji_trie():
+    """Open the cached trie, compiling it first if it is missing or older than the data file."""
+    path = os.path.join(os.path.dirname(_cache_path()), 'emoji-trie.bin')
+    try:
+        signature = _source_signature(EMOJI_DATA)
+    except OSError:
+        signature = None  # no data file next to us: use whatever was compiled, if anything
+    for attempt in range(2):
+        try:
+            trie = _EmojiTrie(path)
+            if signature is None or tuple(trie.words[1:4]) == signature:
+                return trie
+        except (OSError, ValueError):
+            pass
+        if signature is None or attempt:
+            break
+        try:
+            compile_emoji_trie(EMOJI_DATA, path)
+        except OSError:
+            break
+    return None
+
+
+_emoji_trie = False  # not loaded yet; None once loading failed
+
+
+def _sequence_trie():
+    global _emoji_trie
+    if _emoji_trie is False:
+        _emoji_trie = _load_emoji_trie()
+    return _emoji_trie
+
+
+def _sequence_width(text: str, trie: _EmojiTrie) -> int:
+    """
+    Width of *text* with every emoji sequence counted as one glyph. Sequences are matched left to
+    right, longest first; since each one contains a marker at most max_lead code points in, only
+    the few positions before each marker need a trie walk.
+    """
+    total = len(text.translate(_WIDTHS))
+    done = 0
+    for marker in trie.markers.finditer(text):
+        pos = marker.start()
+        if pos < done:
+            continue
+        for start in range(max(done, pos - trie.max_lead), pos + 1):
+            end, width = trie.longest(text, start)
+            if end:
+                total += width - len(text[start:end].translate(_WIDTHS))
+                done = end
+                break
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Public helpers
+# ---------------------------------------------------------------------------
+
+def strip_ansi(text: str) -> str:
+    """Remove ANSI / terminal escape sequences (colors, cursor moves, etc.)."""
+    if '\x1b' not in text:
+        return text
+    return ANSI_ESCAPE.sub('', text)
+
+
+@lru_cache(maxsize=4096)
+def display_width(text: str) -> int:
+    """Return the visible display width of *text* after stripping ANSI codes."""
+    if '\x1b' in text:
+        text = ANSI_ESCAPE.sub('', text)
+    if text.isascii() and text.isprintable():
+        return len(text)
+    trie = _sequence_trie()
+    if trie is not None and trie.markers.search(text):
+        return _sequence_width(text, trie)
+    return len(text.translate(_WIDTHS))
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def _reference_width(text: str) -> int:
+    """The old ascii_center implementation: regex on every line, unicodedata per code point."""
+    plain = re.sub(ANSI_ESCAPE.pattern, '', text)
+    total = 0
+    i = 0
+    chars = list(plain)
+    n = len(chars)
+    while i < n:
+        cp = ord(chars[i])
+        if 0x1F1E6 <= cp <= 0x1F1FF:
+            if i + 1 < n and 0x1F1E6 <= ord(chars[i + 1]) <= 0x1F1FF:
+                total += 2
+                i += 2
+                continue
+            total += 1
+            i += 1
+            continue
+        total += _compute_width(cp)
+        i += 1
+    return total
+
+
+def _bench_corpora(megabytes: float) -> dict:
+    import random
+    rng = random.Random(1)
+    size = int(megabytes * 1024 * 1024)
+
+    art_chars = ' .:-=+*#%@/\\|_()<>'
+    art = []
+    while sum(map(len, art)) < size:
+        art.append(''.join(rng.choice(art_chars) for _ in range(rng.randint(40, 160))))
+
+    colors = ['\x1b[31m', '\x1b[1;32m', '\x1b[38;5;208m', '\x1b[0m']
+    words = ['INFO', 'WARN', 'request', 'done', 'GET', '/api/v1/items', '200', 'ms', 'retrying']
+    logs = []
+    while sum(map(len, logs)) < size:
+        logs.append(' '.join(rng.choice(colors) + rng.choice(words) for _ in range(rng.randint(4, 16))) + '\x1b[0m')
+
+    wide = ['漢字', 'かな', '한국어', '🎉', '🇯🇵', 'é', '─', '│']
+    mixed = []
+    while sum(map(len, mixed)) < size // 4:
+        mixed.append(''.join(rng.choice(wide + list(art_chars)) for _ in range(rng.randint(20, 80))))
+
+    sequences = ['👍🏽', '👨\u200d👩\u200d👧', '1\ufe0f\u20e3', '☺\ufe0f', '🏳\ufe0f\u200d🌈',
+                 '🏴\U000e0067\U000e0062\U000e0073\U000e0063\U000e0074\U000e007f', '🧑🏿\u200d🚀']
+    emoji = []
+    while sum(map(len, emoji)) < size // 4:
+        emoji.append(''.join(rng.choice(sequences + wide[3:] + list(art_chars)) for _ in range(rng.randint(20, 80))))
+
+    # e.g. a status screen redrawn over and over: where the memo pays off
+    repeated = (logs[:200] * (len(logs) // 200 + 1))[:len(logs)]
+    return {'ascii art': art, 'ANSI logs': logs, 'CJK/emoji': mixed, 'sequences': emoji, 'repeated': repeated}
+
+
+def _bench(megabytes: float) -> None:
+    import time
+
+    try:
+        from wcwidth import wcswidth
+    except ImportError:
+        wcswidth = None
+
+    start = time.perf_counter()
+    trie = _sequence_trie()
+    print(f'emoji trie: {"not available" if trie is None else f"{len(trie.words) * 4} bytes"}, '
+          f'opened in {(time.perf_counter() - start) * 1000:.2f} ms')
+
+    for name, lines in _bench_corpora(megabytes).items():
+        mb = sum(map(len, lines)) / (1024 * 1024)
+        timings = []
+        candidates = [('old', _reference_width), ('termwidth', display_width.__wrapped__),
+                      ('termwidth+memo', display_width)]
+        if wcswidth is not None:
+            candidates.append(('wcwidth', lambda s: wcswidth(strip_ansi(s))))
+        for label, fn in candidates:
+            display_width.cache_clear()
+            start = time.perf_counter()
+            for line in lines:
+                fn(line)
+            timings.append(f'{label} {(time.perf_counter() - start) * 1000:8.1f} ms')
+        # the old loop only disagrees where an emoji sequence is now measured as one glyph
+        differ = [line for line in lines if _reference_width(line) != display_width(line)]
+        mismatches = sum(trie is None or not trie.markers.search(strip_ansi(line)) for line in differ)
+        print(f'{name:>10} ({mb:5.2f} MB, {len(lines)} lines): ' + ' | '.join(timings)
+              + (f' | {len(differ)} lines with emoji sequences' if differ else '')
+              + (f' | {mismatches} MISMATCHES' if mismatches else ''))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == '--bench':
+        _bench(float(sys.argv[3]) if len(sys.argv) >= 4 and sys.argv[2] == '--mb' else 4.0)
+    elif len(sys.argv) >= 2 and sys.argv[1] == '--compile-emoji':
+        print(compile_emoji_trie(*sys.argv[2:4]))
+    else:
+        print('Usage: termwidth.py --bench [--mb N]\n'
+              '       termwidth.py --compile-emoji [emoji-data.txt] [out.bin]', file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,58 @@
+"""
+Regression tests for android-sanitize's name assignment and dry-run walk.
+
+    python -m unittest Scripts/test_android_sanitize.py
+"""
+
+import contextlib
+import importlib.machinery
+import importlib.util
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+
+def load_android_sanitize():
+    path = os.path.join(HERE, "android-sanitize")
+    loader = importlib.machinery.SourceFileLoader("android_sanitize_under_test", path)
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    mod = importlib.util.module_from_spec(spec)
+    loader.exec_module(mod)
+    return mod
+
+
+class KeptDirectoryCollisionTest(unittest.TestCase):
+    """Directories that may not be renamed keep their name; the colliding file gets the suffix."""
+
+    def setUp(self):
+        self.m = load_android_sanitize()
+        self.tmp = tempfile.mkdtemp(prefix="android-sanitize-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_assign_names(self):
+        names = [("music", True), ("Music", False)]
+        self.assertEqual(self.m.assign_names(names), {"Music": "Music_1"})
+        # Hidden directories stay put under -r too, even when they collide with each other
+        self.assertEqual(self.m.assign_names([(".git", True), (".Git", True)], recursive=True), {})
+
+    def test_dry_run_leaves_directory_alone(self):
+        os.mkdir(os.path.join(self.tmp, "music"))
+        open(os.path.join(self.tmp, "Music"), "w").close()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            totals, _ = self.m.sanitize_for_android(self.tmp, dry_run=True)
+        self.assertEqual(totals["planned"], 1)
+        self.assertIn("'Music_1'", out.getvalue())
+        self.assertNotIn("music_1", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()